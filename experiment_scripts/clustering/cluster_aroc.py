@@ -1,13 +1,18 @@
 import os
 from argparse import ArgumentParser
 
-from tqdm.contrib.itertools import product
-
 from paths import DATA_DIR
 from src.clustering.aroc.aroc_clustering import AROClustering
+from src.clustering.knn.brute_force_knn import BruteForceKNN
+from src.clustering.knn.flann_knn import FlannKNN
+from src.clustering.knn.sklearn_knn import SklearnKNN
+
+knn_backends = {"brute_force": BruteForceKNN, "sklearn": SklearnKNN, "flann": FlannKNN}
 
 parser = ArgumentParser()
 parser.add_argument("--feature-path", dest="feature_path")
+parser.add_argument("--knn", choices=list(knn_backends), default="brute_force")
+parser.add_argument("--metric", choices=["euclidean", "cosine"], default="euclidean")
 args = parser.parse_args()
 
 feature_folder_path = f"{DATA_DIR}/{args.feature_path}"
@@ -18,11 +23,16 @@ n_neighbours_space = [190, 200, 210]
 threshold_space = [0.08, 0.1, 0.12]
 min_samples_space = [10, 100]
 
-for i, (n_neighbours, threshold, min_samples) in enumerate(
-    product(n_neighbours_space, threshold_space, min_samples_space)
-):
-    clustering = AROClustering(
-        n_neighbours=n_neighbours, threshold=threshold, min_samples=min_samples
-    )
-    clustering.cluster(feature_folder_path)
-    clustering.save_cluster_labels(f"{aroc_folder_path}/run_{i}")
+clustering = AROClustering(
+    n_neighbours=n_neighbours_space,
+    threshold=threshold_space,
+    min_samples=min_samples_space,
+    knn=knn_backends[args.knn](metric=args.metric),
+)
+clustering.cluster(feature_folder_path)
+clustering.save_cluster_labels_sweep(
+    [
+        f"{aroc_folder_path}/run_{i}"
+        for i in range(len(clustering.get_parameter_combinations()))
+    ]
+)
@@ -0,0 +1,30 @@
+from argparse import ArgumentParser
+
+from paths import DATA_DIR
+from src.clustering.chinese_whispers_clustering import ChineseWhispersClustering
+from src.clustering.knn.brute_force_knn import BruteForceKNN
+from src.clustering.knn.flann_knn import FlannKNN
+from src.clustering.knn.sklearn_knn import SklearnKNN
+
+knn_backends = {"brute_force": BruteForceKNN, "sklearn": SklearnKNN, "flann": FlannKNN}
+
+parser = ArgumentParser()
+parser.add_argument("--feature-path", dest="feature_path")
+parser.add_argument("--knn", choices=list(knn_backends), default="brute_force")
+parser.add_argument("--metric", choices=["euclidean", "cosine"], default="euclidean")
+parser.add_argument("--n-neighbours", dest="n_neighbours", type=int, default=200)
+parser.add_argument("--thresholds", type=float, nargs="+", default=[0.3])
+parser.add_argument("--min-samples", dest="min_samples", type=int, default=10)
+args = parser.parse_args()
+
+feature_folder_path = f"{DATA_DIR}/{args.feature_path}"
+chinese_whispers_folder_path = f"{feature_folder_path}/clustering/chinese_whispers"
+
+# The kNN graph is cached next to the features, so it is computed only once.
+knn = knn_backends[args.knn](metric=args.metric)
+for i, threshold in enumerate(args.thresholds):
+    clustering = ChineseWhispersClustering(
+        args.n_neighbours, threshold, args.min_samples, knn=knn
+    )
+    clustering.cluster(feature_folder_path)
+    clustering.save_cluster_labels(f"{chinese_whispers_folder_path}/run_{i}")
@@ -0,0 +1,110 @@
+import json
+import multiprocessing
+import os
+import resource
+import time
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from sklearn.metrics import adjusted_rand_score
+
+from paths import DATA_DIR
+from src.clustering.aroc.aroc_clustering import AROClustering
+from src.clustering.aroc.partitioned_aroc_clustering import PartitionedAROClustering
+from src.evaluation.metrics import pairwise_f1
+from src.util.feature_loading import load_features
+
+parser = ArgumentParser()
+parser.add_argument("--feature-path", dest="feature_path")
+parser.add_argument("--n-samples", dest="n_samples", type=int, default=None)
+parser.add_argument("--n-neighbours", dest="n_neighbours", type=int, default=200)
+parser.add_argument("--threshold", type=float, default=0.1)
+parser.add_argument("--min-samples", dest="min_samples", type=int, default=10)
+parser.add_argument("--n-partitions", dest="n_partitions", type=int, default=20)
+parser.add_argument("--overlap", type=int, default=2)
+parser.add_argument("--num-proc", dest="num_proc", type=int, default=20)
+args = parser.parse_args()
+
+feature_folder_path = f"{DATA_DIR}/{args.feature_path}"
+aroc_folder_path = f"{feature_folder_path}/clustering/aroc"
+os.makedirs(aroc_folder_path, exist_ok=True)
+
+# The benchmark subset is a random sample of the faces in their original order.
+features = load_features(feature_folder_path, mmap_mode="r")
+if args.n_samples is not None and args.n_samples < features.shape[0]:
+    rows = np.sort(
+        np.random.default_rng(0).choice(
+            features.shape[0], size=args.n_samples, replace=False
+        )
+    )
+    features = np.asarray(features[rows])
+else:
+    features = np.asarray(features)
+
+clusterings = {
+    "monolithic": AROClustering(
+        args.n_neighbours, args.threshold, args.min_samples, num_proc=args.num_proc
+    ),
+    "partitioned": PartitionedAROClustering(
+        args.n_neighbours,
+        args.threshold,
+        args.min_samples,
+        args.n_partitions,
+        overlap=args.overlap,
+        num_proc=args.num_proc,
+    ),
+}
+
+
+def run_clustering(name):
+    # Runs in a fresh process, so that the peak resident set sizes of the process and
+    # of its worker processes belong to this clustering only.
+    start = time.perf_counter()
+    labels = clusterings[name].cluster(features)
+    elapsed_time = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux. For the children, it is the peak of the
+    # largest worker process.
+    peak_rss_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 2**10
+    peak_worker_rss_mb = (
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 2**10
+    )
+    return (
+        labels,
+        clusterings[name].get_config(),
+        elapsed_time,
+        peak_rss_mb,
+        peak_worker_rss_mb,
+    )
+
+
+results = {"n_samples": features.shape[0]}
+cluster_labels = {}
+configs = {}
+for name in clusterings:
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("fork")
+    ) as executor:
+        (
+            cluster_labels[name],
+            configs[name],
+            results[f"{name}_time"],
+            results[f"{name}_peak_rss_mb"],
+            results[f"{name}_peak_worker_rss_mb"],
+        ) = executor.submit(run_clustering, name).result()
+    results[f"{name}_n_clusters"] = int(
+        len(np.unique(cluster_labels[name][cluster_labels[name] != -1]))
+    )
+    results[f"{name}_fuzzy_ratio"] = float(np.mean(cluster_labels[name] == -1))
+
+results["adjusted_rand_index"] = adjusted_rand_score(
+    cluster_labels["monolithic"], cluster_labels["partitioned"]
+)
+results["pairwise_f1"] = pairwise_f1(
+    cluster_labels["monolithic"], cluster_labels["partitioned"]
+)
+results["partitioned_config"] = configs["partitioned"]
+
+print(json.dumps(results, indent=4))
+with open(f"{aroc_folder_path}/partitioned_comparison.json", mode="w") as f:
+    json.dump(results, f, indent=4)
@@ -7,8 +7,13 @@ parser = ArgumentParser()
 parser.add_argument("--feature-names", nargs="+", dest="feature_names")
 parser.add_argument("--feature-paths", nargs="+", dest="feature_paths")
 parser.add_argument("--save-folder", dest="save_folder")
+parser.add_argument("--virtual", action="store_true")
 args = parser.parse_args()
 
 feature_folder_paths = dict(zip(args.feature_names, args.feature_paths))
 feature_folder_paths = {k: f"{DATA_DIR}/{v}" for k, v in feature_folder_paths.items()}
-combine_and_save(feature_folder_paths, f"{DATA_DIR}/combinations/{args.save_folder}")
+combine_and_save(
+    feature_folder_paths,
+    f"{DATA_DIR}/combinations/{args.save_folder}",
+    virtual=args.virtual,
+)
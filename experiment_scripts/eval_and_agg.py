@@ -1,59 +1,65 @@
-import json
 import os
 from argparse import ArgumentParser
 
-import pandas as pd
-from tqdm import tqdm
-
 from paths import DATA_DIR
-from src.evaluation.evaluator import Evaluator
+from src.evaluation.batch_evaluator import BatchEvaluator
 
 parser = ArgumentParser()
 parser.add_argument("--feature-path", dest="feature_path")
 parser.add_argument("--clustering-type", dest="clustering_type")
+parser.add_argument("--internal", action="store_true")
+parser.add_argument(
+    "--silhouette-sample-size", dest="silhouette_sample_size", type=int, default=None
+)
+parser.add_argument("--distance-cache", dest="distance_cache", action="store_true")
+parser.add_argument("--n-bootstrap", dest="n_bootstrap", type=int, default=0)
+parser.add_argument("--n-jobs", dest="n_jobs", type=int, default=1)
 args = parser.parse_args()
 
 feature_folder_path = f"{DATA_DIR}/{args.feature_path}"
 clustering_folders_path = (
     f"{DATA_DIR}/{args.feature_path}/clustering/{args.clustering_type}"
 )
-clustering_folders_list = sorted(os.listdir(clustering_folders_path))
+# Only the run folders are evaluated, not the results of earlier evaluations.
+clustering_folders_list = sorted(
+    folder
+    for folder in os.listdir(clustering_folders_path)
+    if os.path.isdir(f"{clustering_folders_path}/{folder}")
+)
 
 # Compute results.
-for folder in tqdm(clustering_folders_list, desc="Evaluated Folders"):
-    folder_path = f"{clustering_folders_path}/{folder}"
-    evaluator = Evaluator(
-        do_internal=False,
-        do_external=True,
-        features_path=f"{feature_folder_path}/features.npy",
-        cluster_labels_folder_path=folder_path,
-        image_names_path=f"{feature_folder_path}/image_names.pickle",
-        ground_truth_path=f"{DATA_DIR}/labelled_faces/clean_labels.csv",
-    )
-    evaluator.compute_metrics()
-    evaluator.save_metrics()
+batch_evaluator = BatchEvaluator(
+    do_internal=args.internal,
+    do_external=True,
+    features_path=f"{feature_folder_path}/features.npy",
+    image_names_path=f"{feature_folder_path}/image_names.pickle",
+    ground_truth_path=f"{DATA_DIR}/labelled_faces/clean_labels.csv",
+    silhouette_sample_size=args.silhouette_sample_size,
+    use_distance_cache=args.distance_cache,
+    n_bootstrap=args.n_bootstrap,
+    n_jobs=args.n_jobs,
+)
+batch_evaluator.compute_metrics(
+    [f"{clustering_folders_path}/{folder}" for folder in clustering_folders_list]
+)
+batch_evaluator.save_metrics()
 
 # Aggregate results.
-all_results_df = pd.DataFrame(
-    columns=[
-        "name",
-        "image_count",
-        "non_fuzzy_count",
-        "test_image_count",
-        "cluster_count",
-        # "silhouette",
-        # "davies_bouldin",
-        "precision",
-        "recall",
-        "f1",
+columns = [
+    "image_count",
+    "non_fuzzy_count",
+    "test_image_count",
+    "cluster_count",
+]
+if args.internal:
+    columns += ["silhouette", "davies_bouldin"]
+    if args.silhouette_sample_size is not None:
+        columns += ["silhouette_ci_low", "silhouette_ci_high"]
+columns += ["precision", "recall", "f1"]
+if args.n_bootstrap > 0:
+    columns += [
+        f"{score}_ci_{bound}"
+        for score in ["precision", "recall", "f1"]
+        for bound in ["low", "high"]
     ]
-)
-for folder in clustering_folders_list:
-    folder_path = f"{clustering_folders_path}/{folder}"
-    with open(f"{folder_path}/metrics.json", mode="r") as f:
-        d = json.load(f)
-        d["name"] = folder
-        d_df = pd.DataFrame([d])
-        all_results_df = pd.concat([all_results_df, d_df], ignore_index=True)
-
-all_results_df.to_csv(f"{clustering_folders_path}/results.csv", index=False)
+batch_evaluator.save_results(f"{clustering_folders_path}/results.csv", columns)
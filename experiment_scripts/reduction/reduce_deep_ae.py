@@ -6,6 +6,7 @@ from tensorflow.python.framework.errors import OpError
 from paths import DATA_DIR
 from src.dimensionality_reduction.autoencoder.autoencoder_reducer import (
     AutoencoderReducer,
+    reduce_dimensions_jointly,
 )
 from src.dimensionality_reduction.autoencoder.deep_autoencoder import DeepAutoencoder
 
@@ -21,15 +22,41 @@ layer_dims_space = [[10], [50], [100], [200], [200, 100], [200, 50], [200, 10]]
 with open(f"{features_dir}/feature_config.json", mode="r") as f:
     output_dim = json.load(f)["feature_dim"]
 
-for i, layer_dims in enumerate(layer_dims_space):
-    ae = DeepAutoencoder(layer_dims=layer_dims, output_dim=output_dim)
-    reducer = AutoencoderReducer(ae, optimizer="adam", loss="mse")
-    try:
-        reducer.reduce_dimensions(features_dir=features_dir, epochs=30, batch_size=256)
-    except OpError as e:
-        print(f"TENSORFLOW EXCEPTION RAISE AT ITERATION {i}: {e}")
+
+def create_reducer(layer_dims):
+    return AutoencoderReducer(
+        DeepAutoencoder(layer_dims=layer_dims, output_dim=output_dim),
+        optimizer="adam",
+        loss="mse",
+    )
+
+
+reducers = [create_reducer(layer_dims) for layer_dims in layer_dims_space]
+try:
+    reduce_dimensions_jointly(
+        reducers, features_dir=features_dir, epochs=30, batch_size=256, patience=3
+    )
+except OpError as e:
+    # A failing configuration fails the whole grid, so the configurations are trained
+    # one by one instead and the failing ones are skipped.
+    print(f"TENSORFLOW EXCEPTION RAISE IN JOINT TRAINING: {e}")
+    reducers = []
+    for i, layer_dims in enumerate(layer_dims_space):
+        reducer = create_reducer(layer_dims)
+        try:
+            reducer.reduce_dimensions(
+                features_dir=features_dir, epochs=30, batch_size=256, patience=3
+            )
+        except OpError as e:
+            print(f"TENSORFLOW EXCEPTION RAISE AT ITERATION {i}: {e}")
+            reducer = None
+        reducers.append(reducer)
+
+for i, (reducer, layer_dims) in enumerate(zip(reducers, layer_dims_space)):
+    if reducer is None:
         continue
     reducer.save_reduced_features(f"{reductions_dir}/run_{i}")
+    reducer.save_model(f"{reductions_dir}/run_{i}")
     with open(f"{reductions_dir}/run_{i}/reducer_config.json", mode="r") as f:
         reducer_config = json.load(f)
     reducer_config["layer_dims"] = layer_dims
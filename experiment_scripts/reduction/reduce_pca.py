@@ -6,6 +6,8 @@ from src.dimensionality_reduction.pca_reducer import PCAReducer
 
 parser = ArgumentParser()
 parser.add_argument("--feature-path", dest="feature_path")
+parser.add_argument("--solver", default="full")
+parser.add_argument("--chunk-size", dest="chunk_size", type=int, default=10000)
 args = parser.parse_args()
 
 features_dir = f"{DATA_DIR}/{args.feature_path}"
@@ -16,7 +18,9 @@ n_components_space = [10, 50, 100, 200]
 with open(f"{features_dir}/feature_config.json", mode="r") as f:
     output_dim = json.load(f)["feature_dim"]
 
-for i, n_components in enumerate(n_components_space):
-    reducer = PCAReducer(n_components)
-    reducer.reduce_dimensions(features_dir=features_dir)
-    reducer.save_reduced_features(f"{reductions_dir}/run_{i}")
+reducer = PCAReducer(n_components_space, solver=args.solver, chunk_size=args.chunk_size)
+reducer.reduce_dimensions(features_dir=features_dir)
+reducer.save_reduced_features_sweep(
+    [f"{reductions_dir}/run_{i}" for i in range(len(n_components_space))],
+    save_models=True,
+)
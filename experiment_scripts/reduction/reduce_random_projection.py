@@ -0,0 +1,26 @@
+from argparse import ArgumentParser
+
+from paths import DATA_DIR
+from src.dimensionality_reduction.random_projection_reducer import (
+    RandomProjectionReducer,
+)
+from src.util.feature_loading import load_features
+
+parser = ArgumentParser()
+parser.add_argument("--feature-path", dest="feature_path")
+parser.add_argument("--chunk-size", dest="chunk_size", type=int, default=10000)
+args = parser.parse_args()
+
+features_dir = f"{DATA_DIR}/{args.feature_path}"
+reductions_dir = f"{features_dir}/reductions/random_projection"
+
+n_components_space = [10, 50, 100, 200]
+
+# The features are memory-mapped once and shared by all the runs.
+features = load_features(features_dir, mmap_mode="r")
+
+for i, n_components in enumerate(n_components_space):
+    reducer = RandomProjectionReducer(n_components, chunk_size=args.chunk_size)
+    reducer.reduce_dimensions(features_dir=features)
+    reducer.save_reduced_features(f"{reductions_dir}/run_{i}")
+    reducer.save_model(f"{reductions_dir}/run_{i}")
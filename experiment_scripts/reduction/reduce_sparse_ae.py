@@ -7,6 +7,7 @@ from tqdm.contrib.itertools import product
 from paths import DATA_DIR
 from src.dimensionality_reduction.autoencoder.autoencoder_reducer import (
     AutoencoderReducer,
+    reduce_dimensions_jointly,
 )
 from src.dimensionality_reduction.autoencoder.sparse_autoencoder import (
     SparseAutoencoder,
@@ -27,19 +28,49 @@ p_space = [0.1, 0.15]
 with open(f"{features_dir}/feature_config.json", mode="r") as f:
     output_dim = json.load(f)["feature_dim"]
 
-for i, (latent_dim, lambda_, beta, p) in enumerate(
-    product(latent_dim_space, lambda_space, beta_space, p_space)
-):
-    ae = SparseAutoencoder(
-        latent_dim=latent_dim, output_dim=output_dim, lambda_=lambda_, beta=beta, p=p
+configs = list(product(latent_dim_space, lambda_space, beta_space, p_space))
+
+
+def create_reducer(latent_dim, lambda_, beta, p):
+    return AutoencoderReducer(
+        SparseAutoencoder(
+            latent_dim=latent_dim,
+            output_dim=output_dim,
+            lambda_=lambda_,
+            beta=beta,
+            p=p,
+        ),
+        optimizer="adam",
+        loss="mse",
+    )
+
+
+reducers = [create_reducer(*config) for config in configs]
+try:
+    reduce_dimensions_jointly(
+        reducers, features_dir=features_dir, epochs=30, batch_size=256, patience=3
     )
-    reducer = AutoencoderReducer(ae, optimizer="adam", loss="mse")
-    try:
-        reducer.reduce_dimensions(features_dir=features_dir, epochs=30, batch_size=256)
-    except OpError as e:
-        print(f"TENSORFLOW EXCEPTION RAISE AT ITERATION {i}: {e}")
+except OpError as e:
+    # A failing configuration fails the whole grid, so the configurations are trained
+    # one by one instead and the failing ones are skipped.
+    print(f"TENSORFLOW EXCEPTION RAISE IN JOINT TRAINING: {e}")
+    reducers = []
+    for i, config in enumerate(configs):
+        reducer = create_reducer(*config)
+        try:
+            reducer.reduce_dimensions(
+                features_dir=features_dir, epochs=30, batch_size=256, patience=3
+            )
+        except OpError as e:
+            print(f"TENSORFLOW EXCEPTION RAISE AT ITERATION {i}: {e}")
+            reducer = None
+        reducers.append(reducer)
+
+for i, (reducer, (latent_dim, lambda_, beta, p)) in enumerate(zip(reducers, configs)):
+    if reducer is None:
         continue
     reducer.save_reduced_features(f"{reductions_dir}/run_{i}")
+    reducer.save_model(f"{reductions_dir}/run_{i}")
     with open(f"{reductions_dir}/run_{i}/reducer_config.json", mode="r") as f:
         reducer_config = json.load(f)
     reducer_config["latent_dim"] = latent_dim
@@ -5,7 +5,8 @@ from typing import Optional
 
 import numpy as np
 
-from src.util.helpers import create_json_dict
+from src.util.feature_loading import FeatureSource
+from src.util.helpers import atomic_open, create_json_dict
 
 
 class AbstractClustering(ABC):
@@ -14,14 +15,43 @@ class AbstractClustering(ABC):
         self.cluster_labels: Optional[np.ndarray] = None
 
     @abstractmethod
-    def cluster(self, features_dir: str) -> np.ndarray:
+    def cluster(self, features_dir: FeatureSource) -> np.ndarray:
         """Clusters the given samples.
 
-        :param features_dir: A string indicating the file containing the features.
+        :param features_dir: Either a string indicating the folder containing the
+            features or the already loaded features, see load_features.
         :return: A 1-d numpy array of shape containing the cluster label for each sample
             in the same order as the input array.
         """
 
+    @abstractmethod
+    def assign(self, features: np.ndarray) -> np.ndarray:
+        """Assigns new samples to the clusters found with cluster or restored with
+        load_model without clustering all the samples again, and updates the
+        clustering with the new samples.
+
+        :param features: A 2-d numpy array of shape (n_new_samples, n_features).
+        :return: A 1-d numpy array containing the cluster label for each new sample in
+            the same order as the input array.
+        """
+
+    @abstractmethod
+    def save_model(self, save_folder_path: str) -> None:
+        """Saves the state of the clustering and its configuration, such that the
+        clustering can be restored with load_model. Every file is replaced atomically.
+
+        :param save_folder_path: A sting indicating the folder to save the files to.
+        """
+
+    @abstractmethod
+    def load_model(self, model_folder_path: str) -> None:
+        """Restores the state of the clustering saved with save_model. The clustering
+        must be initialized with the same configuration as the saved clustering.
+
+        :param model_folder_path: A string indicating the folder containing the saved
+            clustering.
+        """
+
     def get_config(self) -> dict:
         """Returns the configuration of the clustering as a dictionary.
 
@@ -38,9 +68,12 @@ class AbstractClustering(ABC):
         if self.cluster_labels is None:
             raise ValueError("The clustering has not been done yet.")
 
+        self._save_config(save_folder_path)
+        np.save(f"{save_folder_path}/cluster_labels.npy", self.cluster_labels)
+
+    def _save_config(self, save_folder_path: str) -> None:
         if not os.path.isdir(save_folder_path):
             os.makedirs(save_folder_path)
 
-        with open(f"{save_folder_path}/clustering_config.json", mode="w") as f:
+        with atomic_open(f"{save_folder_path}/clustering_config.json", mode="w") as f:
             json.dump(self.get_config(), f)
-        np.save(f"{save_folder_path}/cluster_labels.npy", self.cluster_labels)
@@ -1,17 +1,22 @@
 """Approximate Rank-Order Clustering (AROC) algorithm: https://arxiv.org/abs/1604.00989
 Code taken from https://github.com/KunpengWang/approximate-rank-order-clustering/blob/master/aroc.py
 
-Note: pyflann is outdated, and it needs to be fixed after installing it with pip. For
-how to fix, refer to https://github.com/primetang/pyflann/issues/1
+The nearest neighbours are found with one of the backends in src.clustering.knn.
 """
-from functools import partial
-from multiprocessing import Pool
+from multiprocessing import Pool, shared_memory
+from typing import Optional
 
 import numpy as np
-import pyflann
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
 
+from src.clustering.knn.brute_force_knn import BruteForceKNN
 
-def cluster_aroc(features, n_neighbours, threshold, min_samples, num_proc):
+# The neighbour tables that the worker processes attach to, see _init_worker.
+_shared_arrays: dict = {}
+
+
+def cluster_aroc(features, n_neighbours, threshold, min_samples, num_proc, knn=None):
     """
     Calculates the pairwise distances between each face and merge all the faces
     with distances below a threshold.
@@ -22,110 +27,308 @@ def cluster_aroc(features, n_neighbours, threshold, min_samples, num_proc):
         threshold (float): Threshold
         min_samples (int): Minimum samples in a non-fuzzy cluster
         num_proc (int): Number of process to run simultaneously
+        knn (AbstractKNN): Backend for KNN, exact euclidean brute force if None
+    """
+    if knn is None:
+        knn = BruteForceKNN()
+    nearest_neighbours, _ = knn.query(features, n_neighbours)
+
+    return cluster_aroc_sweep(
+        nearest_neighbours, [n_neighbours], [threshold], [min_samples], num_proc
+    )[0]
+
+
+def cluster_aroc_sweep(
+    nearest_neighbours,
+    n_neighbours,
+    thresholds,
+    min_samples,
+    num_proc,
+    return_components=False,
+):
+    """
+    Clusters the faces for every combination of the given parameters. The neighbour
+    lists of every number of neighbours are the leading columns of the given neighbour
+    lists. The pairwise distances are calculated once per number of neighbours, and
+    the merging once per number of neighbours and threshold.
+
+    Args:
+        nearest_neighbours (np.ndarray): Neighbour lists with at least the largest
+            number of neighbours
+        n_neighbours (list): Numbers of neighbours for KNN
+        thresholds (list): Thresholds
+        min_samples (list): Minimum samples in a non-fuzzy cluster
+        num_proc (int): Number of process to run simultaneously
+        return_components (bool): Whether to also return the merged components
+
+    Returns:
+        A list with the cluster labels of every combination, ordered as
+        itertools.product(n_neighbours, thresholds, min_samples). If return_components
+        is True, a tuple of this list and a list with the component of every face for
+        every combination of n_neighbours and thresholds.
     """
-    n_samples: int = len(features)
+    cluster_labels = []
+    components = []
+    for k in n_neighbours:
+        # Calculate pairwise distances
+        distances = _rank_order_distances(nearest_neighbours[:, :k], num_proc)
+
+        for threshold in thresholds:
+            # Transitive merging
+            component_labels = _merge_components(
+                nearest_neighbours[:, :k], distances, threshold
+            )
+            components.append(component_labels)
+
+            for min_samples_ in min_samples:
+                cluster_labels.append(
+                    _convert_components_to_labels(component_labels, min_samples_)
+                )
+
+    if return_components:
+        return cluster_labels, components
+    return cluster_labels
+
 
-    # k-nearest neighbours using FLANN
-    flann = pyflann.FLANN()
-    params = flann.build_index(features, algorithm="kdtree", trees=4)
-    nearest_neighbours, distances = flann.nn_index(
-        features, n_neighbours, checks=params["checks"]
+def _rank_order_distances(
+    nearest_neighbours: np.ndarray, num_proc: int, block_size: Optional[int] = None
+) -> np.ndarray:
+    """
+    Calculates the rank-order distance between every face A and each face B in A's
+    nearest neighbours, based on directly summing the presence/absence of shared
+    nearest neighbours. The distance to a face B is 9999 if A is not in B's nearest
+    neighbours, and the distance of A to its first neighbour is 0.
+
+    The neighbour table is put in shared memory once, and every worker computes the
+    distances for blocks of faces with array operations.
+
+    Returns a float32 array of shape (n_samples, n_neighbours).
+    """
+    n_samples, n_neighbours = nearest_neighbours.shape
+    if block_size is None:
+        # Each block holds a few arrays of shape (block_size, k, k).
+        block_size = max(1, 2**20 // n_neighbours**2)
+    blocks: list[tuple[int, int]] = [
+        (start, min(start + block_size, n_samples))
+        for start in range(0, n_samples, block_size)
+    ]
+
+    neighbours_memory = shared_memory.SharedMemory(
+        create=True, size=max(n_samples * n_neighbours * 8, 1)
     )
+    is_first_memory = shared_memory.SharedMemory(
+        create=True, size=max(n_samples * n_neighbours, 1)
+    )
+    try:
+        neighbours: np.ndarray = np.ndarray(
+            (n_samples, n_neighbours), dtype=np.int64, buffer=neighbours_memory.buf
+        )
+        neighbours[:] = nearest_neighbours
+        is_first: np.ndarray = np.ndarray(
+            (n_samples, n_neighbours), dtype=bool, buffer=is_first_memory.buf
+        )
+        is_first[:] = _first_occurrences(neighbours)
 
-    # Build lookup table for nearest neighbours
-    neighbor_lookup = {}
-    for i in range(nearest_neighbours.shape[0]):
-        neighbor_lookup[i] = nearest_neighbours[i]
-
-    # Calculate pairwise distances
-    pool = Pool(processes=num_proc)
-    func = partial(_pairwise_distance, neighbor_lookup)
-    results = pool.map(func, range(len(neighbor_lookup)))
-    pool.close()
-    distances = []
-    for val in results:
-        distances.append(val[0])
-    distances = np.array(distances)
-
-    # Build lookup table for nearest neighbours filtered by threshold
-    for i, neighbor in neighbor_lookup.items():
-        neighbor_lookup[i] = set(
-            list(np.take(neighbor, np.where(distances[i] <= threshold)[0]))
+        init_args: tuple = (
+            neighbours_memory.name,
+            is_first_memory.name,
+            (n_samples, n_neighbours),
         )
+        if num_proc > 1:
+            with Pool(
+                processes=num_proc, initializer=_init_worker, initargs=init_args
+            ) as pool:
+                results: list[np.ndarray] = pool.starmap(_block_distances, blocks)
+        else:
+            _init_worker(*init_args)
+            results: list[np.ndarray] = [
+                _block_distances(start, stop) for start, stop in blocks
+            ]
+            _shared_arrays.clear()
+        del neighbours, is_first
+    finally:
+        neighbours_memory.close()
+        neighbours_memory.unlink()
+        is_first_memory.close()
+        is_first_memory.unlink()
 
-    # Transitive merging
-    clusters = []
-    nodes = set(list(np.arange(0, distances.shape[0])))
+    if len(results) == 0:
+        return np.zeros((0, n_neighbours), dtype=np.float32)
+    return np.concatenate(results, axis=0)
 
-    while nodes:
-        node = nodes.pop()
-        group = {node}  # Set of connected nodes
-        queue = [node]  # Build a queue
 
-        while queue:
-            node = queue.pop(0)  # Get the first node to visit
-            neighbours = neighbor_lookup[node]  # neighbours of the curent node
-            # Elements common to nodes and visit
-            intersection = nodes.intersection(neighbours)
-            # Intersection after removing elements found in group
-            intersection.difference_update(group)
-            # Nodes after removing elements found in intersection
-            nodes.difference_update(intersection)
-            group.update(intersection)  # Add connected neighbours
-            queue.extend(intersection)  # Add to queue
+def _first_occurrences(neighbours: np.ndarray) -> np.ndarray:
+    """
+    Marks the entries of every neighbour list that do not occur earlier in the list,
+    so that duplicate neighbours are only counted once, as with sets.
+    """
+    order: np.ndarray = np.argsort(neighbours, axis=1, kind="stable")
+    sorted_neighbours: np.ndarray = np.take_along_axis(neighbours, order, axis=1)
+    is_first_sorted: np.ndarray = np.ones(neighbours.shape, dtype=bool)
+    is_first_sorted[:, 1:] = sorted_neighbours[:, 1:] != sorted_neighbours[:, :-1]
+    is_first: np.ndarray = np.empty(neighbours.shape, dtype=bool)
+    np.put_along_axis(is_first, order, is_first_sorted, axis=1)
+    return is_first
 
-        clusters.append(group)
 
-    return _convert_clusters_to_ndarray(clusters, n_samples, min_samples)
+def _init_worker(neighbours_name: str, is_first_name: str, shape: tuple) -> None:
+    neighbours_memory = shared_memory.SharedMemory(name=neighbours_name)
+    is_first_memory = shared_memory.SharedMemory(name=is_first_name)
+    # The shared memory handles are kept so that the buffers stay valid.
+    _shared_arrays["memories"] = [neighbours_memory, is_first_memory]
+    _shared_arrays["neighbours"] = np.ndarray(
+        shape, dtype=np.int64, buffer=neighbours_memory.buf
+    )
+    _shared_arrays["is_first"] = np.ndarray(
+        shape, dtype=bool, buffer=is_first_memory.buf
+    )
+    _shared_arrays["rank_lookup"] = np.full(
+        shape[0], shape[1], dtype=np.int16 if shape[1] < 2**15 else np.int32
+    )
 
 
-def _pairwise_distance(neighbor_lookup, row_no):
+def _block_distances(start: int, stop: int) -> np.ndarray:
     """
-    Calculates the distance based on directly summing the presence/absence
-    of shared nearest neighbours.
+    Calculates the rank-order distances of the faces A in [start, stop). For a face A
+    and its j-th neighbour B:
+        o_A(B) = j
+        o_B(A) = the rank of A in B's neighbours
+        d(A, B) = # of A's top o_A(B) neighbours that are not in B's neighbours
+        d(B, A) = # of B's top o_B(A) neighbours that are not in A's neighbours
+        D(A, B) = (d(A, B) + d(B, A)) / min(o_A(B), o_B(A))
     """
-    distance = np.zeros([1, len(neighbor_lookup[row_no])])
-    row = neighbor_lookup[row_no]
+    neighbours: np.ndarray = _shared_arrays["neighbours"]
+    is_first: np.ndarray = _shared_arrays["is_first"]
+    n_samples, k = neighbours.shape
+    n_rows: int = stop - start
+    faces_a: np.ndarray = np.arange(start, stop)
+    rows: np.ndarray = np.arange(n_rows)
 
-    # For all neighbor(s) as face B in face A's nearest neighbours
-    for i, neighbor in enumerate(row[1:]):
-        oa_b = i + 1  # i-th face in the neighbor list of face A
+    neighbours_a: np.ndarray = neighbours[start:stop]  # (n_rows, k)
+    neighbours_b: np.ndarray = neighbours[neighbours_a]  # (n_rows, k, k)
 
-        # Rank of face A in face B's neighbor list
-        try:
-            neighbours_face_b = neighbor_lookup[neighbor]
-            ob_a = np.where(neighbours_face_b == row_no)[0][0] + 1
-        except IndexError:
-            ob_a = len(neighbor_lookup[row_no]) + 1
-            distance[0, oa_b] = 9999
-            continue
+    # Rank of each of B's neighbours in A's neighbours, or k if it is not one of them.
+    # The ranks of A's neighbours are scattered into a lookup table over all the faces,
+    # which is reset after every face A.
+    rank_lookup: np.ndarray = _shared_arrays["rank_lookup"]
+    ranks: np.ndarray = np.arange(k, dtype=rank_lookup.dtype)
+    ranks_in_a: np.ndarray = np.empty((n_rows, k, k), dtype=rank_lookup.dtype)
+    for row in rows:
+        first_neighbours: np.ndarray = neighbours_a[row, is_first[start + row]]
+        rank_lookup[first_neighbours] = ranks[is_first[start + row]]
+        ranks_in_a[row] = rank_lookup[neighbours_b[row]]
+        rank_lookup[first_neighbours] = k
 
-        # # of neighbor(s) that are not in face B's top k nearest neighbours
-        neighbours_face_a = set(row[:oa_b])
-        neighbours_face_b = set(neighbor_lookup[neighbor])
-        d_ab = len(neighbours_face_a.difference(neighbours_face_b))
+    # Rank of A in B's neighbours, counting from 1.
+    is_face_a: np.ndarray = neighbours_b == faces_a[:, None, None]
+    has_face_a: np.ndarray = is_face_a.any(axis=2)
+    o_b_a: np.ndarray = np.argmax(is_face_a, axis=2) + 1
 
-        # # of neighbor(s) that are not in face A's top k nearest neighbours
-        neighbours_face_a = set(neighbor_lookup[row_no])
-        neighbours_face_b = set(neighbor_lookup[neighbor][:ob_a])
-        d_ba = len(neighbours_face_b.difference(neighbours_face_a))
+    # d(A, B): A's top j neighbours that are not in B's neighbours.
+    in_b: np.ndarray = np.zeros((n_rows, k, k + 1), dtype=bool)
+    in_b[rows[:, None, None], np.arange(k)[None, :, None], ranks_in_a] = True
+    missing_in_b: np.ndarray = np.cumsum(
+        is_first[start:stop, None, :] & ~in_b[:, :, :k], axis=2, dtype=ranks.dtype
+    )
+    j: np.ndarray = np.arange(1, k)
+    d_ab: np.ndarray = missing_in_b[:, j, j - 1]
 
-        distance[0, oa_b] = float(d_ab + d_ba) / min(oa_b, ob_a)
+    # d(B, A): B's top o_B(A) neighbours that are not in A's neighbours.
+    missing_in_a: np.ndarray = np.cumsum(
+        (ranks_in_a == k) & is_first[neighbours_a], axis=2, dtype=ranks.dtype
+    )
+    d_ba: np.ndarray = np.take_along_axis(
+        missing_in_a[:, 1:], (o_b_a[:, 1:] - 1)[:, :, None], axis=2
+    )[:, :, 0]
 
-    return distance
+    distances: np.ndarray = np.zeros((n_rows, k), dtype=np.float32)
+    distances[:, 1:] = np.where(
+        has_face_a[:, 1:], (d_ab + d_ba) / np.minimum(j, o_b_a[:, 1:]), 9999
+    )
+    return distances
 
 
-def _convert_clusters_to_ndarray(
-    clusters: list[set], n_samples: int, min_samples: int
+def _merge_components(
+    nearest_neighbours: np.ndarray, distances: np.ndarray, threshold: float
 ) -> np.ndarray:
-    cluster_labels: np.ndarray = np.empty(n_samples)
-    i: int = 0
-    for cluster in clusters:
-        if len(cluster) < min_samples:
-            for sample in cluster:
-                cluster_labels[sample] = -1
-        else:
-            for sample in cluster:
-                cluster_labels[sample] = i
-            i += 1
-    return cluster_labels
+    """
+    Links every face to its nearest neighbours with distances below the threshold and
+    finds the connected components of the resulting sparse graph. A link in either
+    direction connects two faces.
+
+    Returns an array with the component of every face.
+    """
+    n_samples, n_neighbours = nearest_neighbours.shape
+    is_linked: np.ndarray = (distances <= np.float32(threshold)).ravel()
+    graph: sparse.csr_matrix = sparse.csr_matrix(
+        (
+            np.ones(is_linked.sum(), dtype=bool),
+            (
+                np.repeat(np.arange(n_samples), n_neighbours)[is_linked],
+                nearest_neighbours.ravel()[is_linked],
+            ),
+        ),
+        shape=(n_samples, n_samples),
+    )
+    _, component_labels = connected_components(graph, directed=True, connection="weak")
+    return component_labels
+
+
+def _convert_components_to_labels(
+    component_labels: np.ndarray, min_samples: int
+) -> np.ndarray:
+    """
+    Numbers the components with at least min_samples faces consecutively, and marks the
+    faces of the smaller components as fuzzy with -1.
+    """
+    cluster_numbers: np.ndarray = _get_component_clusters(
+        np.bincount(component_labels), min_samples
+    )
+    return cluster_numbers[component_labels].astype(np.float64)
+
+
+def _get_component_clusters(
+    component_sizes: np.ndarray, min_samples: int
+) -> np.ndarray:
+    """
+    Returns the cluster number of every component, or -1 for the fuzzy components.
+    """
+    is_cluster: np.ndarray = component_sizes >= min_samples
+    return np.where(is_cluster, np.cumsum(is_cluster) - 1, -1)
+
+
+def _face_rank_order_distances(
+    face_neighbours: np.ndarray, neighbour_lists: np.ndarray
+) -> np.ndarray:
+    """
+    Calculates the rank-order distances between a single face A and its nearest
+    neighbours, as in _block_distances. face_neighbours holds A's neighbour list,
+    starting with A itself, and neighbour_lists the neighbour lists of every one of
+    them, in which A appears if it is among their nearest neighbours.
+
+    Returns an array with the distance to every neighbour of A, 0 for A itself.
+    """
+    k: int = len(face_neighbours)
+    j: np.ndarray = np.arange(1, k)
+
+    # d(A, B): A's top j neighbours that are not in B's neighbours.
+    in_b: np.ndarray = (
+        face_neighbours[None, :, None] == neighbour_lists[:, None, :]
+    ).any(axis=2)
+    d_ab: np.ndarray = np.cumsum(~in_b, axis=1)[j, j - 1]
+
+    # d(B, A): B's top o_B(A) neighbours that are not in A's neighbours, with the
+    # rank o_B(A) of A in B's neighbours counting from 1.
+    is_face_a: np.ndarray = neighbour_lists == face_neighbours[0]
+    has_face_a: np.ndarray = is_face_a.any(axis=1)
+    o_b_a: np.ndarray = np.argmax(is_face_a, axis=1) + 1
+    missing_in_a: np.ndarray = np.cumsum(
+        ~np.isin(neighbour_lists, face_neighbours), axis=1
+    )
+    d_ba: np.ndarray = missing_in_a[j, o_b_a[1:] - 1]
+
+    distances: np.ndarray = np.zeros(k, dtype=np.float32)
+    distances[1:] = np.where(
+        has_face_a[1:], (d_ab + d_ba) / np.minimum(j, o_b_a[1:]), 9999
+    )
+    return distances
@@ -1,38 +1,332 @@
+from itertools import product
+from typing import Optional, Union
+
 import numpy as np
 
 from src.clustering.abstract_clustering import AbstractClustering
-from src.clustering.aroc.aroc import cluster_aroc
+from src.clustering.aroc.aroc import (
+    _face_rank_order_distances,
+    _get_component_clusters,
+    cluster_aroc_sweep,
+)
+from src.clustering.knn.abstract_knn import AbstractKNN, merge_neighbours
+from src.clustering.knn.brute_force_knn import BruteForceKNN
+from src.util.feature_loading import FeatureSource, load_features
+from src.util.helpers import atomic_open
 
 
 class AROClustering(AbstractClustering):
     def __init__(
-        self, n_neighbours: int, threshold: float, min_samples: int, num_proc: int = 20
+        self,
+        n_neighbours: Union[int, list[int]],
+        threshold: Union[float, list[float]],
+        min_samples: Union[int, list[int]],
+        knn: Optional[AbstractKNN] = None,
+        num_proc: int = 20,
     ):
-        """Inits an AROClustering instance.
+        """Inits an AROClustering instance. If a list is given for any of the
+        parameters, the samples are clustered for every combination of the parameters
+        at once, reusing the nearest neighbours and the pairwise distances across the
+        combinations.
 
-        :param n_neighbours: An integer indicating the number of neighbors to use.
-        :param threshold: A float indicating the merging threshold.
-        :param min_samples: An integer indicating the minimum number of samples in a
-            cluster such that the samples are not considered fuzzy.
+        :param n_neighbours: Either an integer indicating the number of neighbors to use
+            or a list of integers containing multiple numbers of neighbours.
+        :param threshold: Either a float indicating the merging threshold or a list of
+            floats containing multiple thresholds.
+        :param min_samples: Either an integer indicating the minimum number of samples
+            in a cluster such that the samples are not considered fuzzy or a list of
+            integers containing multiple minimum numbers of samples.
+        :param knn: An instance of AbstractKNN used for finding the nearest neighbours.
+            The kNN graph is cached next to the features. If None, the exact euclidean
+            neighbours are found with BruteForceKNN. Defaults to None.
         :param num_proc: An integer indicating the number of cores to use. Defaults to
             20.
         """
         super().__init__()
-        self.n_neighbours: int = n_neighbours
-        self.threshold: float = threshold
-        self.min_samples: int = min_samples
+        self.n_neighbours: Union[int, list[int]] = n_neighbours
+        self.threshold: Union[float, list[float]] = threshold
+        self.min_samples: Union[int, list[int]] = min_samples
+        self.knn: AbstractKNN = BruteForceKNN() if knn is None else knn
+        self.knn_config: dict = self.knn.get_config()
         self.num_proc: int = num_proc
 
-    def cluster(self, features_dir: str) -> np.ndarray:
-        """Clusters the given samples.
+        # The state used for assigning new samples, which is only kept for a single
+        # combination of the parameters.
+        self.features_dir: Optional[FeatureSource] = None
+        self.nearest_neighbours: Optional[np.ndarray] = None
+        self.neighbour_distances: Optional[np.ndarray] = None
+        self.component_labels: Optional[np.ndarray] = None
+        self.component_sizes: Optional[np.ndarray] = None
+        self.component_clusters: Optional[np.ndarray] = None
+        self.added_features: Optional[np.ndarray] = None
+
+    def cluster(self, features_dir: FeatureSource) -> np.ndarray:
+        """Clusters the given samples. If a list is given for any of the parameters,
+        the samples are clustered for every combination of the parameters.
 
-        :param features_dir: A string indicating the file containing the features.
+        :param features_dir: Either a string indicating the folder containing the
+            features or the already loaded features, see load_features.
         :return: A 1-d numpy array of shape containing the cluster label for each sample
-            in the same order as the input array.
+            in the same order as the input array. For multiple combinations of the
+            parameters, a 2-d numpy array of shape (n_combinations, n_samples)
+            containing the cluster labels of every combination, in the order of
+            get_parameter_combinations.
         """
-        features: np.ndarray = np.load(f"{features_dir}/features.npy").astype("int32")
-        self.cluster_labels = cluster_aroc(
-            features, self.n_neighbours, self.threshold, self.min_samples, self.num_proc
+        nearest_neighbours, distances = self.knn.get_neighbours(
+            features_dir, max(_as_list(self.n_neighbours))
+        )
+        cluster_labels, component_labels = cluster_aroc_sweep(
+            nearest_neighbours,
+            _as_list(self.n_neighbours),
+            _as_list(self.threshold),
+            _as_list(self.min_samples),
+            self.num_proc,
+            return_components=True,
         )
+        if self._is_sweep():
+            self.cluster_labels = np.stack(cluster_labels)
+        else:
+            self.cluster_labels = cluster_labels[0]
+            self.features_dir = features_dir
+            self.nearest_neighbours = np.array(nearest_neighbours, dtype=np.int64)
+            self.neighbour_distances = np.array(distances, dtype=np.float32)
+            self.component_labels = component_labels[0]
+            self.component_sizes = np.bincount(self.component_labels)
+            self.component_clusters = _get_component_clusters(
+                self.component_sizes, self.min_samples
+            )
+            self.added_features = np.zeros(
+                (0, np.shape(load_features(features_dir, mmap_mode="r"))[1]),
+                dtype=np.float32,
+            )
 
         return self.cluster_labels
+
+    def assign(self, features: np.ndarray) -> np.ndarray:
+        """Assigns new samples to the clusters one at a time. The exact nearest
+        neighbours of a sample are searched among the clustered samples and the samples
+        assigned before it, and the sample is inserted into the neighbour lists of its
+        neighbours. The sample joins the component of its nearest neighbour within the
+        threshold, or opens a new component if there is none. Components are never
+        merged, so the labels of the existing clusters are stable. A fuzzy component
+        that reaches the minimum number of samples becomes a new cluster.
+
+        :param features: A 2-d numpy array of shape (n_new_samples, n_features).
+        :return: A 1-d numpy array containing the cluster label for each new sample in
+            the same order as the input array.
+        """
+        if self._is_sweep():
+            raise ValueError("Samples can only be assigned for a single combination.")
+        if self.nearest_neighbours is None:
+            raise ValueError("The clustering has not been done or loaded yet.")
+        if self.features_dir is None:
+            raise ValueError("The folder of the clustered features is unknown.")
+
+        features = np.asarray(features, dtype=np.float32)
+        knn: BruteForceKNN = BruteForceKNN(self.knn.metric)
+        clustered_features: np.ndarray = load_features(self.features_dir, mmap_mode="r")
+        n_clustered: int = clustered_features.shape[0]
+        n_added: int = len(self.added_features)
+        n_index: int = n_clustered + n_added
+        n_new: int = len(features)
+        n_candidates: int = self.n_neighbours - 1
+
+        # The candidate neighbours of all the new samples are searched at once among
+        # the memory-mapped clustered samples, the samples assigned by earlier calls,
+        # and the new samples before every sample.
+        neighbour_sets: list[tuple[np.ndarray, np.ndarray]] = [
+            knn.search(clustered_features, features, n_candidates)
+        ]
+        if n_added > 0:
+            added_neighbours, added_distances = knn.search(
+                self.added_features, features, min(n_candidates, n_added)
+            )
+            neighbour_sets.append((n_clustered + added_neighbours, added_distances))
+        if n_new > 1:
+            new_neighbours, new_distances = knn.search(
+                features, features, min(n_candidates, n_new), only_earlier=True
+            )
+            neighbour_sets.append((n_index + new_neighbours, new_distances))
+        candidates, candidate_distances = merge_neighbours(neighbour_sets, n_candidates)
+
+        self._grow_state(n_new)
+        for i in range(n_new):
+            self._assign_sample(n_index + i, candidates[i], candidate_distances[i])
+        self.added_features[n_added:] = features
+
+        return self.cluster_labels[n_index:].copy()
+
+    def save_model(self, save_folder_path: str) -> None:
+        """Saves the neighbour lists, the components, the cluster labels of all the
+        samples, the assigned samples, and the folder of the clustered features into a
+        single file, so that the saved state is always consistent, and the
+        configuration of the clustering next to it. The features must have been given
+        as a folder.
+
+        :param save_folder_path: A sting indicating the folder to save the files to.
+        """
+        if self.nearest_neighbours is None:
+            raise ValueError("The clustering has not been done or loaded yet.")
+        if not isinstance(self.features_dir, str):
+            raise ValueError(
+                "Only the clustering of features given as a folder can be saved, since "
+                "assign reads the clustered features from the folder."
+            )
+
+        self._save_config(save_folder_path)
+        with atomic_open(f"{save_folder_path}/aroc_model.npz") as f:
+            np.savez(
+                f,
+                features_dir=self.features_dir,
+                nearest_neighbours=self.nearest_neighbours,
+                neighbour_distances=self.neighbour_distances,
+                component_labels=self.component_labels,
+                component_sizes=self.component_sizes,
+                component_clusters=self.component_clusters,
+                cluster_labels=self.cluster_labels,
+                added_features=self.added_features,
+            )
+
+    def load_model(self, model_folder_path: str) -> None:
+        """Restores the state of the clustering saved with save_model.
+
+        :param model_folder_path: A string indicating the folder containing the saved
+            clustering.
+        """
+        with np.load(f"{model_folder_path}/aroc_model.npz") as model:
+            self.features_dir = str(model["features_dir"])
+            self.nearest_neighbours = model["nearest_neighbours"]
+            self.neighbour_distances = model["neighbour_distances"]
+            self.component_labels = model["component_labels"]
+            self.component_sizes = model["component_sizes"]
+            self.component_clusters = model["component_clusters"]
+            self.cluster_labels = model["cluster_labels"]
+            self.added_features = model["added_features"]
+
+    def get_parameter_combinations(self) -> list[tuple[int, float, int]]:
+        """Returns the combinations of the parameters in the order they are clustered.
+
+        :return: A list of 3-tuples containing the number of neighbours, the threshold,
+            and the minimum number of samples of every combination.
+        """
+        return list(
+            product(
+                _as_list(self.n_neighbours),
+                _as_list(self.threshold),
+                _as_list(self.min_samples),
+            )
+        )
+
+    def save_cluster_labels_sweep(self, save_folder_paths: list[str]) -> None:
+        """Saves the cluster labels and the configuration of the clustering for each of
+        the combinations of the parameters.
+
+        :param save_folder_paths: A list of strings indicating the folders to save the
+            files of each combination to, in the order of get_parameter_combinations.
+        """
+        if self.cluster_labels is None:
+            raise ValueError("The clustering has not been done yet.")
+        if not self._is_sweep():
+            raise ValueError("A sweep requires a list for at least one parameter.")
+        combinations: list[tuple[int, float, int]] = self.get_parameter_combinations()
+        if len(save_folder_paths) != len(combinations):
+            raise ValueError(
+                "The number of folders must match the number of parameter combinations."
+            )
+
+        for (
+            (n_neighbours, threshold, min_samples),
+            cluster_labels,
+            save_folder_path,
+        ) in zip(combinations, self.cluster_labels, save_folder_paths):
+            run_clustering: AROClustering = AROClustering(
+                n_neighbours,
+                threshold,
+                min_samples,
+                knn=self.knn,
+                num_proc=self.num_proc,
+            )
+            run_clustering.cluster_labels = cluster_labels
+            run_clustering.save_cluster_labels(save_folder_path)
+
+    def _grow_state(self, n_new: int) -> None:
+        # Makes room for the new samples at once instead of once per sample. The tables
+        # are views of buffers that grow geometrically, so that assigning samples in
+        # many small calls copies the tables only a logarithmic number of times.
+        for name in [
+            "nearest_neighbours",
+            "neighbour_distances",
+            "component_labels",
+            "cluster_labels",
+            "added_features",
+        ]:
+            table: np.ndarray = getattr(self, name)
+            n_rows: int = len(table) + n_new
+            buffer: Optional[np.ndarray] = table.base
+            if (
+                not isinstance(buffer, np.ndarray)
+                or buffer.dtype != table.dtype
+                or buffer.shape[1:] != table.shape[1:]
+                or len(buffer) < n_rows
+                or not np.shares_memory(buffer[:1], table[:1])
+            ):
+                buffer = np.empty(
+                    (max(n_rows, 2 * len(table)),) + table.shape[1:], dtype=table.dtype
+                )
+                buffer[: len(table)] = table
+            setattr(self, name, buffer[:n_rows])
+
+    def _assign_sample(
+        self, sample: int, candidates: np.ndarray, candidate_distances: np.ndarray
+    ) -> None:
+        # Inserts the sample into the neighbour lists of its neighbours that it is
+        # closer to than their farthest neighbour.
+        for neighbour, distance in zip(candidates, candidate_distances):
+            position: int = int(
+                np.searchsorted(
+                    self.neighbour_distances[neighbour], distance, side="right"
+                )
+            )
+            if position < self.n_neighbours:
+                for table, value in [
+                    (self.nearest_neighbours, sample),
+                    (self.neighbour_distances, distance),
+                ]:
+                    table[neighbour, position + 1 :] = table[neighbour, position:-1]
+                    table[neighbour, position] = value
+
+        sample_neighbours: np.ndarray = np.concatenate([[sample], candidates])
+        self.nearest_neighbours[sample] = sample_neighbours
+        self.neighbour_distances[sample] = np.concatenate([[0], candidate_distances])
+        distances: np.ndarray = _face_rank_order_distances(
+            sample_neighbours, self.nearest_neighbours[sample_neighbours]
+        )
+
+        is_linked: np.ndarray = distances[1:] <= np.float32(self.threshold)
+        if is_linked.any():
+            component: int = int(self.component_labels[candidates[is_linked][0]])
+        else:
+            component: int = len(self.component_sizes)
+            self.component_sizes = np.append(self.component_sizes, 0)
+            self.component_clusters = np.append(self.component_clusters, -1)
+        self.component_labels[sample] = component
+        self.component_sizes[component] += 1
+
+        if (
+            self.component_clusters[component] == -1
+            and self.component_sizes[component] >= self.min_samples
+        ):
+            self.component_clusters[component] = self.component_clusters.max() + 1
+            is_member: np.ndarray = self.component_labels[:sample] == component
+            self.cluster_labels[:sample][is_member] = self.component_clusters[component]
+        self.cluster_labels[sample] = self.component_clusters[component]
+
+    def _is_sweep(self) -> bool:
+        return any(
+            isinstance(parameter, list)
+            for parameter in [self.n_neighbours, self.threshold, self.min_samples]
+        )
+
+
+def _as_list(parameter: Union[int, float, list]) -> list:
+    return parameter if isinstance(parameter, list) else [parameter]
@@ -0,0 +1,399 @@
+from multiprocessing import Pool
+from typing import Optional
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from sklearn.metrics import euclidean_distances, pairwise_distances_argmin
+
+from src.clustering.abstract_clustering import AbstractClustering
+from src.clustering.aroc.aroc import (
+    _convert_components_to_labels,
+    _merge_components,
+    _rank_order_distances,
+)
+from src.clustering.kmeans_clustering import KMeansClustering
+from src.clustering.knn.abstract_knn import AbstractKNN, normalize_rows
+from src.clustering.knn.brute_force_knn import BruteForceKNN
+from src.util.feature_loading import (
+    FeatureSource,
+    SharedFeatures,
+    iter_row_chunks,
+    load_features,
+    to_process_source,
+)
+from src.util.helpers import atomic_open
+
+
+class PartitionedAROClustering(AbstractClustering):
+    def __init__(
+        self,
+        n_neighbours: int,
+        threshold: float,
+        min_samples: int,
+        n_partitions: int,
+        overlap: int = 2,
+        overlap_margin: float = 0.1,
+        n_representative_neighbours: int = 10,
+        knn: Optional[AbstractKNN] = None,
+        chunk_size: int = 10000,
+        random_state: int = 0,
+        num_proc: int = 20,
+    ) -> None:
+        """Inits a PartitionedAROClustering instance, which runs AROC in two stages for
+        large numbers of samples. First, the samples are split into overlapping blocks
+        with mini-batch k-means, and AROC runs inside every block in parallel. Then,
+        the components of the blocks are merged across the block boundaries through
+        the samples shared by the blocks and through links between components of
+        different blocks whose centroids are nearest neighbours and closer than the
+        sum of their radii. For a fixed block size, the time and the memory grow
+        linearly with the number of samples.
+
+        :param n_neighbours: An integer indicating the number of neighbors to use.
+        :param threshold: A float indicating the merging threshold.
+        :param min_samples: An integer indicating the minimum number of samples in a
+            cluster such that the samples are not considered fuzzy.
+        :param n_partitions: An integer indicating the number of blocks, which should be
+            chosen such that a block holds a few thousand samples.
+        :param overlap: An integer indicating the maximum number of blocks that a
+            sample is put into. Defaults to 2.
+        :param overlap_margin: A float indicating how much farther than the nearest
+            partition center, relative to its distance, another partition center may be
+            for a sample to be put into its block as well. Defaults to 0.1.
+        :param n_representative_neighbours: An integer indicating the number of nearest
+            centroids of every component that are considered for linking. Defaults to
+            10.
+        :param knn: An instance of AbstractKNN used for finding the nearest neighbours
+            inside the blocks and between the centroids. If None, the exact euclidean
+            neighbours are found with BruteForceKNN. Defaults to None.
+        :param chunk_size: An integer indicating the number of samples per chunk for the
+            mini-batch k-means. Defaults to 10000.
+        :param random_state: An integer indicating the seed of the partitioning.
+            Defaults to 0.
+        :param num_proc: An integer indicating the number of blocks that are clustered
+            in parallel. Defaults to 20.
+        """
+        super().__init__()
+        self.n_neighbours: int = n_neighbours
+        self.threshold: float = threshold
+        self.min_samples: int = min_samples
+        self.n_partitions: int = n_partitions
+        self.overlap: int = min(overlap, n_partitions)
+        self.overlap_margin: float = overlap_margin
+        self.n_representative_neighbours: int = n_representative_neighbours
+        self.knn: AbstractKNN = BruteForceKNN() if knn is None else knn
+        self.knn_config: dict = self.knn.get_config()
+        self.chunk_size: int = chunk_size
+        self.random_state: int = random_state
+        self.num_proc: int = num_proc
+
+        self.features_dir: Optional[FeatureSource] = None
+        self.partition_centers: Optional[np.ndarray] = None
+        self.sample_partitions: Optional[np.ndarray] = None
+        self.block_sizes: list[int] = []
+        self.n_representatives: Optional[int] = None
+        self.added_features: Optional[np.ndarray] = None
+
+    def cluster(self, features_dir: FeatureSource) -> np.ndarray:
+        """Clusters the given samples.
+
+        :param features_dir: Either a string indicating the folder containing the
+            features or the already loaded features, see load_features.
+        :return: A 1-d numpy array of shape containing the cluster label for each sample
+            in the same order as the input array.
+        """
+        features: np.ndarray = load_features(features_dir, mmap_mode="r")
+        n_samples: int = features.shape[0]
+        partitioning: KMeansClustering = KMeansClustering(
+            self.n_partitions,
+            mode="minibatch",
+            chunk_size=self.chunk_size,
+            random_state=self.random_state,
+        )
+        partitioning.cluster(features)
+        self.features_dir = features_dir
+        self.partition_centers = partitioning.cluster_centers
+        self.sample_partitions = self._get_nearest_partitions(features)
+        blocks: list[np.ndarray] = [
+            block
+            for block in _get_blocks(self.sample_partitions, self.n_partitions)
+            if len(block) > 0
+        ]
+        self.block_sizes = [len(block) for block in blocks]
+
+        # The worker processes read the features from their folder, or attach to them
+        # in shared memory.
+        shared_features: Optional[SharedFeatures] = None
+        source: FeatureSource = features_dir
+        if self.num_proc > 1:
+            source, shared_features = to_process_source(features_dir)
+        block_args: list[tuple] = [
+            (source, block, self.n_neighbours, self.threshold, self.knn)
+            for block in blocks
+        ]
+        try:
+            if self.num_proc > 1:
+                with Pool(processes=self.num_proc) as pool:
+                    block_results: list[tuple] = pool.starmap(
+                        _cluster_block, block_args
+                    )
+            else:
+                block_results: list[tuple] = [
+                    _cluster_block(*args) for args in block_args
+                ]
+        finally:
+            if shared_features is not None:
+                shared_features.close()
+
+        component_labels: np.ndarray = self._merge_blocks(
+            n_samples, blocks, block_results
+        )
+        self.cluster_labels = _convert_components_to_labels(
+            component_labels, self.min_samples
+        )
+        self.added_features = np.zeros((0, features.shape[1]), dtype=np.float32)
+
+        return self.cluster_labels
+
+    def assign(self, features: np.ndarray) -> np.ndarray:
+        """Assigns new samples to the cluster of their nearest neighbour among the
+        samples in the block of their nearest partition center, including the samples
+        assigned by earlier calls. Samples whose nearest neighbour is fuzzy are fuzzy
+        as well.
+
+        :param features: A 2-d numpy array of shape (n_new_samples, n_features).
+        :return: A 1-d numpy array containing the cluster label for each new sample in
+            the same order as the input array.
+        """
+        if self.partition_centers is None:
+            raise ValueError("The clustering has not been done or loaded yet.")
+        if self.features_dir is None:
+            raise ValueError("The folder of the clustered features is unknown.")
+
+        features = np.asarray(features, dtype=np.float32)
+        clustered_features: np.ndarray = load_features(self.features_dir, mmap_mode="r")
+        n_clustered: int = clustered_features.shape[0]
+        knn: BruteForceKNN = BruteForceKNN(self.knn.metric)
+        partitions: np.ndarray = pairwise_distances_argmin(
+            features, self.partition_centers
+        )
+        cluster_labels: np.ndarray = np.full(len(features), -1.0)
+        blocks: list[np.ndarray] = _get_blocks(
+            self.sample_partitions, len(self.partition_centers)
+        )
+        for partition in np.unique(partitions):
+            block: np.ndarray = blocks[partition]
+            if len(block) == 0:
+                continue
+            is_clustered: np.ndarray = block < n_clustered
+            block_features: np.ndarray = np.concatenate(
+                [
+                    np.asarray(
+                        clustered_features[block[is_clustered]], dtype=np.float32
+                    ),
+                    self.added_features[block[~is_clustered] - n_clustered],
+                ]
+            )
+            is_partition: np.ndarray = partitions == partition
+            neighbours, _ = knn.search(block_features, features[is_partition], 1)
+            cluster_labels[is_partition] = self.cluster_labels[block[neighbours[:, 0]]]
+
+        self.sample_partitions = np.concatenate(
+            [self.sample_partitions, self._get_nearest_partitions(features)]
+        )
+        self.cluster_labels = np.concatenate([self.cluster_labels, cluster_labels])
+        self.added_features = np.concatenate([self.added_features, features])
+        return cluster_labels
+
+    def save_model(self, save_folder_path: str) -> None:
+        """Saves the partition centers, the blocks and the cluster labels of all the
+        samples, the assigned samples, and the folder of the clustered features into a
+        single file, so that the saved state is always consistent, and the
+        configuration of the clustering next to it. The features must have been given
+        as a folder.
+
+        :param save_folder_path: A sting indicating the folder to save the files to.
+        """
+        if self.partition_centers is None:
+            raise ValueError("The clustering has not been done or loaded yet.")
+        if not isinstance(self.features_dir, str):
+            raise ValueError(
+                "Only the clustering of features given as a folder can be saved, since "
+                "assign reads the clustered features from the folder."
+            )
+
+        self._save_config(save_folder_path)
+        with atomic_open(f"{save_folder_path}/partitioned_aroc_model.npz") as f:
+            np.savez(
+                f,
+                features_dir=self.features_dir,
+                partition_centers=self.partition_centers,
+                sample_partitions=self.sample_partitions,
+                cluster_labels=self.cluster_labels,
+                added_features=self.added_features,
+            )
+
+    def load_model(self, model_folder_path: str) -> None:
+        """Restores the state of the clustering saved with save_model.
+
+        :param model_folder_path: A string indicating the folder containing the saved
+            clustering.
+        """
+        with np.load(f"{model_folder_path}/partitioned_aroc_model.npz") as model:
+            self.features_dir = str(model["features_dir"])
+            self.partition_centers = model["partition_centers"]
+            self.sample_partitions = model["sample_partitions"]
+            self.cluster_labels = model["cluster_labels"]
+            self.added_features = model["added_features"]
+
+    def _get_nearest_partitions(self, features: np.ndarray) -> np.ndarray:
+        # Finds the partitions of the nearest partition centers of every sample within
+        # the margin, one chunk at a time. Missing partitions are marked with -1.
+        sample_partitions: np.ndarray = np.empty(
+            (features.shape[0], self.overlap), dtype=np.int64
+        )
+        for start, chunk in iter_row_chunks(features, self.chunk_size):
+            distances: np.ndarray = euclidean_distances(
+                chunk, self.partition_centers, squared=True
+            )
+            nearest: np.ndarray = np.argpartition(distances, self.overlap - 1, axis=1)[
+                :, : self.overlap
+            ]
+            nearest_distances: np.ndarray = np.sqrt(
+                np.take_along_axis(distances, nearest, axis=1)
+            )
+            order: np.ndarray = np.argsort(nearest_distances, axis=1)
+            nearest = np.take_along_axis(nearest, order, axis=1)
+            nearest_distances = np.take_along_axis(nearest_distances, order, axis=1)
+            is_within_margin: np.ndarray = nearest_distances <= nearest_distances[
+                :, :1
+            ] * (1 + self.overlap_margin)
+            sample_partitions[start : start + len(chunk)] = np.where(
+                is_within_margin, nearest, -1
+            )
+        return sample_partitions
+
+    def _merge_blocks(
+        self,
+        n_samples: int,
+        blocks: list[np.ndarray],
+        block_results: list[tuple[np.ndarray, np.ndarray, np.ndarray]],
+    ) -> np.ndarray:
+        # Links every sample to the first sample of its component in each of its
+        # blocks, which connects the components of different blocks through their
+        # shared samples, and links the first samples of components in different
+        # blocks whose centroids are nearest neighbours and closer than the sum of
+        # their radii.
+        rows: list[np.ndarray] = []
+        columns: list[np.ndarray] = []
+        representatives: list[np.ndarray] = []
+        radii: list[np.ndarray] = []
+        anchors: list[np.ndarray] = []
+        representative_blocks: list[np.ndarray] = []
+        for i, (block, (component_labels, centroids, centroid_radii)) in enumerate(
+            zip(blocks, block_results)
+        ):
+            component_sizes: np.ndarray = np.bincount(component_labels)
+            order: np.ndarray = np.argsort(component_labels, kind="stable")
+            first_samples: np.ndarray = block[
+                order[np.cumsum(component_sizes) - component_sizes]
+            ]
+            rows.append(block)
+            columns.append(first_samples[component_labels])
+
+            representatives.append(centroids)
+            radii.append(centroid_radii)
+            anchors.append(first_samples[component_sizes >= 2])
+            representative_blocks.append(np.full(len(centroids), i))
+
+        representative_features: np.ndarray = np.concatenate(representatives)
+        representative_radii: np.ndarray = np.concatenate(radii)
+        representative_anchors: np.ndarray = np.concatenate(anchors)
+        representative_blocks: np.ndarray = np.concatenate(representative_blocks)
+        self.n_representatives = len(representative_features)
+        if self.n_representatives > 1:
+            n_neighbours: int = min(
+                self.n_representative_neighbours + 1, self.n_representatives
+            )
+            neighbours, distances = self.knn.query(
+                representative_features, n_neighbours
+            )
+            is_linked: np.ndarray = (
+                distances
+                <= representative_radii[:, None] + representative_radii[neighbours]
+            ) & (representative_blocks[:, None] != representative_blocks[neighbours])
+            rows.append(
+                np.repeat(representative_anchors, n_neighbours)[is_linked.ravel()]
+            )
+            columns.append(
+                representative_anchors[neighbours.ravel()[is_linked.ravel()]]
+            )
+
+        row: np.ndarray = np.concatenate(rows)
+        column: np.ndarray = np.concatenate(columns)
+        graph: sparse.csr_matrix = sparse.csr_matrix(
+            (np.ones(len(row), dtype=bool), (row, column)),
+            shape=(n_samples, n_samples),
+        )
+        _, component_labels = connected_components(
+            graph, directed=True, connection="weak"
+        )
+        return component_labels
+
+
+def _get_blocks(sample_partitions: np.ndarray, n_partitions: int) -> list[np.ndarray]:
+    # Lists the samples of every partition in ascending order.
+    flat_partitions: np.ndarray = sample_partitions.ravel()
+    order: np.ndarray = np.argsort(flat_partitions, kind="stable")
+    order = order[flat_partitions[order] >= 0]
+    samples: np.ndarray = order // sample_partitions.shape[1]
+    bounds: np.ndarray = np.cumsum(
+        np.bincount(flat_partitions[order], minlength=n_partitions)
+    )
+    return np.split(samples, bounds[:-1])
+
+
+def _cluster_block(
+    features_dir: FeatureSource,
+    block: np.ndarray,
+    n_neighbours: int,
+    threshold: float,
+    knn: AbstractKNN,
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Runs AROC on the samples of a block, and returns the component of every sample
+    # and the centroids of the components with at least two samples along with their
+    # radii, i.e. the mean distance of their samples to the centroid.
+    block_features: np.ndarray = np.asarray(
+        load_features(features_dir, mmap_mode="r")[block], dtype=np.float32
+    )
+    nearest_neighbours, _ = knn.query(block_features, min(n_neighbours, len(block)))
+    distances: np.ndarray = _rank_order_distances(nearest_neighbours, num_proc=1)
+    component_labels: np.ndarray = _merge_components(
+        nearest_neighbours, distances, threshold
+    )
+
+    component_sizes: np.ndarray = np.bincount(component_labels)
+    centroids: np.ndarray = np.zeros(
+        (len(component_sizes), block_features.shape[1]), dtype=np.float32
+    )
+    np.add.at(centroids, component_labels, block_features)
+    centroids /= component_sizes[:, None]
+    if knn.metric == "cosine":
+        sample_distances: np.ndarray = 1 - np.einsum(
+            "ij,ij->i",
+            normalize_rows(block_features),
+            normalize_rows(centroids)[component_labels],
+        )
+    else:
+        sample_distances: np.ndarray = np.linalg.norm(
+            block_features - centroids[component_labels], axis=1
+        )
+    centroid_radii: np.ndarray = (
+        np.bincount(component_labels, weights=sample_distances) / component_sizes
+    )
+    is_representative: np.ndarray = component_sizes >= 2
+    return (
+        component_labels,
+        centroids[is_representative],
+        centroid_radii[is_representative].astype(np.float32),
+    )
@@ -0,0 +1,241 @@
+from typing import Optional
+
+import numpy as np
+from scipy import sparse
+
+from src.clustering.abstract_clustering import AbstractClustering
+from src.clustering.aroc.aroc import _convert_components_to_labels
+from src.clustering.knn.abstract_knn import AbstractKNN, merge_neighbours
+from src.clustering.knn.brute_force_knn import BruteForceKNN
+from src.util.feature_loading import FeatureSource, load_features
+from src.util.helpers import atomic_open
+
+
+class ChineseWhispersClustering(AbstractClustering):
+    def __init__(
+        self,
+        n_neighbours: int,
+        threshold: float,
+        min_samples: int,
+        max_iter: int = 20,
+        n_batches: int = 8,
+        knn: Optional[AbstractKNN] = None,
+        random_state: int = 0,
+    ) -> None:
+        """Inits a ChineseWhispersClustering instance, which clusters the samples by
+        propagating labels over the graph linking every sample to its nearest
+        neighbours within a distance threshold. Every sample starts with its own label
+        and repeatedly takes the label that is most common among its linked
+        neighbours. The samples are updated in random batches, so that the labels of a
+        batch are updated at once with sparse matrix operations.
+
+        :param n_neighbours: An integer indicating the number of neighbors to use.
+        :param threshold: A float indicating the largest distance between linked
+            samples, in the metric of the kNN backend.
+        :param min_samples: An integer indicating the minimum number of samples in a
+            cluster such that the samples are not considered fuzzy.
+        :param max_iter: An integer indicating the maximum number of passes over the
+            samples. Defaults to 20.
+        :param n_batches: An integer indicating the number of random batches per pass.
+            Defaults to 8.
+        :param knn: An instance of AbstractKNN used for finding the nearest neighbours.
+            The kNN graph is cached next to the features and shared with AROClustering.
+            If None, the exact euclidean neighbours are found with BruteForceKNN.
+            Defaults to None.
+        :param random_state: An integer indicating the seed of the order of the
+            updates. Defaults to 0.
+        """
+        super().__init__()
+        self.n_neighbours: int = n_neighbours
+        self.threshold: float = threshold
+        self.min_samples: int = min_samples
+        self.max_iter: int = max_iter
+        self.n_batches: int = n_batches
+        self.knn: AbstractKNN = BruteForceKNN() if knn is None else knn
+        self.knn_config: dict = self.knn.get_config()
+        self.random_state: int = random_state
+
+        self.n_iter: Optional[int] = None
+        self.converged: Optional[bool] = None
+        self.features_dir: Optional[FeatureSource] = None
+        self.added_features: Optional[np.ndarray] = None
+
+    def cluster(self, features_dir: FeatureSource) -> np.ndarray:
+        """Clusters the given samples.
+
+        :param features_dir: Either a string indicating the folder containing the
+            features or the already loaded features, see load_features.
+        :return: A 1-d numpy array of shape containing the cluster label for each sample
+            in the same order as the input array.
+        """
+        nearest_neighbours, distances = self.knn.get_neighbours(
+            features_dir, self.n_neighbours
+        )
+        graph: sparse.csr_matrix = _get_graph(
+            nearest_neighbours, distances, self.threshold
+        )
+        labels: np.ndarray = self._propagate_labels(graph)
+        _, component_labels = np.unique(labels, return_inverse=True)
+        self.cluster_labels = _convert_components_to_labels(
+            component_labels, self.min_samples
+        )
+        self.features_dir = features_dir
+        self.added_features = np.zeros(
+            (0, np.shape(load_features(features_dir, mmap_mode="r"))[1]),
+            dtype=np.float32,
+        )
+
+        return self.cluster_labels
+
+    def assign(self, features: np.ndarray) -> np.ndarray:
+        """Assigns new samples to the most common label among their nearest neighbours
+        within the threshold, which are searched among the clustered samples and the
+        samples assigned by earlier calls. Samples without such neighbours are fuzzy.
+
+        :param features: A 2-d numpy array of shape (n_new_samples, n_features).
+        :return: A 1-d numpy array containing the cluster label for each new sample in
+            the same order as the input array.
+        """
+        if self.cluster_labels is None:
+            raise ValueError("The clustering has not been done or loaded yet.")
+        if self.features_dir is None:
+            raise ValueError("The folder of the clustered features is unknown.")
+
+        features = np.asarray(features, dtype=np.float32)
+        knn: BruteForceKNN = BruteForceKNN(self.knn.metric)
+        clustered_features: np.ndarray = load_features(self.features_dir, mmap_mode="r")
+        n_clustered: int = clustered_features.shape[0]
+        n_added: int = len(self.added_features)
+        n_neighbours: int = min(self.n_neighbours, n_clustered + n_added)
+
+        # The neighbours are searched among the memory-mapped clustered samples and the
+        # samples assigned by earlier calls separately, so that the clustered samples
+        # are read one chunk at a time instead of being copied.
+        neighbour_sets: list[tuple[np.ndarray, np.ndarray]] = [
+            knn.search(clustered_features, features, min(n_neighbours, n_clustered))
+        ]
+        if n_added > 0:
+            added_neighbours, added_distances = knn.search(
+                self.added_features, features, min(n_neighbours, n_added)
+            )
+            neighbour_sets.append((n_clustered + added_neighbours, added_distances))
+        neighbours, distances = merge_neighbours(neighbour_sets, n_neighbours)
+        neighbour_labels: np.ndarray = self.cluster_labels[neighbours]
+        is_linked: np.ndarray = distances <= np.float32(self.threshold)
+
+        cluster_labels: np.ndarray = np.full(len(features), -1.0)
+        for i in np.flatnonzero(is_linked.any(axis=1)):
+            labels, counts = np.unique(
+                neighbour_labels[i, is_linked[i]], return_counts=True
+            )
+            cluster_labels[i] = labels[np.argmax(counts)]
+
+        self.cluster_labels = np.concatenate([self.cluster_labels, cluster_labels])
+        self.added_features = np.concatenate([self.added_features, features])
+        return cluster_labels
+
+    def save_model(self, save_folder_path: str) -> None:
+        """Saves the cluster labels of all the samples, the assigned samples, and the
+        folder of the clustered features into a single file, so that the saved state
+        is always consistent, and the configuration of the clustering next to it. The
+        features must have been given as a folder.
+
+        :param save_folder_path: A sting indicating the folder to save the files to.
+        """
+        if self.cluster_labels is None:
+            raise ValueError("The clustering has not been done or loaded yet.")
+        if not isinstance(self.features_dir, str):
+            raise ValueError(
+                "Only the clustering of features given as a folder can be saved, since "
+                "assign reads the clustered features from the folder."
+            )
+
+        self._save_config(save_folder_path)
+        with atomic_open(f"{save_folder_path}/chinese_whispers_model.npz") as f:
+            np.savez(
+                f,
+                features_dir=self.features_dir,
+                cluster_labels=self.cluster_labels,
+                added_features=self.added_features,
+            )
+
+    def load_model(self, model_folder_path: str) -> None:
+        """Restores the state of the clustering saved with save_model.
+
+        :param model_folder_path: A string indicating the folder containing the saved
+            clustering.
+        """
+        with np.load(f"{model_folder_path}/chinese_whispers_model.npz") as model:
+            self.features_dir = str(model["features_dir"])
+            self.cluster_labels = model["cluster_labels"]
+            self.added_features = model["added_features"]
+
+    def _propagate_labels(self, graph: sparse.csr_matrix) -> np.ndarray:
+        # Updates the labels of random batches of samples at once. A sample without
+        # linked neighbours keeps its label, and ties are broken by the smaller label.
+        rng: np.random.Generator = np.random.default_rng(self.random_state)
+        n_samples: int = graph.shape[0]
+        labels: np.ndarray = np.arange(n_samples)
+        has_neighbours: np.ndarray = np.diff(graph.indptr) > 0
+        self.converged = False
+        for iteration in range(1, self.max_iter + 1):
+            self.n_iter = iteration
+            n_changes: int = 0
+            for batch in np.array_split(rng.permutation(n_samples), self.n_batches):
+                batch = batch[has_neighbours[batch]]
+                if len(batch) == 0:
+                    continue
+                batch_graph: sparse.csr_matrix = graph[batch]
+                rows: np.ndarray = np.repeat(
+                    np.arange(len(batch)), np.diff(batch_graph.indptr)
+                )
+                new_labels: np.ndarray = _get_heaviest_labels(
+                    rows, labels[batch_graph.indices], batch_graph.data, n_samples
+                )
+                n_changes += int(np.count_nonzero(new_labels != labels[batch]))
+                labels[batch] = new_labels
+            if n_changes == 0:
+                self.converged = True
+                break
+        return labels
+
+
+def _get_heaviest_labels(
+    rows: np.ndarray, labels: np.ndarray, weights: np.ndarray, n_labels: int
+) -> np.ndarray:
+    # Sums the weights of the edges of every row per label, and returns the label with
+    # the largest sum of every row, the smaller label on ties. Every row must have at
+    # least one edge.
+    keys: np.ndarray = rows.astype(np.int64) * n_labels + labels
+    unique_keys, inverse = np.unique(keys, return_inverse=True)
+    label_weights: np.ndarray = np.bincount(inverse, weights=weights)
+    key_rows: np.ndarray = unique_keys // n_labels
+    key_labels: np.ndarray = unique_keys % n_labels
+    order: np.ndarray = np.lexsort((key_labels, -label_weights, key_rows))
+    is_first: np.ndarray = np.ones(len(order), dtype=bool)
+    is_first[1:] = key_rows[order[1:]] != key_rows[order[:-1]]
+    return key_labels[order[is_first]]
+
+
+def _get_graph(
+    nearest_neighbours: np.ndarray, distances: np.ndarray, threshold: float
+) -> sparse.csr_matrix:
+    # Links every sample to its neighbours within the threshold in both directions,
+    # without self-links.
+    n_samples, n_neighbours = nearest_neighbours.shape
+    rows: np.ndarray = np.repeat(np.arange(n_samples), n_neighbours)
+    columns: np.ndarray = nearest_neighbours.ravel()
+    is_linked: np.ndarray = (distances.ravel() <= np.float32(threshold)) & (
+        rows != columns
+    )
+    rows, columns = rows[is_linked], columns[is_linked]
+    graph: sparse.csr_matrix = sparse.csr_matrix(
+        (
+            np.ones(2 * len(rows)),
+            (np.concatenate([rows, columns]), np.concatenate([columns, rows])),
+        ),
+        shape=(n_samples, n_samples),
+    )
+    # Links found in both directions are counted once.
+    graph.data[:] = 1
+    return graph
@@ -1,31 +1,338 @@
-from typing import cast
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Union, cast
 
 import numpy as np
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import pairwise_distances_argmin, pairwise_distances_argmin_min
 
 from src.clustering.abstract_clustering import AbstractClustering
+from src.util.feature_loading import (
+    FeatureSource,
+    iter_row_chunks,
+    load_features,
+    read_in_chunks,
+    to_process_source,
+)
+from src.util.helpers import atomic_open
 
 
 class KMeansClustering(AbstractClustering):
-    def __init__(self, n_clusters: int) -> None:
+    def __init__(
+        self,
+        n_clusters: Union[int, list[int]],
+        mode: str = "full",
+        chunk_size: int = 10000,
+        max_epochs: int = 10,
+        tol: float = 1e-4,
+        random_state: Optional[int] = None,
+        n_jobs: int = 1,
+    ) -> None:
         """Inits a KMeansClustering instance.
 
-        :param n_clusters: An integer indicating the number of clusters.
+        :param n_clusters: Either an integer indicating the number of clusters or a list
+            of integers containing multiple numbers of clusters. In the latter case, the
+            numbers are sorted and split into n_jobs contiguous chains that are fitted
+            in parallel processes. Within a chain, every number of clusters is
+            warm-started from the centers of the previous number by splitting the
+            clusters with the largest sums of squared errors.
+        :param mode: A string indicating how the clusters are found. Available options
+            are "full" for fitting sklearn.cluster.KMeans on the features in memory and
+            "minibatch" for fitting sklearn.cluster.MiniBatchKMeans on memory-mapped
+            chunks of the features, whose memory usage depends on the chunk size
+            instead of the number of samples. Defaults to "full".
+        :param chunk_size: An integer indicating the number of samples per chunk, which
+            is also the mini-batch size, for the "minibatch" mode. The mini-batches hold
+            at least n_clusters samples. Defaults to 10000.
+        :param max_epochs: An integer indicating the maximum number of passes over the
+            features for the "minibatch" mode. Defaults to 10.
+        :param tol: A float indicating the largest squared shift of a cluster center in a
+            pass, relative to the mean variance of the features of the first chunk,
+            below which the "minibatch" mode has converged. Defaults to 1e-4.
+        :param random_state: An integer indicating the seed of the initialization.
+            Defaults to None.
+        :param n_jobs: An integer indicating the number of processes used for a list of
+            numbers of clusters. Defaults to 1.
         """
         super().__init__()
-        self.n_clusters: int = n_clusters
+        if mode not in ["full", "minibatch"]:
+            raise ValueError(f"The given mode of {mode} is not supported.")
 
-    def cluster(self, features_dir: str) -> np.ndarray:
-        """Clusters the given samples.
+        self.n_clusters: Union[int, list[int]] = n_clusters
+        self.mode: str = mode
+        self.chunk_size: int = chunk_size
+        self.max_epochs: int = max_epochs
+        self.tol: float = tol
+        self.random_state: Optional[int] = random_state
+        self.n_jobs: int = n_jobs
 
-        :param features_dir: A string indicating the file containing the features.
+        self.cluster_centers: Optional[np.ndarray] = None
+        self.cluster_sse: Optional[np.ndarray] = None
+        self.cluster_sizes: Optional[np.ndarray] = None
+        self.inertia: Optional[float] = None
+        self.n_iter: Optional[int] = None
+        self.center_shifts: list[float] = []
+        self.converged: Optional[bool] = None
+        self.fit_time: Optional[float] = None
+        self.runs: list[KMeansClustering] = []
+
+    def cluster(self, features_dir: FeatureSource) -> np.ndarray:
+        """Clusters the given samples. If multiple numbers of clusters are given, the
+        samples are clustered for each of them.
+
+        :param features_dir: Either a string indicating the folder containing the
+            features or the already loaded features, see load_features.
         :return: A 1-d numpy array of shape containing the cluster label for each sample
-            in the same order as the input array.
+            in the same order as the input array. For multiple numbers of clusters, a
+            2-d numpy array of shape (n_numbers, n_samples) containing the cluster
+            labels for every number of clusters, in the order of self.n_clusters.
         """
-        features: np.ndarray = np.load(f"{features_dir}/features.npy")
-        kmeans: KMeans = cast(
-            KMeans, KMeans(n_clusters=self.n_clusters, n_init="auto").fit(features)
-        )
-        self.cluster_labels = kmeans.labels_
+        if not isinstance(self.n_clusters, list):
+            self._cluster(features_dir, init=None)
+            return self.cluster_labels
+
+        chains: list[list[int]] = [
+            chain.tolist()
+            for chain in np.array_split(sorted(set(self.n_clusters)), self.n_jobs)
+            if len(chain) > 0
+        ]
+        if self.n_jobs > 1:
+            # The processes read the features from their folder in the "minibatch"
+            # mode, and otherwise attach to a single copy of the features in shared
+            # memory instead of each loading or receiving a private copy.
+            features_dir, shared_features = to_process_source(
+                features_dir, share_folder=self.mode == "full"
+            )
+            try:
+                with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+                    chain_runs: list[list[KMeansClustering]] = list(
+                        executor.map(
+                            self._cluster_chain, [features_dir] * len(chains), chains
+                        )
+                    )
+            finally:
+                if shared_features is not None:
+                    shared_features.close()
+        else:
+            # The features are loaded once for all the numbers of clusters.
+            features: FeatureSource = load_features(features_dir, mmap_mode="r")
+            if self.mode == "full":
+                features = read_in_chunks(features, self.chunk_size)
+            chain_runs: list[list[KMeansClustering]] = [
+                self._cluster_chain(features, chain) for chain in chains
+            ]
+        runs: dict[int, KMeansClustering] = {
+            run.n_clusters: run for runs in chain_runs for run in runs
+        }
+        self.runs = [runs[n_clusters] for n_clusters in self.n_clusters]
+        self.cluster_labels = np.stack([run.cluster_labels for run in self.runs])
 
         return self.cluster_labels
+
+    def get_config(self) -> dict:
+        """Returns the configuration of the clustering as a dictionary, including the
+        sum of squared errors and the size of every cluster.
+
+        :return: A dictionary containing the configuration of the clustering.
+        """
+        config: dict = super().get_config()
+        for name in ["cluster_sse", "cluster_sizes"]:
+            if getattr(self, name) is not None:
+                config[name] = getattr(self, name).tolist()
+        return config
+
+    def save_cluster_labels_sweep(self, save_folder_paths: list[str]) -> None:
+        """Saves the cluster labels and the configuration of the clustering, including
+        the inertia and the fitting time, for each of the numbers of clusters in
+        self.n_clusters, which must be a list.
+
+        :param save_folder_paths: A list of strings indicating the folders to save the
+            files of each number of clusters to, in the same order as self.n_clusters.
+        """
+        if len(self.runs) == 0:
+            raise ValueError("The clustering has not been done for a list of numbers.")
+        if len(save_folder_paths) != len(self.runs):
+            raise ValueError(
+                "The number of folders must match the number of numbers of clusters."
+            )
+
+        for run, save_folder_path in zip(self.runs, save_folder_paths):
+            run.save_cluster_labels(save_folder_path)
+
+    def assign(self, features: np.ndarray) -> np.ndarray:
+        """Assigns new samples to their nearest cluster centers, and moves every center
+        to the mean of all the samples assigned to it so far.
+
+        :param features: A 2-d numpy array of shape (n_new_samples, n_features).
+        :return: A 1-d numpy array containing the cluster label for each new sample in
+            the same order as the input array.
+        """
+        if self.cluster_centers is None:
+            raise ValueError("The clustering has not been done or loaded yet.")
+        if isinstance(self.n_clusters, list):
+            raise ValueError("Samples can only be assigned for a single number.")
+
+        features = np.asarray(features)
+        cluster_labels: np.ndarray = pairwise_distances_argmin(
+            features, self.cluster_centers
+        ).astype(np.int32)
+        new_sizes: np.ndarray = np.bincount(cluster_labels, minlength=self.n_clusters)
+        feature_sums: np.ndarray = np.zeros(self.cluster_centers.shape)
+        np.add.at(feature_sums, cluster_labels, features)
+        is_updated: np.ndarray = new_sizes > 0
+        total_sizes: np.ndarray = self.cluster_sizes + new_sizes
+        self.cluster_centers[is_updated] = (
+            self.cluster_centers[is_updated]
+            * (self.cluster_sizes[is_updated] / total_sizes[is_updated])[:, None]
+            + feature_sums[is_updated] / total_sizes[is_updated][:, None]
+        )
+        self.cluster_sizes = total_sizes
+
+        return cluster_labels
+
+    def save_model(self, save_folder_path: str) -> None:
+        """Saves the cluster centers, the number of samples assigned to every center,
+        and the configuration of the clustering.
+
+        :param save_folder_path: A sting indicating the folder to save the files to.
+        """
+        self._save_config(save_folder_path)
+        with atomic_open(f"{save_folder_path}/kmeans_model.npz") as f:
+            np.savez(
+                f,
+                cluster_centers=self.cluster_centers,
+                cluster_sizes=self.cluster_sizes,
+            )
+
+    def load_model(self, model_folder_path: str) -> None:
+        """Restores the cluster centers and the number of samples assigned to every
+        center saved with save_model.
+
+        :param model_folder_path: A string indicating the folder containing the saved
+            clustering.
+        """
+        with np.load(f"{model_folder_path}/kmeans_model.npz") as model:
+            self.cluster_centers = model["cluster_centers"]
+            self.cluster_sizes = model["cluster_sizes"]
+
+    def _cluster_chain(
+        self, features_dir: FeatureSource, chain: list[int]
+    ) -> list["KMeansClustering"]:
+        runs: list[KMeansClustering] = []
+        for n_clusters in chain:
+            run: KMeansClustering = KMeansClustering(
+                n_clusters,
+                mode=self.mode,
+                chunk_size=self.chunk_size,
+                max_epochs=self.max_epochs,
+                tol=self.tol,
+                random_state=self.random_state,
+            )
+            init: Optional[np.ndarray] = (
+                None if len(runs) == 0 else runs[-1]._split_centers(n_clusters)
+            )
+            run._cluster(features_dir, init)
+            runs.append(run)
+        return runs
+
+    def _cluster(self, features_dir: FeatureSource, init: Optional[np.ndarray]) -> None:
+        fit_start: float = time.perf_counter()
+        if self.mode == "full":
+            features: np.ndarray = read_in_chunks(
+                load_features(features_dir, mmap_mode="r"), self.chunk_size
+            )
+            kmeans: KMeans = cast(
+                KMeans,
+                KMeans(
+                    n_clusters=self.n_clusters,
+                    init="k-means++" if init is None else init,
+                    n_init="auto" if init is None else 1,
+                    random_state=self.random_state,
+                ).fit(features),
+            )
+            self.cluster_centers = kmeans.cluster_centers_
+            self.n_iter = int(kmeans.n_iter_)
+            self.converged = kmeans.n_iter_ < kmeans.max_iter
+        else:
+            features: np.ndarray = load_features(features_dir, mmap_mode="r")
+            self._fit_minibatch(features, init)
+        self.cluster_labels = self._assign_in_chunks(features)
+        self.fit_time = time.perf_counter() - fit_start
+
+    def _fit_minibatch(self, features: np.ndarray, init: Optional[np.ndarray]) -> None:
+        # Every mini-batch must hold at least one sample per cluster for the seeding.
+        chunk_size: int = max(self.chunk_size, self.n_clusters)
+        kmeans: MiniBatchKMeans = MiniBatchKMeans(
+            n_clusters=self.n_clusters,
+            init="k-means++" if init is None else init,
+            batch_size=chunk_size,
+            n_init="auto" if init is None else 1,
+            random_state=self.random_state,
+        )
+        self.center_shifts = []
+        self.converged = False
+        tolerance: Optional[float] = None
+        for _ in range(self.max_epochs):
+            previous_centers: Optional[np.ndarray] = (
+                None if tolerance is None else kmeans.cluster_centers_.copy()
+            )
+            for _, chunk in iter_row_chunks(features, chunk_size, self.n_clusters):
+                if tolerance is None:
+                    tolerance = self.tol * float(np.mean(np.var(chunk, axis=0)))
+                kmeans.partial_fit(chunk)
+
+            if previous_centers is not None:
+                center_shift: float = float(
+                    np.max(
+                        np.sum(
+                            (kmeans.cluster_centers_ - previous_centers) ** 2, axis=1
+                        )
+                    )
+                )
+                self.center_shifts.append(center_shift)
+                if center_shift <= tolerance:
+                    self.converged = True
+                    break
+
+        self.n_iter = len(self.center_shifts) + 1
+        self.cluster_centers = kmeans.cluster_centers_
+
+    def _split_centers(self, n_clusters: int) -> np.ndarray:
+        # Adds centers by splitting the clusters with the largest sums of squared
+        # errors in two, moving the halves apart in a random direction by the standard
+        # deviation of the cluster.
+        rng: np.random.Generator = np.random.default_rng(self.random_state)
+        n_splits: int = n_clusters - len(self.cluster_centers)
+        order: np.ndarray = np.argsort(self.cluster_sse)[::-1]
+        split_clusters: np.ndarray = order[np.arange(n_splits) % len(order)]
+        centers: np.ndarray = self.cluster_centers.copy()
+        new_centers: list[np.ndarray] = []
+        for cluster in split_clusters:
+            direction: np.ndarray = rng.normal(size=centers.shape[1])
+            direction /= np.linalg.norm(direction)
+            std: float = np.sqrt(
+                self.cluster_sse[cluster] / max(self.cluster_sizes[cluster], 1)
+            )
+            offset: np.ndarray = direction * std / 2
+            new_centers.append(centers[cluster] + offset)
+            centers[cluster] -= offset
+        return np.concatenate([centers, np.stack(new_centers)], axis=0)
+
+    def _assign_in_chunks(self, features: np.ndarray) -> np.ndarray:
+        # Assigns every sample to its nearest cluster center and accumulates the sum of
+        # squared errors of every cluster, reading one chunk of the features at a time.
+        cluster_labels: np.ndarray = np.empty(features.shape[0], dtype=np.int32)
+        self.cluster_sse = np.zeros(self.n_clusters)
+        for start, chunk in iter_row_chunks(features, self.chunk_size):
+            labels, distances = pairwise_distances_argmin_min(
+                chunk, self.cluster_centers
+            )
+            cluster_labels[start : start + len(chunk)] = labels
+            self.cluster_sse += np.bincount(
+                labels,
+                weights=distances.astype(np.float64) ** 2,
+                minlength=self.n_clusters,
+            )
+        self.inertia = float(self.cluster_sse.sum())
+        self.cluster_sizes = np.bincount(cluster_labels, minlength=self.n_clusters)
+        return cluster_labels
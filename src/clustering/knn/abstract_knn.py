@@ -0,0 +1,225 @@
+import json
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import Optional, Union
+
+import numpy as np
+
+from src.features.virtual_combination import (
+    COMBINATION_FILE_NAME,
+    ROW_INDICES_FILE_NAME,
+    VirtualCombinedFeatures,
+)
+from src.util.feature_loading import FeatureSource, load_features
+from src.util.helpers import atomic_open, create_json_dict
+
+METRICS: list[str] = ["euclidean", "cosine"]
+CACHE_CONFIG_FILE_NAME: str = "knn_config.json"
+
+
+class AbstractKNN(ABC):
+    name: str = "abstract"
+
+    def __init__(self, metric: str = "euclidean") -> None:
+        """Inits an AbstractKNN instance. Should not be used outside subclasses.
+
+        :param metric: A string indicating the distance metric. Available options are
+            "euclidean" and "cosine". Defaults to "euclidean".
+        """
+        if metric not in METRICS:
+            raise ValueError(f"The given metric of {metric} is not supported.")
+        self.metric: str = metric
+
+    @abstractmethod
+    def query(
+        self, features: np.ndarray, n_neighbours: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Finds the nearest neighbours of every sample among all the samples, including
+        the sample itself.
+
+        :param features: A 2-d numpy array of shape (n_samples, n_features).
+        :param n_neighbours: An integer indicating the number of neighbours.
+        :return: A 2-tuple containing a 2-d int64 numpy array of shape
+            (n_samples, n_neighbours) with the indices of the neighbours of every sample
+            sorted by distance and a 2-d float32 numpy array of the same shape with the
+            distances to the neighbours.
+        """
+
+    def get_config(self) -> dict:
+        """Returns the configuration of the kNN backend as a dictionary.
+
+        :return: A dictionary containing the configuration of the kNN backend.
+        """
+        config: dict = create_json_dict(vars(self))
+        config["backend"] = self.name
+        return config
+
+    def get_neighbours(
+        self, features_dir: FeatureSource, n_neighbours: int, use_cache: bool = True
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Finds the nearest neighbours of the features found in the folder with the
+        given path. The kNN graph is cached in the knn folder next to the features,
+        together with the configuration of the backend and the modification times and
+        sizes of the feature files it was computed from. A cached graph is only reused
+        if both still match, and a cached graph with more neighbours is reused by
+        keeping its leading columns.
+
+        :param features_dir: Either a string indicating the folder containing the
+            features or the already loaded features, see load_features.
+        :param n_neighbours: An integer indicating the number of neighbours.
+        :param use_cache: A boolean indicating whether a cached kNN graph is read if one
+            exists and the computed kNN graph is cached. Only features given as a
+            folder are cached. Defaults to True.
+        :return: A 2-tuple containing the indices and the distances of the neighbours
+            as returned by query.
+        """
+        use_cache = use_cache and isinstance(features_dir, str)
+        if use_cache:
+            features_version: list[list[int]] = _get_features_version(features_dir)
+            cache_folder_path: Optional[str] = self._find_cache(
+                features_dir, n_neighbours, features_version
+            )
+            if cache_folder_path is not None:
+                indices: np.ndarray = np.load(f"{cache_folder_path}/indices.npy")
+                distances: np.ndarray = np.load(f"{cache_folder_path}/distances.npy")
+                return indices[:, :n_neighbours], distances[:, :n_neighbours]
+
+        indices, distances = self.query(
+            load_features(features_dir, mmap_mode="r"), n_neighbours
+        )
+        if use_cache:
+            self._save_cache(
+                features_dir, n_neighbours, features_version, indices, distances
+            )
+        return indices, distances
+
+    def _get_cache_folder_path(self, features_dir: str, n_neighbours: int) -> str:
+        return f"{features_dir}/knn/{self.name}_{self.metric}_k{n_neighbours}"
+
+    def _get_cache_config(
+        self, n_neighbours: int, features_version: list[list[int]]
+    ) -> dict:
+        return {
+            "knn": self.get_config(),
+            "n_neighbours": n_neighbours,
+            "features_version": features_version,
+        }
+
+    def _save_cache(
+        self,
+        features_dir: str,
+        n_neighbours: int,
+        features_version: list[list[int]],
+        indices: np.ndarray,
+        distances: np.ndarray,
+    ) -> None:
+        # The configuration is written last, so that a graph whose writing was
+        # interrupted is never reused.
+        cache_folder_path: str = self._get_cache_folder_path(features_dir, n_neighbours)
+        os.makedirs(cache_folder_path, exist_ok=True)
+        with atomic_open(f"{cache_folder_path}/indices.npy") as f:
+            np.save(f, indices)
+        with atomic_open(f"{cache_folder_path}/distances.npy") as f:
+            np.save(f, distances)
+        with atomic_open(
+            f"{cache_folder_path}/{CACHE_CONFIG_FILE_NAME}", mode="w"
+        ) as f:
+            json.dump(self._get_cache_config(n_neighbours, features_version), f)
+
+    def _find_cache(
+        self,
+        features_dir: str,
+        n_neighbours: int,
+        features_version: list[list[int]],
+    ) -> Optional[str]:
+        # Finds the cached kNN graph with the fewest neighbours that has at least the
+        # requested number of neighbours and was computed from the same features with
+        # the same configuration.
+        if not os.path.isdir(f"{features_dir}/knn"):
+            return None
+        pattern: re.Pattern = re.compile(
+            rf"{re.escape(self.name)}_{re.escape(self.metric)}_k(\d+)"
+        )
+        cached_n_neighbours: list[int] = []
+        for folder_name in os.listdir(f"{features_dir}/knn"):
+            match: Optional[re.Match] = pattern.fullmatch(folder_name)
+            if match is None or int(match.group(1)) < n_neighbours:
+                continue
+            config_path: str = (
+                f"{features_dir}/knn/{folder_name}/{CACHE_CONFIG_FILE_NAME}"
+            )
+            if not os.path.exists(config_path):
+                continue
+            with open(config_path, mode="r") as f:
+                cache_config: dict = json.load(f)
+            if cache_config == self._get_cache_config(
+                int(match.group(1)), features_version
+            ):
+                cached_n_neighbours.append(int(match.group(1)))
+        if len(cached_n_neighbours) == 0:
+            return None
+        return self._get_cache_folder_path(features_dir, min(cached_n_neighbours))
+
+
+def normalize_rows(features: np.ndarray) -> np.ndarray:
+    """Scales every row of the given features to unit length. Rows of zeros are left
+    unchanged.
+
+    :param features: A 2-d numpy array of shape (n_samples, n_features).
+    :return: A 2-d numpy array of the same shape with rows of unit length.
+    """
+    norms: np.ndarray = np.linalg.norm(features, axis=1, keepdims=True)
+    return features / np.where(norms > 0, norms, 1)
+
+
+def euclidean_to_cosine(distances: np.ndarray) -> np.ndarray:
+    """Converts the euclidean distances between rows of unit length to cosine
+    distances.
+
+    :param distances: A numpy array containing euclidean distances.
+    :return: A numpy array of the same shape containing cosine distances.
+    """
+    return distances**2 / 2
+
+
+def merge_neighbours(
+    neighbour_sets: list[tuple[np.ndarray, np.ndarray]], n_neighbours: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """Keeps the nearest of the neighbours of the same samples found among several sets
+    of samples.
+
+    :param neighbour_sets: A list of 2-tuples containing the indices and the distances
+        of the neighbours found in every set, sorted by distance as returned by query.
+        The sets are given in the order of their indices, so that ties are broken by
+        index.
+    :param n_neighbours: An integer indicating the number of neighbours to keep.
+    :return: A 2-tuple containing the indices and the distances of the kept neighbours
+        sorted by distance.
+    """
+    indices: np.ndarray = np.concatenate([s[0] for s in neighbour_sets], axis=1)
+    distances: np.ndarray = np.concatenate([s[1] for s in neighbour_sets], axis=1)
+    order: np.ndarray = np.argsort(distances, axis=1, kind="stable")[:, :n_neighbours]
+    return (
+        np.take_along_axis(indices, order, axis=1),
+        np.take_along_axis(distances, order, axis=1),
+    )
+
+
+def _get_features_version(features_dir: str) -> list[list[int]]:
+    # Identifies the features by the modification times and sizes of the files they
+    # are read from, which for a virtual combination include the source features.
+    features: Union[np.ndarray, VirtualCombinedFeatures] = load_features(
+        features_dir, mmap_mode="r"
+    )
+    if isinstance(features, VirtualCombinedFeatures):
+        file_paths: list[str] = [
+            f"{features_dir}/{COMBINATION_FILE_NAME}",
+            f"{features_dir}/{ROW_INDICES_FILE_NAME}",
+        ] + [source.filename for source in features.sources.values()]
+    else:
+        file_paths: list[str] = [features.filename]
+    return [
+        [os.stat(file_path).st_mtime_ns, os.stat(file_path).st_size]
+        for file_path in file_paths
+    ]
@@ -0,0 +1,171 @@
+import numpy as np
+
+from src.clustering.knn.abstract_knn import AbstractKNN, normalize_rows
+from src.util.feature_loading import iter_row_chunks
+
+
+class BruteForceKNN(AbstractKNN):
+    name: str = "brute_force"
+
+    def __init__(self, metric: str = "euclidean", block_size: int = 1024) -> None:
+        """Inits a BruteForceKNN instance, which finds the exact nearest neighbours by
+        computing the distances from blocks of samples to all the samples with float64
+        matrix multiplications.
+
+        :param metric: A string indicating the distance metric. Available options are
+            "euclidean" and "cosine". Defaults to "euclidean".
+        :param block_size: An integer indicating the number of samples whose distances
+            to all the samples are computed at once. Defaults to 1024.
+        """
+        super().__init__(metric)
+        self.block_size: int = block_size
+
+    def query(
+        self, features: np.ndarray, n_neighbours: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Finds the nearest neighbours of every sample among all the samples, including
+        the sample itself, which is always the first neighbour with a distance of 0,
+        even if other samples are at the same position.
+
+        :param features: A 2-d numpy array of shape (n_samples, n_features).
+        :param n_neighbours: An integer indicating the number of neighbours.
+        :return: A 2-tuple containing a 2-d int64 numpy array of shape
+            (n_samples, n_neighbours) with the indices of the neighbours of every sample
+            sorted by distance and a 2-d float32 numpy array of the same shape with the
+            distances to the neighbours.
+        """
+        n_samples: int = np.shape(features)[0]
+        if n_neighbours > n_samples:
+            raise ValueError("The number of neighbours exceeds the number of samples.")
+        indices, distances = self.search(features, features, n_neighbours)
+        _put_self_first(indices, distances)
+        return indices, distances
+
+    def search(
+        self,
+        index_features: np.ndarray,
+        query_features: np.ndarray,
+        n_neighbours: int,
+        only_earlier: bool = False,
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Finds the nearest neighbours of every query sample among the index samples.
+        The index samples are read in chunks, so that a memory-mapped index is never
+        loaded into memory at once.
+
+        :param index_features: A 2-d (memory-mapped) numpy array of shape
+            (n_index_samples, n_features) containing the samples to search in.
+        :param query_features: A 2-d numpy array of shape (n_query_samples, n_features)
+            containing the samples whose neighbours are found.
+        :param n_neighbours: An integer indicating the number of neighbours, which is at
+            most n_index_samples.
+        :param only_earlier: A boolean indicating whether every query sample only finds
+            the index samples before it, for searching the samples among themselves.
+            Neighbours that do not exist because there are fewer earlier samples are
+            given the index -1 and an infinite distance. Defaults to False.
+        :return: A 2-tuple containing a 2-d int64 numpy array of shape
+            (n_query_samples, n_neighbours) with the indices of the neighbours of every
+            query sample in the index samples sorted by distance and a 2-d float32
+            numpy array of the same shape with the distances to the neighbours.
+        """
+        # The distances are computed in float64, since the float32 cancellation of the
+        # squared norms of features with large norms can exceed the distances between
+        # close samples.
+        query_features = np.asarray(query_features, dtype=np.float64)
+        if n_neighbours > index_features.shape[0]:
+            raise ValueError("The number of neighbours exceeds the number of samples.")
+        if self.metric == "cosine":
+            query_features = normalize_rows(query_features)
+
+        n_queries: int = query_features.shape[0]
+        indices: np.ndarray = np.full((n_queries, n_neighbours), -1, dtype=np.int64)
+        distances: np.ndarray = np.full((n_queries, n_neighbours), np.inf)
+        # The neighbours found in every chunk of the index samples are merged into the
+        # neighbours found in the earlier chunks.
+        for index_start, index_chunk in iter_row_chunks(
+            index_features, INDEX_CHUNK_BLOCKS * self.block_size
+        ):
+            index_chunk = index_chunk.astype(np.float64, copy=False)
+            if self.metric == "cosine":
+                index_chunk = normalize_rows(index_chunk)
+            squared_norms: np.ndarray = np.einsum("ij,ij->i", index_chunk, index_chunk)
+            for start, block in iter_row_chunks(query_features, self.block_size):
+                if only_earlier and index_start >= start + len(block) - 1:
+                    continue
+                products: np.ndarray = block @ index_chunk.T
+                if self.metric == "cosine":
+                    block_distances: np.ndarray = 1 - products
+                else:
+                    block_distances: np.ndarray = (
+                        np.einsum("ij,ij->i", block, block)[:, None]
+                        - 2 * products
+                        + squared_norms[None, :]
+                    )
+                np.maximum(block_distances, 0, out=block_distances)
+                if only_earlier:
+                    block_distances[
+                        index_start + np.arange(len(index_chunk))[None, :]
+                        >= start + np.arange(len(block))[:, None]
+                    ] = np.inf
+                _merge_block_neighbours(
+                    block_distances,
+                    index_start,
+                    indices[start : start + len(block)],
+                    distances[start : start + len(block)],
+                )
+
+        indices[np.isinf(distances)] = -1
+        if self.metric == "euclidean":
+            np.sqrt(distances, out=distances)
+        return indices, distances.astype(np.float32)
+
+
+# The number of query blocks that make up a chunk of the index samples.
+INDEX_CHUNK_BLOCKS: int = 8
+
+
+def _merge_block_neighbours(
+    block_distances: np.ndarray,
+    index_start: int,
+    indices: np.ndarray,
+    distances: np.ndarray,
+) -> None:
+    # Selects the nearest neighbours of the chunk in linear time, and merges only them
+    # into the given neighbours in place. The candidates are sorted by index first and
+    # follow the neighbours of the earlier chunks, so that ties are broken by index.
+    n_candidates: int = min(indices.shape[1], block_distances.shape[1])
+    candidates: np.ndarray = np.sort(
+        np.argpartition(block_distances, n_candidates - 1, axis=1)[:, :n_candidates],
+        axis=1,
+    )
+    merged_indices: np.ndarray = np.concatenate(
+        [indices, index_start + candidates], axis=1
+    )
+    merged_distances: np.ndarray = np.concatenate(
+        [distances, np.take_along_axis(block_distances, candidates, axis=1)], axis=1
+    )
+    order: np.ndarray = np.argsort(merged_distances, axis=1, kind="stable")[
+        :, : indices.shape[1]
+    ]
+    indices[:] = np.take_along_axis(merged_indices, order, axis=1)
+    distances[:] = np.take_along_axis(merged_distances, order, axis=1)
+
+
+def _put_self_first(indices: np.ndarray, distances: np.ndarray) -> None:
+    # Moves every sample to the first column of its own neighbours in place, shifting
+    # the neighbours before it, or dropping the farthest neighbour if the sample is
+    # missing because of ties.
+    n_samples, n_neighbours = indices.shape
+    columns: np.ndarray = np.arange(n_neighbours)
+    is_self: np.ndarray = indices == np.arange(n_samples)[:, None]
+    self_columns: np.ndarray = np.where(
+        is_self.any(axis=1), is_self.argmax(axis=1), n_neighbours - 1
+    )
+    order: np.ndarray = np.sort(
+        np.where(columns[None, :] == self_columns[:, None], -1, columns[None, :]),
+        axis=1,
+    )
+    order[:, 0] = self_columns
+    indices[:] = np.take_along_axis(indices, order, axis=1)
+    distances[:] = np.take_along_axis(distances, order, axis=1)
+    indices[:, 0] = np.arange(n_samples)
+    distances[:, 0] = 0
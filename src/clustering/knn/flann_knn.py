@@ -0,0 +1,57 @@
+import numpy as np
+
+from src.clustering.knn.abstract_knn import (
+    AbstractKNN,
+    euclidean_to_cosine,
+    normalize_rows,
+)
+
+
+class FlannKNN(AbstractKNN):
+    name: str = "flann"
+
+    def __init__(self, metric: str = "euclidean", trees: int = 4) -> None:
+        """Inits a FlannKNN instance, which finds approximate nearest neighbours with a
+        randomized kd-tree index of FLANN. Requires pyflann, which is outdated and needs
+        to be fixed after installing it with pip. For how to fix, refer to
+        https://github.com/primetang/pyflann/issues/1
+
+        :param metric: A string indicating the distance metric. Available options are
+            "euclidean" and "cosine". Defaults to "euclidean".
+        :param trees: An integer indicating the number of randomized kd-trees. Defaults
+            to 4.
+        """
+        super().__init__(metric)
+        self.trees: int = trees
+
+    def query(
+        self, features: np.ndarray, n_neighbours: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Finds the nearest neighbours of every sample among all the samples, including
+        the sample itself.
+
+        :param features: A 2-d numpy array of shape (n_samples, n_features).
+        :param n_neighbours: An integer indicating the number of neighbours.
+        :return: A 2-tuple containing a 2-d int64 numpy array of shape
+            (n_samples, n_neighbours) with the indices of the neighbours of every sample
+            sorted by distance and a 2-d float32 numpy array of the same shape with the
+            distances to the neighbours.
+        """
+        import pyflann
+
+        features = np.asarray(features, dtype=np.float32)
+        if self.metric == "cosine":
+            features = normalize_rows(features)
+        flann = pyflann.FLANN()
+        params: dict = flann.build_index(features, algorithm="kdtree", trees=self.trees)
+        indices, squared_distances = flann.nn_index(
+            features, n_neighbours, checks=params["checks"]
+        )
+
+        distances: np.ndarray = np.sqrt(squared_distances)
+        if self.metric == "cosine":
+            distances = euclidean_to_cosine(distances)
+        return (
+            indices.reshape(len(features), -1).astype(np.int64),
+            distances.reshape(len(features), -1).astype(np.float32),
+        )
@@ -0,0 +1,65 @@
+import numpy as np
+from sklearn.neighbors import NearestNeighbors
+
+from src.clustering.knn.abstract_knn import (
+    AbstractKNN,
+    euclidean_to_cosine,
+    normalize_rows,
+)
+
+
+class SklearnKNN(AbstractKNN):
+    name: str = "sklearn"
+
+    def __init__(
+        self,
+        metric: str = "euclidean",
+        algorithm: str = "auto",
+        leaf_size: int = 30,
+        n_jobs: int = 1,
+    ) -> None:
+        """Inits a SklearnKNN instance, which finds the exact nearest neighbours with
+        sklearn.neighbors.NearestNeighbors. The cosine metric is computed as the
+        euclidean distance between rows of unit length, so that the trees can be used.
+
+        :param metric: A string indicating the distance metric. Available options are
+            "euclidean" and "cosine". Defaults to "euclidean".
+        :param algorithm: A string indicating the algorithm of NearestNeighbors, such as
+            "kd_tree" or "ball_tree". Defaults to "auto".
+        :param leaf_size: An integer indicating the leaf size of the trees. Defaults to
+            30.
+        :param n_jobs: An integer indicating the number of parallel jobs of the query.
+            Defaults to 1.
+        """
+        super().__init__(metric)
+        self.algorithm: str = algorithm
+        self.leaf_size: int = leaf_size
+        self.n_jobs: int = n_jobs
+
+    def query(
+        self, features: np.ndarray, n_neighbours: int
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """Finds the nearest neighbours of every sample among all the samples, including
+        the sample itself.
+
+        :param features: A 2-d numpy array of shape (n_samples, n_features).
+        :param n_neighbours: An integer indicating the number of neighbours.
+        :return: A 2-tuple containing a 2-d int64 numpy array of shape
+            (n_samples, n_neighbours) with the indices of the neighbours of every sample
+            sorted by distance and a 2-d float32 numpy array of the same shape with the
+            distances to the neighbours.
+        """
+        features = np.asarray(features, dtype=np.float32)
+        if self.metric == "cosine":
+            features = normalize_rows(features)
+        nearest_neighbours: NearestNeighbors = NearestNeighbors(
+            n_neighbors=n_neighbours,
+            algorithm=self.algorithm,
+            leaf_size=self.leaf_size,
+            n_jobs=self.n_jobs,
+        ).fit(features)
+        distances, indices = nearest_neighbours.kneighbors(features)
+
+        if self.metric == "cosine":
+            distances = euclidean_to_cosine(distances)
+        return indices.astype(np.int64), distances.astype(np.float32)
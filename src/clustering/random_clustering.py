@@ -1,6 +1,7 @@
 import numpy as np
 
 from src.clustering.abstract_clustering import AbstractClustering
+from src.util.feature_loading import FeatureSource, load_features
 
 
 class RandomClustering(AbstractClustering):
@@ -13,14 +14,39 @@ class RandomClustering(AbstractClustering):
         self.n_clusters: int = n_clusters
         self.rng: np.random.Generator = np.random.default_rng()
 
-    def cluster(self, features_dir: str) -> np.ndarray:
+    def cluster(self, features_dir: FeatureSource) -> np.ndarray:
         """Clusters the given samples.
 
-        :param features_dir: A string indicating the file containing the features.
+        :param features_dir: Either a string indicating the folder containing the
+            features or the already loaded features, see load_features.
         :return: A 1-d numpy array of shape containing the cluster label for each sample
             in the same order as the input array.
         """
-        features: np.ndarray = np.load(f"{features_dir}/features.npy")
+        features: np.ndarray = load_features(features_dir, mmap_mode="r")
         self.cluster_labels = self.rng.integers(self.n_clusters, size=features.shape[0])
 
         return self.cluster_labels
+
+    def assign(self, features: np.ndarray) -> np.ndarray:
+        """Assigns new samples to random clusters.
+
+        :param features: A 2-d numpy array of shape (n_new_samples, n_features).
+        :return: A 1-d numpy array containing the cluster label for each new sample in
+            the same order as the input array.
+        """
+        return self.rng.integers(self.n_clusters, size=len(features))
+
+    def save_model(self, save_folder_path: str) -> None:
+        """Saves the configuration of the clustering, which is its only state.
+
+        :param save_folder_path: A sting indicating the folder to save the files to.
+        """
+        self._save_config(save_folder_path)
+
+    def load_model(self, model_folder_path: str) -> None:
+        """Does nothing, as the random clustering has no state besides its
+        configuration.
+
+        :param model_folder_path: A string indicating the folder containing the saved
+            clustering.
+        """
@@ -5,6 +5,7 @@ from typing import Optional
 
 import numpy as np
 
+from src.util.feature_loading import FeatureSource
 from src.util.helpers import create_json_dict
 
 
@@ -14,14 +15,50 @@ class AbstractReducer(ABC):
         self.reduced_features: Optional[np.ndarray] = None
 
     @abstractmethod
-    def reduce_dimensions(self, features_dir: str) -> np.ndarray:
+    def reduce_dimensions(self, features_dir: FeatureSource) -> np.ndarray:
         """Reduces the dimensions of the given samples.
 
-        :param features_dir: A string indicating the file containing the features.
+        :param features_dir: Either a string indicating the folder containing the
+            features or the already loaded features, see load_features.
         :return: A 2-d numpy array of shape (n_samples, n_reduced_features) containing
             the samples in a latent space with a lower dimensionality.
         """
 
+    @abstractmethod
+    def fit(self, features_dir: FeatureSource) -> "AbstractReducer":
+        """Fits the reducer on the given samples without reducing them.
+
+        :param features_dir: Either a string indicating the folder containing the
+            features or the already loaded features, see load_features.
+        :return: The fitted reducer.
+        """
+
+    @abstractmethod
+    def transform(self, features: np.ndarray) -> np.ndarray:
+        """Reduces the dimensions of the given samples with the fitted reducer.
+
+        :param features: A 2-d numpy array of shape (n_samples, n_features).
+        :return: A 2-d numpy array of shape (n_samples, n_reduced_features) containing
+            the samples in a latent space with a lower dimensionality.
+        """
+
+    @abstractmethod
+    def save_model(self, save_folder_path: str) -> None:
+        """Saves the fitted reducer and the configuration of the reduction, such that
+        the reducer can be restored with load_model.
+
+        :param save_folder_path: A sting indicating the folder to save the files to.
+        """
+
+    @abstractmethod
+    def load_model(self, model_folder_path: str) -> None:
+        """Restores the fitted reducer saved with save_model. The reducer must be
+        initialized with the same configuration as the saved reducer.
+
+        :param model_folder_path: A string indicating the folder containing the saved
+            reducer.
+        """
+
     def get_config(self) -> dict:
         """Returns the configuration of the reducer as a dictionary.
 
@@ -38,9 +75,12 @@ class AbstractReducer(ABC):
         if self.reduced_features is None:
             raise ValueError("The features have not been reduced yet.")
 
+        self._save_config(save_folder_path)
+        np.save(f"{save_folder_path}/features.npy", self.reduced_features)
+
+    def _save_config(self, save_folder_path: str) -> None:
         if not os.path.isdir(save_folder_path):
             os.makedirs(save_folder_path)
 
         with open(f"{save_folder_path}/reducer_config.json", mode="w") as f:
             json.dump(self.get_config(), f)
-        np.save(f"{save_folder_path}/features.npy", self.reduced_features)
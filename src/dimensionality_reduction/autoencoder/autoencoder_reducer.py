@@ -1,64 +1,504 @@
-from typing import cast
+import math
+import pickle
+import time
+from typing import TYPE_CHECKING, Iterator, Optional, Union
 
 import numpy as np
-from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import MinMaxScaler
-from tensorflow.python.keras import Model
 
 from src.dimensionality_reduction.abstract_reducer import AbstractReducer
+from src.dimensionality_reduction.autoencoder.best_epoch_tracker import (
+    BestEpochTracker,
+)
+from src.dimensionality_reduction.autoencoder.numpy_autoencoder import NumpyAutoencoder
+from src.util.feature_loading import (
+    FeatureSource,
+    empty_scratch_array,
+    iter_row_chunks,
+    load_features,
+)
+
+if TYPE_CHECKING:
+    from tensorflow.python.keras import Model
 
 
 class AutoencoderReducer(AbstractReducer):
-    def __init__(self, autoencoder: Model, optimizer: str, loss: str) -> None:
+    def __init__(
+        self,
+        autoencoder: Union["Model", NumpyAutoencoder],
+        optimizer: str,
+        loss: str,
+        validation_size: float = 0.1,
+        chunk_size: int = 10000,
+        random_state: Optional[int] = None,
+    ) -> None:
         """Inits an AutoencoderReducer instance.
 
-        :param autoencoder: An instance of keras.Model representing the autoencoder to
-            use for dimensionality reduction.
-        :param optimizer: A string indicating the optimizer to use.
-        :param loss: A string indicating the loss function to use.
+        :param autoencoder: Either an instance of keras.Model or an instance of
+            NumpyAutoencoder representing the autoencoder to use for dimensionality
+            reduction. A NumpyAutoencoder is trained and used without importing
+            TensorFlow.
+        :param optimizer: A string indicating the optimizer to use. Only "adam" is
+            supported for a NumpyAutoencoder.
+        :param loss: A string indicating the loss function to use. Only "mse" is
+            supported for a NumpyAutoencoder.
+        :param validation_size: A float indicating the proportion of the samples used
+            for validation. Defaults to 0.1.
+        :param chunk_size: An integer indicating the number of samples per chunk when
+            the features are scaled. Defaults to 10000.
+        :param random_state: An integer indicating the seed of the validation split and
+            the shuffling of the training samples. Defaults to None.
         """
         super().__init__()
-        self.autoencoder: Model = autoencoder
+        self.autoencoder: Union["Model", NumpyAutoencoder] = autoencoder
         self.optimizer: str = optimizer
         self.loss: str = loss
+        self.validation_size: float = validation_size
+        self.chunk_size: int = chunk_size
+        self.random_state: Optional[int] = random_state
 
-        self.autoencoder.compile(optimizer=self.optimizer, loss=self.loss)
+        if isinstance(self.autoencoder, NumpyAutoencoder):
+            self.backend: str = "numpy"
+            if self.optimizer != "adam" or self.loss != "mse":
+                raise ValueError(
+                    "A NumpyAutoencoder only supports the adam optimizer and the mse "
+                    "loss."
+                )
+        else:
+            self.backend: str = "keras"
+            self.autoencoder.compile(optimizer=self.optimizer, loss=self.loss)
 
         self.min_max_scaler: MinMaxScaler = MinMaxScaler()
+        self.epoch_times: list[float] = []
+        self.stopped_epoch: Optional[int] = None
+        self.best_epoch: Optional[int] = None
+        self.best_val_loss: Optional[float] = None
 
     def reduce_dimensions(
-        self, features_dir: str, epochs: int = 10, batch_size: int = 256
+        self,
+        features_dir: FeatureSource,
+        epochs: int = 10,
+        batch_size: int = 256,
+        patience: Optional[int] = None,
     ) -> np.ndarray:
-        """Reduces the dimensions of the given samples.
+        """Reduces the dimensions of the given samples. The features are read from a
+        memory-mapped file, scaled once into a float32 file-backed copy, and fed to the
+        autoencoder in batches, through a prefetching tf.data pipeline for a keras
+        autoencoder. After training, the weights of the epoch with the lowest
+        validation loss are restored.
 
-        :param features_dir: A string indicating the file containing the features.
-        :param epochs: An integer indicating the number of epochs.
+        :param features_dir: Either a string indicating the folder containing the
+            features or the already loaded features, see load_features.
+        :param epochs: An integer indicating the maximum number of epochs.
         :param batch_size: A float indicating the batch size to use.
+        :param patience: An integer indicating the number of epochs without an
+            improvement of the validation loss after which the training is stopped. If
+            None, the training runs for all the epochs. Defaults to None.
         :return: A 2-d numpy array of shape (n_samples, n_reduced_features) containing
             the samples in a latent space with a lower dimensionality.
         """
-        features: np.ndarray = np.load(f"{features_dir}/features.npy")
+        features: np.ndarray = load_features(features_dir, mmap_mode="r")
+        scaled_features: np.ndarray = self._fit(features, epochs, batch_size, patience)
+        if self.backend == "numpy":
+            self.reduced_features = _encode_in_batches(
+                self.autoencoder, scaled_features, batch_size
+            )
+        else:
+            from src.dimensionality_reduction.autoencoder.keras_training import (
+                get_dataset,
+            )
 
-        n_samples: int = features.shape[0]
-        first_half_size: int = n_samples // 2
+            self.reduced_features = self.autoencoder.encoder.predict(
+                get_dataset(scaled_features, np.arange(features.shape[0]), batch_size)
+            )
+
+        return self.reduced_features
+
+    def fit(
+        self,
+        features_dir: FeatureSource,
+        epochs: int = 10,
+        batch_size: int = 256,
+        patience: Optional[int] = None,
+    ) -> "AutoencoderReducer":
+        """Fits the scaler and trains the autoencoder on the given samples without
+        reducing them.
+
+        :param features_dir: Either a string indicating the folder containing the
+            features or the already loaded features, see load_features.
+        :param epochs: An integer indicating the maximum number of epochs.
+        :param batch_size: A float indicating the batch size to use.
+        :param patience: An integer indicating the number of epochs without an
+            improvement of the validation loss after which the training is stopped. If
+            None, the training runs for all the epochs. Defaults to None.
+        :return: The fitted reducer.
+        """
+        self._fit(
+            load_features(features_dir, mmap_mode="r"), epochs, batch_size, patience
+        )
+        return self
+
+    def transform(self, features: np.ndarray, batch_size: int = 256) -> np.ndarray:
+        """Reduces the dimensions of the given samples with the fitted scaler and the
+        encoder of the trained autoencoder.
+
+        :param features: A 2-d numpy array of shape (n_samples, n_features).
+        :param batch_size: An integer indicating the batch size to use.
+        :return: A 2-d numpy array of shape (n_samples, n_reduced_features) containing
+            the samples in a latent space with a lower dimensionality.
+        """
+        scaled_features: np.ndarray = self.min_max_scaler.transform(features).astype(
+            np.float32
+        )
+        if self.backend == "numpy":
+            return _encode_in_batches(self.autoencoder, scaled_features, batch_size)
+        else:
+            return self.autoencoder.encoder.predict(
+                scaled_features, batch_size=batch_size
+            )
 
-        train, test = train_test_split(features, test_size=0.1)
-        self.min_max_scaler = self.min_max_scaler.fit(train)
-        self.min_max_scaler = cast(MinMaxScaler, self.min_max_scaler)
+    def save_model(self, save_folder_path: str) -> None:
+        """Saves the fitted scaler, the weights of the autoencoder, and the
+        configuration of the reduction.
 
-        scaled_train: np.ndarray = self.min_max_scaler.transform(train)
-        scaled_test: np.ndarray = self.min_max_scaler.transform(test)
+        :param save_folder_path: A sting indicating the folder to save the files to.
+        """
+        self._save_config(save_folder_path)
+        with open(f"{save_folder_path}/min_max_scaler.pickle", mode="wb") as f:
+            pickle.dump(self.min_max_scaler, f)
+        if self.backend == "numpy":
+            self.autoencoder.save_weights(f"{save_folder_path}/autoencoder_weights.npz")
+        else:
+            self.autoencoder.save_weights(f"{save_folder_path}/autoencoder_weights.h5")
+
+    def load_model(self, model_folder_path: str) -> None:
+        """Restores the fitted scaler and the weights of the autoencoder saved with
+        save_model. The autoencoder of the reducer must have the same architecture as
+        the saved autoencoder.
+
+        :param model_folder_path: A string indicating the folder containing the saved
+            reducer.
+        """
+        with open(f"{model_folder_path}/min_max_scaler.pickle", mode="rb") as f:
+            self.min_max_scaler = pickle.load(f)
+        if self.backend == "numpy":
+            self.autoencoder.load_weights(
+                f"{model_folder_path}/autoencoder_weights.npz"
+            )
+            return
+
+        # The weights of a subclassed model can only be loaded after it is built.
+        self.autoencoder(
+            np.zeros((1, self.min_max_scaler.n_features_in_), dtype=np.float32)
+        )
+        self.autoencoder.load_weights(f"{model_folder_path}/autoencoder_weights.h5")
+
+    def _fit(
+        self,
+        features: np.ndarray,
+        epochs: int,
+        batch_size: int,
+        patience: Optional[int],
+    ) -> np.ndarray:
+        scaled_features, is_validation, rng = self._split_and_scale(features)
+        if self.backend == "numpy":
+            self._train_numpy(
+                scaled_features, is_validation, rng, epochs, batch_size, patience
+            )
+        else:
+            self._train_keras(
+                scaled_features, is_validation, rng, epochs, batch_size, patience
+            )
 
+        return scaled_features
+
+    def _train_keras(
+        self,
+        scaled_features: np.ndarray,
+        is_validation: np.ndarray,
+        rng: np.random.Generator,
+        epochs: int,
+        batch_size: int,
+        patience: Optional[int],
+    ) -> None:
+        from src.dimensionality_reduction.autoencoder.keras_training import (
+            TrainingMonitor,
+            get_dataset,
+        )
+
+        train_dataset = get_dataset(
+            scaled_features,
+            np.flatnonzero(~is_validation),
+            batch_size,
+            with_targets=True,
+            shuffle_seed=int(rng.integers(2**31)),
+        )
+        validation_dataset = get_dataset(
+            scaled_features,
+            np.flatnonzero(is_validation),
+            batch_size,
+            with_targets=True,
+        )
+
+        monitor: TrainingMonitor = TrainingMonitor(patience, ["val_loss"])
         self.autoencoder.fit(
-            scaled_train,
-            scaled_train,
+            train_dataset,
             epochs=epochs,
-            batch_size=batch_size,
-            validation_data=(scaled_test, scaled_test),
+            validation_data=validation_dataset,
+            callbacks=[monitor],
         )
+        self.epoch_times = monitor.epoch_times
+        self.stopped_epoch = len(monitor.epoch_times)
+        self.best_epoch = monitor.tracker.best_epochs[0]
+        self.best_val_loss = monitor.tracker.best_val_losses[0]
 
-        self.reduced_features = self.autoencoder.encoder.predict(
-            self.min_max_scaler.transform(features)
+    def _train_numpy(
+        self,
+        scaled_features: np.ndarray,
+        is_validation: np.ndarray,
+        rng: np.random.Generator,
+        epochs: int,
+        batch_size: int,
+        patience: Optional[int],
+    ) -> None:
+        self.epoch_times, tracker = _train_numpy_jointly(
+            [self.autoencoder],
+            scaled_features,
+            is_validation,
+            rng,
+            epochs,
+            batch_size,
+            patience,
         )
+        self.stopped_epoch = len(self.epoch_times)
+        self.best_epoch = tracker.best_epochs[0]
+        self.best_val_loss = tracker.best_val_losses[0]
 
-        return self.reduced_features
+    def _split_and_scale(
+        self, features: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray, np.random.Generator]:
+        n_samples: int = features.shape[0]
+
+        rng: np.random.Generator = np.random.default_rng(self.random_state)
+        is_validation: np.ndarray = np.zeros(n_samples, dtype=bool)
+        is_validation[
+            rng.permutation(n_samples)[: math.ceil(n_samples * self.validation_size)]
+        ] = True
+
+        return self._scale_features(features, is_validation), is_validation, rng
+
+    def _scale_features(
+        self, features: np.ndarray, is_validation: np.ndarray
+    ) -> np.ndarray:
+        # Fit the scaler on the training samples in a streaming pass, and write the
+        # scaled features to a float32 file-backed array in a second pass.
+        self.min_max_scaler = MinMaxScaler()
+        for start, chunk in iter_row_chunks(features, self.chunk_size):
+            train_chunk: np.ndarray = chunk[~is_validation[start : start + len(chunk)]]
+            if len(train_chunk) > 0:
+                self.min_max_scaler.partial_fit(train_chunk)
+
+        scaled_features: np.ndarray = empty_scratch_array(features.shape, np.float32)
+        for start, chunk in iter_row_chunks(features, self.chunk_size):
+            scaled_features[start : start + len(chunk)] = self.min_max_scaler.transform(
+                chunk
+            )
+        return scaled_features
+
+
+def reduce_dimensions_jointly(
+    reducers: list[AutoencoderReducer],
+    features_dir: FeatureSource,
+    epochs: int = 10,
+    batch_size: int = 256,
+    patience: Optional[int] = None,
+) -> list[np.ndarray]:
+    """Reduces the dimensions of the given samples with each of the given reducers by
+    training their autoencoders together. Keras autoencoders are packed into a single
+    model and numpy autoencoders are trained one after another on every batch. The
+    autoencoders share the input batches and the optimizer, but each autoencoder has
+    its own loss term, so they are trained independently of each other. The validation split, the scaling, and the
+    batching of the first reducer are used for all the reducers. Each reducer keeps
+    the weights of the epoch with its lowest validation loss, and the training stops
+    once none of the autoencoders improved for the given number of epochs.
+
+    :param reducers: A list of AutoencoderReducer instances whose autoencoders use
+        the same backend and the same optimizer.
+    :param features_dir: Either a string indicating the folder containing the
+        features or the already loaded features, see load_features.
+    :param epochs: An integer indicating the maximum number of epochs.
+    :param batch_size: A float indicating the batch size to use.
+    :param patience: An integer indicating the number of epochs without an
+        improvement of the validation loss of any of the autoencoders after which the
+        training is stopped. If None, the training runs for all the epochs. Defaults to
+        None.
+    :return: A list of 2-d numpy arrays of shape (n_samples, n_reduced_features)
+        containing the reduced features of each reducer, in the same order as the
+        reducers.
+    """
+    backends: set[str] = set(reducer.backend for reducer in reducers)
+    if len(backends) > 1:
+        raise ValueError("The reducers must use the same backend.")
+    optimizers: set[str] = set(reducer.optimizer for reducer in reducers)
+    if len(optimizers) > 1:
+        raise ValueError("The reducers must use the same optimizer.")
+
+    features: np.ndarray = load_features(features_dir, mmap_mode="r")
+    scaled_features, is_validation, rng = reducers[0]._split_and_scale(features)
+    for reducer in reducers[1:]:
+        reducer.min_max_scaler = reducers[0].min_max_scaler
+
+    if backends == {"numpy"}:
+        epoch_times, tracker = _train_numpy_jointly(
+            [reducer.autoencoder for reducer in reducers],
+            scaled_features,
+            is_validation,
+            rng,
+            epochs,
+            batch_size,
+            patience,
+        )
+        for reducer in reducers:
+            reducer.reduced_features = _encode_in_batches(
+                reducer.autoencoder, scaled_features, batch_size
+            )
+    else:
+        epoch_times, tracker = _train_keras_jointly(
+            reducers, scaled_features, is_validation, rng, epochs, batch_size, patience
+        )
+
+    for i, reducer in enumerate(reducers):
+        reducer.epoch_times = epoch_times
+        reducer.stopped_epoch = len(epoch_times)
+        reducer.best_epoch = tracker.best_epochs[i]
+        reducer.best_val_loss = tracker.best_val_losses[i]
+
+    return [reducer.reduced_features for reducer in reducers]
+
+
+def _train_keras_jointly(
+    reducers: list[AutoencoderReducer],
+    scaled_features: np.ndarray,
+    is_validation: np.ndarray,
+    rng: np.random.Generator,
+    epochs: int,
+    batch_size: int,
+    patience: Optional[int],
+) -> tuple[list[float], BestEpochTracker]:
+    from src.dimensionality_reduction.autoencoder.keras_training import (
+        AutoencoderGrid,
+        TrainingMonitor,
+        get_dataset,
+    )
+
+    output_names: list[str] = [f"autoencoder_{i}" for i in range(len(reducers))]
+    grid: AutoencoderGrid = AutoencoderGrid(
+        [reducer.autoencoder for reducer in reducers], output_names
+    )
+    grid.compile(
+        optimizer=reducers[0].optimizer,
+        loss={name: reducer.loss for name, reducer in zip(output_names, reducers)},
+    )
+    train_dataset = get_dataset(
+        scaled_features,
+        np.flatnonzero(~is_validation),
+        batch_size,
+        with_targets=True,
+        target_names=output_names,
+        shuffle_seed=int(rng.integers(2**31)),
+    )
+    validation_dataset = get_dataset(
+        scaled_features,
+        np.flatnonzero(is_validation),
+        batch_size,
+        with_targets=True,
+        target_names=output_names,
+    )
+
+    monitor: TrainingMonitor = TrainingMonitor(
+        patience,
+        [f"val_{name}_loss" for name in output_names],
+        [reducer.autoencoder for reducer in reducers],
+    )
+    grid.fit(
+        train_dataset,
+        epochs=epochs,
+        validation_data=validation_dataset,
+        callbacks=[monitor],
+    )
+
+    # Encode the samples with all the encoders in a single pass over the samples.
+    encoded_batches: list[list[np.ndarray]] = [[] for _ in reducers]
+    for batch in get_dataset(
+        scaled_features, np.arange(len(scaled_features)), batch_size
+    ):
+        for i, reducer in enumerate(reducers):
+            encoded_batches[i].append(
+                reducer.autoencoder.encoder(batch, training=False).numpy()
+            )
+    for i, reducer in enumerate(reducers):
+        reducer.reduced_features = np.concatenate(encoded_batches[i], axis=0)
+
+    return monitor.epoch_times, monitor.tracker
+
+
+def _train_numpy_jointly(
+    autoencoders: list[NumpyAutoencoder],
+    scaled_features: np.ndarray,
+    is_validation: np.ndarray,
+    rng: np.random.Generator,
+    epochs: int,
+    batch_size: int,
+    patience: Optional[int],
+) -> tuple[list[float], BestEpochTracker]:
+    # Mirrors the keras training: the training rows are reshuffled every epoch and
+    # every autoencoder is trained on the same batches, the validation loss of each
+    # autoencoder is averaged over the validation batches, and the weights of the
+    # epoch with the lowest validation loss of each autoencoder are restored at the
+    # end.
+    train_indices: np.ndarray = np.flatnonzero(~is_validation)
+    validation_indices: np.ndarray = np.flatnonzero(is_validation)
+    tracker: BestEpochTracker = BestEpochTracker(len(autoencoders), patience)
+    epoch_times: list[float] = []
+    for epoch in range(1, epochs + 1):
+        epoch_start: float = time.perf_counter()
+        for batch_indices in _iter_batches(rng.permutation(train_indices), batch_size):
+            batch: np.ndarray = scaled_features[batch_indices]
+            for autoencoder in autoencoders:
+                autoencoder.train_on_batch(batch)
+
+        val_losses: list[float] = [0.0 for _ in autoencoders]
+        for batch_indices in _iter_batches(validation_indices, batch_size):
+            batch: np.ndarray = scaled_features[batch_indices]
+            for i, autoencoder in enumerate(autoencoders):
+                val_losses[i] += autoencoder.compute_loss(batch) * len(batch_indices)
+        val_losses = [
+            val_loss / max(len(validation_indices), 1) for val_loss in val_losses
+        ]
+        epoch_times.append(time.perf_counter() - epoch_start)
+
+        if tracker.update(epoch, val_losses, lambda i: autoencoders[i].get_weights()):
+            break
+
+    tracker.restore(lambda i, weights: autoencoders[i].set_weights(weights))
+    return epoch_times, tracker
+
+
+def _iter_batches(indices: np.ndarray, batch_size: int) -> Iterator[np.ndarray]:
+    # Reading the rows in sorted order keeps the accesses to the file sequential.
+    for start in range(0, len(indices), batch_size):
+        yield np.sort(indices[start : start + batch_size])
+
+
+def _encode_in_batches(
+    autoencoder: NumpyAutoencoder, scaled_features: np.ndarray, batch_size: int
+) -> np.ndarray:
+    return np.concatenate(
+        [
+            autoencoder.encode(scaled_features[batch_indices])
+            for batch_indices in _iter_batches(
+                np.arange(len(scaled_features)), batch_size
+            )
+        ],
+        axis=0,
+    )
@@ -0,0 +1,60 @@
+from typing import Callable, Optional
+
+import numpy as np
+
+
+class BestEpochTracker:
+    def __init__(self, n_models: int, patience: Optional[int]) -> None:
+        """Inits a BestEpochTracker instance, which keeps the epoch with the lowest
+        validation loss of each of several models that are trained together along with
+        the weights of the model at that epoch, and decides when the training is
+        stopped early. It is shared by the keras and the numpy training.
+
+        :param n_models: An integer indicating the number of models.
+        :param patience: An integer indicating the number of epochs without an
+            improvement of any of the validation losses after which the training is
+            stopped. If None, the training is not stopped early.
+        """
+        self.patience: Optional[int] = patience
+        self.best_epochs: list[Optional[int]] = [None for _ in range(n_models)]
+        self.best_val_losses: list[Optional[float]] = [None for _ in range(n_models)]
+        self.best_weights: list[Optional[list[np.ndarray]]] = [
+            None for _ in range(n_models)
+        ]
+
+    def update(
+        self,
+        epoch: int,
+        val_losses: list[float],
+        get_weights: Callable[[int], list[np.ndarray]],
+    ) -> bool:
+        """Records the validation losses of an epoch, and keeps the weights of every
+        model whose validation loss is the lowest so far.
+
+        :param epoch: An integer indicating the number of the epoch, starting from 1.
+        :param val_losses: A list of floats containing the validation loss of every
+            model.
+        :param get_weights: A function returning the current weights of the model with
+            the given index.
+        :return: A boolean indicating whether the training is stopped, because none of
+            the models improved for the given number of epochs.
+        """
+        for i, val_loss in enumerate(val_losses):
+            if self.best_val_losses[i] is None or val_loss < self.best_val_losses[i]:
+                self.best_val_losses[i] = float(val_loss)
+                self.best_epochs[i] = epoch
+                self.best_weights[i] = get_weights(i)
+
+        return self.patience is not None and all(
+            epoch - best_epoch >= self.patience for best_epoch in self.best_epochs
+        )
+
+    def restore(self, set_weights: Callable[[int, list[np.ndarray]], None]) -> None:
+        """Restores the weights of the best epoch of every model.
+
+        :param set_weights: A function setting the weights of the model with the given
+            index.
+        """
+        for i, best_weights in enumerate(self.best_weights):
+            if best_weights is not None:
+                set_weights(i, best_weights)
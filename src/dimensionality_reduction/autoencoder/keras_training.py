@@ -0,0 +1,128 @@
+import time
+from typing import Optional
+
+import numpy as np
+import tensorflow as tf
+from tensorflow.python.keras import Model, callbacks
+
+from src.dimensionality_reduction.autoencoder.best_epoch_tracker import (
+    BestEpochTracker,
+)
+
+
+class AutoencoderGrid(Model):
+    def __init__(self, autoencoders: list[Model], output_names: list[str]) -> None:
+        """Inits an AutoencoderGrid instance, which feeds its inputs to each of the
+        given autoencoders and returns their outputs in a dictionary.
+
+        :param autoencoders: A list of keras.Model instances.
+        :param output_names: A list of strings containing the name of the output of
+            each autoencoder.
+        """
+        super().__init__(name="autoencoder_grid")
+        self.autoencoders: list[Model] = autoencoders
+        self.autoencoder_names: list[str] = output_names
+
+    def call(self, inputs):
+        return {
+            name: autoencoder(inputs)
+            for name, autoencoder in zip(self.autoencoder_names, self.autoencoders)
+        }
+
+
+class TrainingMonitor(callbacks.Callback):
+    def __init__(
+        self,
+        patience: Optional[int],
+        loss_names: list[str],
+        models: Optional[list[Model]] = None,
+    ) -> None:
+        """Inits a TrainingMonitor instance, which records the duration of every
+        epoch and uses a BestEpochTracker to keep the weights of each model of the
+        epoch with its lowest validation loss, to stop the training early if none of
+        the validation losses improve for the given number of epochs, and to restore
+        the best weights at the end of the training.
+
+        :param patience: An integer indicating the number of epochs without an
+            improvement after which the training is stopped. If None, the training is
+            not stopped early.
+        :param loss_names: A list of strings containing the name of the validation
+            loss of each model in the training logs.
+        :param models: A list of keras.Model instances whose weights are kept. If None,
+            the weights of the trained model are kept. Defaults to None.
+        """
+        super().__init__()
+        self.loss_names: list[str] = loss_names
+        self.models: Optional[list[Model]] = models
+        self.tracker: BestEpochTracker = BestEpochTracker(len(loss_names), patience)
+        self.epoch_times: list[float] = []
+        self.epoch_start: Optional[float] = None
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self.epoch_start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.epoch_times.append(time.perf_counter() - self.epoch_start)
+
+        if self.tracker.update(
+            epoch + 1,
+            [float(logs[loss_name]) for loss_name in self.loss_names],
+            lambda i: self._get_model(i).get_weights(),
+        ):
+            self.model.stop_training = True
+
+    def on_train_end(self, logs=None):
+        self.tracker.restore(lambda i, weights: self._get_model(i).set_weights(weights))
+
+    def _get_model(self, i: int) -> Model:
+        return self.model if self.models is None else self.models[i]
+
+
+def get_dataset(
+    source: np.ndarray,
+    indices: np.ndarray,
+    batch_size: int,
+    with_targets: bool = False,
+    target_names: Optional[list[str]] = None,
+    shuffle_seed: Optional[int] = None,
+) -> tf.data.Dataset:
+    """Creates a tf.data pipeline that gathers batches of the given rows of the source
+    array, which is typically memory-mapped, and prefetches them.
+
+    :param source: A 2-d float32 numpy array of shape (n_samples, n_features).
+    :param indices: A 1-d numpy array containing the rows to include.
+    :param batch_size: An integer indicating the batch size.
+    :param with_targets: A boolean indicating whether each batch is paired with itself
+        as the target. Defaults to False.
+    :param target_names: A list of strings containing the names of the outputs of a
+        multi-output model. If given, the targets are a dictionary mapping each name to
+        the batch. Defaults to None.
+    :param shuffle_seed: An integer indicating the seed for shuffling the rows in every
+        iteration. If None, the rows are not shuffled. Defaults to None.
+    :return: An instance of tf.data.Dataset.
+    """
+
+    def gather(batch_indices: np.ndarray) -> np.ndarray:
+        # Reading the rows in sorted order keeps the accesses to the file sequential.
+        return source[np.sort(batch_indices)]
+
+    def gather_batch(batch_indices: tf.Tensor) -> tf.Tensor:
+        batch: tf.Tensor = tf.numpy_function(gather, [batch_indices], tf.float32)
+        batch.set_shape([None, source.shape[1]])
+        return batch
+
+    dataset: tf.data.Dataset = tf.data.Dataset.from_tensor_slices(indices)
+    if shuffle_seed is not None:
+        dataset = dataset.shuffle(
+            len(indices), seed=shuffle_seed, reshuffle_each_iteration=True
+        )
+    dataset = dataset.batch(batch_size).map(
+        gather_batch, num_parallel_calls=tf.data.AUTOTUNE
+    )
+    if with_targets and target_names is not None:
+        dataset = dataset.map(
+            lambda batch: (batch, {name: batch for name in target_names})
+        )
+    elif with_targets:
+        dataset = dataset.map(lambda batch: (batch, batch))
+    return dataset.prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,303 @@
+from typing import Optional
+
+import numpy as np
+
+
+class NumpyAutoencoder:
+    def __init__(
+        self,
+        layer_dims: list[int],
+        activations: list[str],
+        n_encoder_layers: int,
+        l2: float = 0.0,
+        beta: float = 0.0,
+        p: float = 0.1,
+        init_stddev: Optional[float] = None,
+        learning_rate: float = 0.001,
+        random_state: Optional[int] = None,
+    ) -> None:
+        """Inits a NumpyAutoencoder instance, which is a fully connected autoencoder
+        that is trained with Adam on float32 mini-batches using only numpy. It mirrors
+        the keras autoencoders of this package without depending on TensorFlow.
+        Should mostly be created through NumpyDeepAutoencoder and
+        NumpySparseAutoencoder.
+
+        :param layer_dims: A list of integers containing the number of neurons of every
+            layer, starting with the input dimension and ending with the output
+            dimension.
+        :param activations: A list of strings containing the activation of every layer
+            after the input. Available options are "relu" and "sigmoid".
+        :param n_encoder_layers: An integer indicating the number of layers after the
+            input that make up the encoder.
+        :param l2: A float indicating the l2 regularization factor of the weights.
+            Defaults to 0.0.
+        :param beta: A float indicating the weight of the KL sparsity regularization of
+            the output of the encoder. Defaults to 0.0.
+        :param p: A float indicating the target sparsity proportion. Defaults to 0.1.
+        :param init_stddev: A float indicating the standard deviation of the normal
+            distribution the weights and biases are initialized with. If None, the
+            weights are initialized with the Glorot uniform initializer and the biases
+            with zeros, as keras does. Defaults to None.
+        :param learning_rate: A float indicating the learning rate of Adam. Defaults to
+            0.001.
+        :param random_state: An integer indicating the seed of the initialization.
+            Defaults to None.
+        """
+        for activation in activations:
+            if activation not in _ACTIVATIONS:
+                raise ValueError(
+                    f"The given activation of {activation} is not supported."
+                )
+        if len(activations) != len(layer_dims) - 1:
+            raise ValueError("Every layer after the input must have an activation.")
+
+        self.layer_dims: list[int] = layer_dims
+        self.activations: list[str] = activations
+        self.n_encoder_layers: int = n_encoder_layers
+        self.l2: float = l2
+        self.beta: float = beta
+        self.p: float = p
+        self.learning_rate: float = learning_rate
+
+        rng: np.random.Generator = np.random.default_rng(random_state)
+        self.kernels: list[np.ndarray] = []
+        self.biases: list[np.ndarray] = []
+        for fan_in, fan_out in zip(layer_dims[:-1], layer_dims[1:]):
+            if init_stddev is None:
+                limit: float = np.sqrt(6 / (fan_in + fan_out))
+                kernel: np.ndarray = rng.uniform(-limit, limit, size=(fan_in, fan_out))
+                bias: np.ndarray = np.zeros(fan_out)
+            else:
+                kernel: np.ndarray = rng.normal(
+                    0.0, init_stddev, size=(fan_in, fan_out)
+                )
+                bias: np.ndarray = rng.normal(0.0, init_stddev, size=fan_out)
+            self.kernels.append(kernel.astype(np.float32))
+            self.biases.append(bias.astype(np.float32))
+
+        self.n_steps: int = 0
+        self.first_moments: list[np.ndarray] = [
+            np.zeros_like(w) for w in self.get_weights()
+        ]
+        self.second_moments: list[np.ndarray] = [
+            np.zeros_like(w) for w in self.get_weights()
+        ]
+
+    def encode(self, features: np.ndarray) -> np.ndarray:
+        """Encodes the given samples.
+
+        :param features: A 2-d numpy array of shape (n_samples, n_features) containing
+            scaled samples.
+        :return: A 2-d float32 numpy array of shape (n_samples, latent_dim) containing
+            the encoded samples.
+        """
+        return self._forward(features)[self.n_encoder_layers]
+
+    def reconstruct(self, features: np.ndarray) -> np.ndarray:
+        """Encodes and decodes the given samples.
+
+        :param features: A 2-d numpy array of shape (n_samples, n_features) containing
+            scaled samples.
+        :return: A 2-d float32 numpy array of shape (n_samples, n_features) containing
+            the reconstructed samples.
+        """
+        return self._forward(features)[-1]
+
+    def compute_loss(self, batch: np.ndarray) -> float:
+        """Computes the loss of the given batch, which is the mean squared error of the
+        reconstruction plus the regularization terms.
+
+        :param batch: A 2-d numpy array of shape (batch_size, n_features).
+        :return: A float indicating the loss.
+        """
+        activations: list[np.ndarray] = self._forward(batch)
+        return self._compute_loss(activations)
+
+    def train_on_batch(self, batch: np.ndarray) -> float:
+        """Takes a single Adam step on the given batch.
+
+        :param batch: A 2-d numpy array of shape (batch_size, n_features).
+        :return: A float indicating the loss of the batch before the step.
+        """
+        activations: list[np.ndarray] = self._forward(batch)
+        loss: float = self._compute_loss(activations)
+        self._apply_gradients(self._compute_gradients(activations))
+        return loss
+
+    def get_weights(self) -> list[np.ndarray]:
+        """Returns copies of the kernels and the biases of all the layers.
+
+        :return: A list of numpy arrays containing the kernel and the bias of every
+            layer, in order.
+        """
+        weights: list[np.ndarray] = []
+        for kernel, bias in zip(self.kernels, self.biases):
+            weights.extend([kernel.copy(), bias.copy()])
+        return weights
+
+    def set_weights(self, weights: list[np.ndarray]) -> None:
+        """Sets the kernels and the biases of all the layers.
+
+        :param weights: A list of numpy arrays as returned by get_weights.
+        """
+        self.kernels = [np.array(w, dtype=np.float32) for w in weights[0::2]]
+        self.biases = [np.array(w, dtype=np.float32) for w in weights[1::2]]
+
+    def save_weights(self, file_path: str) -> None:
+        """Saves the kernels and the biases of all the layers to a .npz file.
+
+        :param file_path: A string indicating the path of the file.
+        """
+        weights: list[np.ndarray] = self.get_weights()
+        np.savez(file_path, **{f"weight_{i}": w for i, w in enumerate(weights)})
+
+    def load_weights(self, file_path: str) -> None:
+        """Loads the kernels and the biases saved with save_weights.
+
+        :param file_path: A string indicating the path of the file.
+        """
+        with np.load(file_path) as saved_weights:
+            self.set_weights(
+                [saved_weights[f"weight_{i}"] for i in range(len(saved_weights.files))]
+            )
+
+    def _forward(self, features: np.ndarray) -> list[np.ndarray]:
+        activations: list[np.ndarray] = [np.asarray(features, dtype=np.float32)]
+        for kernel, bias, activation in zip(
+            self.kernels, self.biases, self.activations
+        ):
+            activations.append(
+                _ACTIVATIONS[activation](activations[-1] @ kernel + bias)
+            )
+        return activations
+
+    def _compute_loss(self, activations: list[np.ndarray]) -> float:
+        loss: float = float(np.mean((activations[-1] - activations[0]) ** 2))
+        loss += self.l2 * sum(float(np.sum(kernel**2)) for kernel in self.kernels)
+        if self.beta > 0:
+            p_hat: float = float(np.mean(activations[self.n_encoder_layers]))
+            kl_divergence: float = self.p * np.log(self.p / p_hat) + (1 - self.p) * (
+                np.log((1 - self.p) / (1 - p_hat))
+            )
+            # keras divides the activity regularization by the batch size.
+            loss += self.beta * kl_divergence / len(activations[0])
+        return loss
+
+    def _compute_gradients(self, activations: list[np.ndarray]) -> list[np.ndarray]:
+        batch: np.ndarray = activations[0]
+        output_gradient: np.ndarray = (
+            2 * (activations[-1] - batch) / np.float32(batch.size)
+        )
+
+        gradients: list[np.ndarray] = []
+        for i in reversed(range(len(self.kernels))):
+            if i + 1 == self.n_encoder_layers and self.beta > 0:
+                encoded: np.ndarray = activations[i + 1]
+                p_hat: float = float(np.mean(encoded))
+                kl_gradient: float = -self.p / p_hat + (1 - self.p) / (1 - p_hat)
+                output_gradient = output_gradient + np.float32(
+                    self.beta * kl_gradient / (len(batch) * encoded.size)
+                )
+            pre_activation_gradient: np.ndarray = output_gradient * _DERIVATIVES[
+                self.activations[i]
+            ](activations[i + 1])
+            kernel_gradient: np.ndarray = (
+                activations[i].T @ pre_activation_gradient
+                + 2 * np.float32(self.l2) * self.kernels[i]
+            )
+            gradients.extend([pre_activation_gradient.sum(axis=0), kernel_gradient])
+            output_gradient = pre_activation_gradient @ self.kernels[i].T
+
+        return gradients[::-1]
+
+    def _apply_gradients(self, gradients: list[np.ndarray]) -> None:
+        # Adam with the default hyperparameters of keras.
+        beta_1, beta_2, epsilon = 0.9, 0.999, 1e-7
+        self.n_steps += 1
+        step_size: float = (
+            self.learning_rate
+            * np.sqrt(1 - beta_2**self.n_steps)
+            / (1 - beta_1**self.n_steps)
+        )
+
+        # The gradients and the moments are ordered as the weights in get_weights.
+        for j, gradient in enumerate(gradients):
+            weight: np.ndarray = (
+                self.kernels[j // 2] if j % 2 == 0 else self.biases[j // 2]
+            )
+            self.first_moments[j] *= beta_1
+            self.first_moments[j] += (1 - beta_1) * gradient
+            self.second_moments[j] *= beta_2
+            self.second_moments[j] += (1 - beta_2) * gradient**2
+            weight -= np.float32(step_size) * (
+                self.first_moments[j] / (np.sqrt(self.second_moments[j]) + epsilon)
+            )
+
+
+class NumpyDeepAutoencoder(NumpyAutoencoder):
+    def __init__(
+        self, layer_dims: list[int], output_dim: int, random_state: Optional[int] = None
+    ) -> None:
+        """Inits a NumpyDeepAutoencoder instance, which has the same architecture as
+        DeepAutoencoder.
+
+        :param layer_dims: A list of integers containing the number of neurons per
+            neuron from the first layer to the bottleneck layer.
+        :param output_dim: An integer indicating the output dimension of the decoder.
+        :param random_state: An integer indicating the seed of the initialization.
+            Defaults to None.
+        """
+        super().__init__(
+            [output_dim] + layer_dims + layer_dims[-2::-1] + [output_dim],
+            ["relu"] * (2 * len(layer_dims) - 1) + ["sigmoid"],
+            len(layer_dims),
+            random_state=random_state,
+        )
+
+
+class NumpySparseAutoencoder(NumpyAutoencoder):
+    def __init__(
+        self,
+        latent_dim: int,
+        output_dim: int,
+        lambda_: float,
+        beta: float,
+        p: float,
+        random_state: Optional[int] = None,
+    ) -> None:
+        """Inits a NumpySparseAutoencoder instance, which has the same architecture,
+        initialization, and regularization as SparseAutoencoder.
+
+        :param latent_dim: An integer indicating the latent dimension of the encoder.
+        :param output_dim: An integer indicating the output dimension of the decoder.
+        :param lambda_: A float indicating the l2 regularization parameter.
+        :param beta: A float indicating the sparsity regularization value.
+        :param p: A float indicating the sparsity proportion value.
+        :param random_state: An integer indicating the seed of the initialization.
+            Defaults to None.
+        """
+        super().__init__(
+            [output_dim, latent_dim, output_dim],
+            ["sigmoid", "sigmoid"],
+            1,
+            l2=lambda_ / 2,
+            beta=beta,
+            p=p,
+            init_stddev=0.01,
+            random_state=random_state,
+        )
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 0.5 * (np.tanh(0.5 * x) + 1)
+
+
+def _relu(x: np.ndarray) -> np.ndarray:
+    return np.maximum(x, 0)
+
+
+_ACTIVATIONS: dict = {"relu": _relu, "sigmoid": _sigmoid}
+_DERIVATIVES: dict = {
+    "relu": lambda a: (a > 0).astype(a.dtype),
+    "sigmoid": lambda a: a * (1 - a),
+}
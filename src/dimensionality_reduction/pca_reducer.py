@@ -1,38 +1,322 @@
-from typing import cast
+import pickle
+from typing import Union, cast
 
 import numpy as np
-from sklearn.decomposition import PCA
+from sklearn.decomposition import PCA, IncrementalPCA
 
 from src.dimensionality_reduction.abstract_reducer import AbstractReducer
+from src.util.feature_loading import (
+    FeatureSource,
+    empty_scratch_array,
+    iter_row_chunks,
+    load_features,
+    read_in_chunks,
+)
 
 
 class PCAReducer(AbstractReducer):
-    def __init__(self, n_components: int) -> None:
+    def __init__(
+        self,
+        n_components: Union[int, list[int]],
+        solver: str = "full",
+        chunk_size: int = 10000,
+        power_iterations: int = 2,
+        oversamples: int = 10,
+        random_state: int = 0,
+    ) -> None:
         """Inits a PCAReducer instance.
 
-        :param n_components: An integer indicating the number of features to retain.
+        :param n_components: Either an integer indicating the number of features to
+            retain or a list of integers containing multiple numbers of features to
+            retain. In the latter case, a single decomposition is fitted with the
+            largest number, and the reductions for the smaller numbers are obtained by
+            keeping the leading components.
+        :param solver: A string indicating how the decomposition is computed. Available
+            options are "full" for fitting sklearn.decomposition.PCA on the features in
+            memory, "incremental" for fitting sklearn.decomposition.IncrementalPCA on
+            memory-mapped chunks of the features, and "randomized" for a randomized SVD
+            computed with passes over memory-mapped chunks of the features. With the
+            last two options, the memory usage depends on the chunk size instead of the
+            number of samples. Defaults to "full".
+        :param chunk_size: An integer indicating the number of samples per chunk for
+            the "incremental" and "randomized" solvers. The "incremental" solver uses
+            chunks of at least the largest number of components. Defaults to 10000.
+        :param power_iterations: An integer indicating the number of power iterations
+            of the "randomized" solver. Defaults to 2.
+        :param oversamples: An integer indicating the number of additional random
+            vectors used by the "randomized" solver. Defaults to 10.
+        :param random_state: An integer indicating the seed of the "randomized" solver.
+            Defaults to 0.
         """
         super().__init__()
-        self.n_components: int = n_components
-        self.pca: PCA = PCA(n_components=self.n_components)
+        if solver not in ["full", "incremental", "randomized"]:
+            raise ValueError(f"The given solver of {solver} is not supported.")
 
-    def reduce_dimensions(self, features_dir: str) -> np.ndarray:
+        self.n_components: Union[int, list[int]] = n_components
+        self.solver: str = solver
+        self.chunk_size: int = chunk_size
+        self.power_iterations: int = power_iterations
+        self.oversamples: int = oversamples
+        self.random_state: int = random_state
+        self.pca: Union[PCA, IncrementalPCA] = PCA(
+            n_components=self._get_max_n_components()
+        )
+        self.explained_variance_ratio: list[float] = []
+        self.cumulative_explained_variance_ratios: dict[str, float] = {}
+
+    def reduce_dimensions(self, features_dir: FeatureSource) -> np.ndarray:
         """Reduces the dimensions of the given samples using Singular Value
-        Decomposition (SVD).
+        Decomposition (SVD). If multiple numbers of components are given, the samples
+        are reduced to the largest number.
 
-        :param features_dir: A string indicating the file containing the features.
+        :param features_dir: Either a string indicating the folder containing the
+            features or the already loaded features, see load_features.
         :return: A 2-d numpy array of shape (n_samples, n_reduced_features) containing
             the samples in a latent space with a lower dimensionality.
         """
-        features: np.ndarray = np.load(f"{features_dir}/features.npy")
-        self.pca: PCA = cast(PCA, self.pca.fit(features))
-        self.reduced_features = self.pca.transform(features)
+        features: np.ndarray = self._load_features(features_dir)
+        self._fit(features)
+        if self.solver == "full":
+            self.reduced_features = self.transform(features)
+        else:
+            # The reduced rows are written to an array backed by a temporary file, so
+            # that neither the features nor the reduced features need to fit in memory.
+            self.reduced_features = empty_scratch_array(
+                (features.shape[0], self._get_max_n_components()), np.float64
+            )
+            for start, chunk in iter_row_chunks(features, self.chunk_size):
+                self.reduced_features[start : start + len(chunk)] = self.transform(
+                    chunk
+                )
 
         return self.reduced_features
 
+    def fit(self, features_dir: FeatureSource) -> "PCAReducer":
+        """Fits the decomposition on the given samples without reducing them.
+
+        :param features_dir: Either a string indicating the folder containing the
+            features or the already loaded features, see load_features.
+        :return: The fitted reducer.
+        """
+        self._fit(self._load_features(features_dir))
+        return self
+
+    def transform(self, features: np.ndarray) -> np.ndarray:
+        """Reduces the dimensions of the given samples with the fitted decomposition.
+        If multiple numbers of components are given, the samples are reduced to the
+        largest number.
+
+        :param features: A 2-d numpy array of shape (n_samples, n_features).
+        :return: A 2-d numpy array of shape (n_samples, n_reduced_features) containing
+            the samples in a latent space with a lower dimensionality.
+        """
+        n_components: int = self._get_max_n_components()
+        return (
+            np.asarray(features, dtype=np.float64) - self.pca.mean_
+        ) @ self.pca.components_[:n_components].T
+
+    def save_model(self, save_folder_path: str) -> None:
+        """Saves the fitted decomposition and the configuration of the reduction.
+
+        :param save_folder_path: A sting indicating the folder to save the files to.
+        """
+        self._save_config(save_folder_path)
+        with open(f"{save_folder_path}/pca.pickle", mode="wb") as f:
+            pickle.dump(self.pca, f)
+
+    def load_model(self, model_folder_path: str) -> None:
+        """Restores the fitted decomposition saved with save_model. The decomposition
+        may have been fitted with more components than self.n_components, in which
+        case only the leading components are used.
+
+        :param model_folder_path: A string indicating the folder containing the saved
+            decomposition.
+        """
+        with open(f"{model_folder_path}/pca.pickle", mode="rb") as f:
+            self.pca = pickle.load(f)
+        self._set_explained_variance_ratios()
+
     def get_explained_variance(self) -> float:
         """Returns the variance explained by the retained components.
 
         :return: A float indicating the explained variance.
         """
         return sum(self.pca.explained_variance_ratio_)
+
+    def save_reduced_features_sweep(
+        self, save_folder_paths: list[str], save_models: bool = False
+    ) -> None:
+        """Saves the reduced features and the configuration of the reduction for each
+        of the numbers of components in self.n_components, which must be a list. The
+        reduced features of a number of components are the leading columns of the
+        reduced features computed with the largest number. Every configuration contains
+        the cumulative explained variance ratio of each of the numbers of components.
+
+        :param save_folder_paths: A list of strings indicating the folders to save the
+            files of each number of components to, in the same order as
+            self.n_components.
+        :param save_models: A boolean indicating whether the fitted decomposition is
+            also saved to each folder with save_model. Defaults to False.
+        """
+        if not isinstance(self.n_components, list):
+            raise ValueError("A sweep requires a list of numbers of components.")
+        if len(save_folder_paths) != len(self.n_components):
+            raise ValueError(
+                "The number of folders must match the number of numbers of components."
+            )
+
+        for n_components, save_folder_path in zip(self.n_components, save_folder_paths):
+            run_reducer: PCAReducer = PCAReducer(
+                n_components,
+                solver=self.solver,
+                chunk_size=self.chunk_size,
+                power_iterations=self.power_iterations,
+                oversamples=self.oversamples,
+                random_state=self.random_state,
+            )
+            run_reducer.pca = self.pca
+            run_reducer.explained_variance_ratio = self.explained_variance_ratio
+            run_reducer.cumulative_explained_variance_ratios = (
+                self.cumulative_explained_variance_ratios
+            )
+            run_reducer.reduced_features = self.reduced_features[:, :n_components]
+            run_reducer.save_reduced_features(save_folder_path)
+            if save_models:
+                run_reducer.save_model(save_folder_path)
+
+    def _get_max_n_components(self) -> int:
+        if isinstance(self.n_components, list):
+            return max(self.n_components)
+        else:
+            return self.n_components
+
+    def _fit_incremental(self, features: np.ndarray) -> IncrementalPCA:
+        n_components: int = self._get_max_n_components()
+        pca: IncrementalPCA = IncrementalPCA(n_components=n_components)
+        # Every chunk passed to IncrementalPCA needs at least n_components rows.
+        for _, chunk in iter_row_chunks(
+            features, max(self.chunk_size, n_components), n_components
+        ):
+            pca.partial_fit(chunk)
+        return pca
+
+    def _fit_randomized(self, features: np.ndarray) -> PCA:
+        """Fits a PCA with a randomized SVD of the centered features that only needs
+        the products of the features with a small number of vectors, which are
+        accumulated over chunks of the features. The fitted attributes are set on a
+        sklearn.decomposition.PCA instance.
+        """
+        n_samples, n_features = features.shape
+        n_components: int = self._get_max_n_components()
+        n_random: int = min(n_components + self.oversamples, n_features)
+        mean, total_variance = _compute_moments(features, self.chunk_size)
+
+        # Find an orthonormal basis for the range of the covariance matrix.
+        rng: np.random.Generator = np.random.default_rng(self.random_state)
+        basis: np.ndarray = rng.normal(size=(n_features, n_random))
+        for _ in range(self.power_iterations + 1):
+            basis = self._multiply_by_covariance(features, mean, basis)
+            basis, _ = np.linalg.qr(basis)
+
+        # Project the covariance matrix onto the basis and decompose it.
+        projected_covariance: np.ndarray = basis.T @ self._multiply_by_covariance(
+            features, mean, basis
+        )
+        eigenvalues, eigenvectors = np.linalg.eigh(projected_covariance)
+        order: np.ndarray = np.argsort(eigenvalues)[::-1][:n_components]
+        components: np.ndarray = (basis @ eigenvectors[:, order]).T
+        # Make the entry with the largest absolute value of each component positive
+        # for deterministic signs, as sklearn does.
+        max_abs_idx: np.ndarray = np.argmax(np.abs(components), axis=1)
+        components *= np.sign(components[np.arange(n_components), max_abs_idx])[:, None]
+        explained_variance: np.ndarray = np.maximum(eigenvalues[order], 0) / (
+            n_samples - 1
+        )
+
+        pca: PCA = PCA(n_components=n_components)
+        pca.mean_ = mean
+        pca.components_ = components
+        pca.n_components_ = n_components
+        pca.n_samples_ = n_samples
+        pca.n_features_in_ = n_features
+        pca.explained_variance_ = explained_variance
+        pca.explained_variance_ratio_ = explained_variance / total_variance
+        pca.singular_values_ = np.sqrt(explained_variance * (n_samples - 1))
+        pca.noise_variance_ = max(
+            (total_variance - explained_variance.sum())
+            / max(n_features - n_components, 1),
+            0.0,
+        )
+        return pca
+
+    def _multiply_by_covariance(
+        self, features: np.ndarray, mean: np.ndarray, vectors: np.ndarray
+    ) -> np.ndarray:
+        # Computes (X - mean)^T (X - mean) @ vectors one chunk at a time.
+        product: np.ndarray = np.zeros_like(vectors)
+        for _, chunk in iter_row_chunks(features, self.chunk_size):
+            centered_chunk: np.ndarray = chunk.astype(np.float64) - mean
+            product += centered_chunk.T @ (centered_chunk @ vectors)
+        return product
+
+    def _load_features(self, features_dir: FeatureSource) -> np.ndarray:
+        if self.solver == "full":
+            return read_in_chunks(
+                load_features(features_dir, mmap_mode="r"), self.chunk_size
+            )
+        else:
+            return load_features(features_dir, mmap_mode="r")
+
+    def _fit(self, features: np.ndarray) -> None:
+        if self.solver == "full":
+            self.pca = cast(
+                PCA, PCA(n_components=self._get_max_n_components()).fit(features)
+            )
+        elif self.solver == "incremental":
+            self.pca = self._fit_incremental(features)
+        else:
+            self.pca = self._fit_randomized(features)
+        self._set_explained_variance_ratios()
+
+    def _set_explained_variance_ratios(self) -> None:
+        # The keys are strings so that the ratios are kept in the configuration.
+        self.explained_variance_ratio = self.pca.explained_variance_ratio_.tolist()
+        cumulative_ratios: np.ndarray = np.cumsum(self.pca.explained_variance_ratio_)
+        all_n_components: list[int] = (
+            self.n_components
+            if isinstance(self.n_components, list)
+            else [self.n_components]
+        )
+        self.cumulative_explained_variance_ratios = {
+            str(n_components): float(
+                cumulative_ratios[min(n_components, len(cumulative_ratios)) - 1]
+            )
+            for n_components in all_n_components
+        }
+
+
+def _compute_moments(features: np.ndarray, chunk_size: int) -> tuple[np.ndarray, float]:
+    """Computes the mean of every feature and the sum of the variances of the features
+    by combining the moments of chunks of the features.
+
+    :param features: A 2-d (memory-mapped) numpy array of shape (n_samples, n_features).
+    :param chunk_size: An integer indicating the number of samples per chunk.
+    :return: A 2-tuple containing a 1-d numpy array of shape (n_features,) with the
+        means and a float indicating the total variance.
+    """
+    n_seen: int = 0
+    mean: np.ndarray = np.zeros(features.shape[1])
+    squared_deviations: np.ndarray = np.zeros(features.shape[1])
+    for _, chunk in iter_row_chunks(features, chunk_size):
+        chunk = chunk.astype(np.float64)
+        chunk_mean: np.ndarray = chunk.mean(axis=0)
+        chunk_squared_deviations: np.ndarray = ((chunk - chunk_mean) ** 2).sum(axis=0)
+        n_total: int = n_seen + len(chunk)
+        delta: np.ndarray = chunk_mean - mean
+        squared_deviations += (
+            chunk_squared_deviations + delta**2 * n_seen * len(chunk) / n_total
+        )
+        mean += delta * len(chunk) / n_total
+        n_seen = n_total
+
+    return mean, float(squared_deviations.sum() / (n_seen - 1))
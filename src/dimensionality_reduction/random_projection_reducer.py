@@ -0,0 +1,177 @@
+import math
+import pickle
+from typing import Optional, Union
+
+import numpy as np
+from scipy.optimize import brentq
+from sklearn.random_projection import SparseRandomProjection
+
+from src.dimensionality_reduction.abstract_reducer import AbstractReducer
+from src.util.feature_loading import (
+    FeatureSource,
+    empty_scratch_array,
+    iter_row_chunks,
+    load_features,
+)
+
+
+class RandomProjectionReducer(AbstractReducer):
+    def __init__(
+        self,
+        n_components: int,
+        density: Union[float, str] = "auto",
+        chunk_size: int = 10000,
+        n_distortion_pairs: int = 1000,
+        random_state: int = 0,
+    ) -> None:
+        """Inits a RandomProjectionReducer instance.
+
+        :param n_components: An integer indicating the number of features to retain.
+        :param density: Either a float indicating the ratio of the non-zero entries of
+            the projection matrix or "auto" for 1 / sqrt(n_features). Defaults to
+            "auto".
+        :param chunk_size: An integer indicating the number of samples per chunk that
+            are projected at once. Defaults to 10000.
+        :param n_distortion_pairs: An integer indicating the number of random pairs of
+            samples used for estimating the distortion of the pairwise distances.
+            Defaults to 1000.
+        :param random_state: An integer indicating the seed of the projection matrix and
+            the sampled pairs. Defaults to 0.
+        """
+        super().__init__()
+        self.n_components: int = n_components
+        self.density: Union[float, str] = density
+        self.chunk_size: int = chunk_size
+        self.n_distortion_pairs: int = n_distortion_pairs
+        self.random_state: int = random_state
+        self.projection: SparseRandomProjection = SparseRandomProjection(
+            n_components=n_components, density=density, random_state=random_state
+        )
+
+        self.jl_eps: Optional[float] = None
+        self.mean_distortion: Optional[float] = None
+        self.max_distortion: Optional[float] = None
+
+    def reduce_dimensions(self, features_dir: FeatureSource) -> np.ndarray:
+        """Reduces the dimensions of the given samples by multiplying them with a
+        sparse random matrix. The samples are read from a memory-mapped file and
+        projected chunk by chunk into an array backed by a temporary file.
+
+        :param features_dir: Either a string indicating the folder containing the
+            features or the already loaded features, see load_features.
+        :return: A 2-d numpy array of shape (n_samples, n_reduced_features) containing
+            the samples in a latent space with a lower dimensionality.
+        """
+        features: np.ndarray = load_features(features_dir, mmap_mode="r")
+        self._fit(features)
+        self.reduced_features = empty_scratch_array(
+            (features.shape[0], self.n_components),
+            np.result_type(features.dtype, np.float32),
+        )
+        for start, chunk in iter_row_chunks(features, self.chunk_size):
+            self.reduced_features[start : start + len(chunk)] = self.transform(chunk)
+        self._estimate_distortion(features)
+
+        return self.reduced_features
+
+    def fit(self, features_dir: FeatureSource) -> "RandomProjectionReducer":
+        """Generates the projection matrix for the given samples without reducing them.
+
+        :param features_dir: Either a string indicating the folder containing the
+            features or the already loaded features, see load_features.
+        :return: The fitted reducer.
+        """
+        self._fit(load_features(features_dir, mmap_mode="r"))
+        return self
+
+    def transform(self, features: np.ndarray) -> np.ndarray:
+        """Reduces the dimensions of the given samples with the projection matrix.
+
+        :param features: A 2-d numpy array of shape (n_samples, n_features).
+        :return: A 2-d numpy array of shape (n_samples, n_reduced_features) containing
+            the samples in a latent space with a lower dimensionality.
+        """
+        return self.projection.transform(np.asarray(features))
+
+    def save_model(self, save_folder_path: str) -> None:
+        """Saves the projection and the configuration of the reduction.
+
+        :param save_folder_path: A sting indicating the folder to save the files to.
+        """
+        self._save_config(save_folder_path)
+        with open(f"{save_folder_path}/projection.pickle", mode="wb") as f:
+            pickle.dump(self.projection, f)
+
+    def load_model(self, model_folder_path: str) -> None:
+        """Restores the projection saved with save_model.
+
+        :param model_folder_path: A string indicating the folder containing the saved
+            projection.
+        """
+        with open(f"{model_folder_path}/projection.pickle", mode="rb") as f:
+            self.projection = pickle.load(f)
+
+    def _fit(self, features: np.ndarray) -> None:
+        # The projection matrix only depends on the number of features, so a single
+        # row is enough for generating it.
+        self.projection.fit(np.asarray(features[:1]))
+        self.jl_eps = get_jl_eps(features.shape[0], self.n_components)
+
+    def _estimate_distortion(self, features: np.ndarray) -> None:
+        # Compares the squared distances between random pairs of samples before and
+        # after the projection.
+        rng: np.random.Generator = np.random.default_rng(self.random_state)
+        n_samples: int = features.shape[0]
+        first_rows: np.ndarray = rng.integers(n_samples, size=self.n_distortion_pairs)
+        second_rows: np.ndarray = rng.integers(n_samples, size=self.n_distortion_pairs)
+        is_pair: np.ndarray = first_rows != second_rows
+        first_rows, second_rows = first_rows[is_pair], second_rows[is_pair]
+        if len(first_rows) == 0:
+            return
+
+        distances: np.ndarray = _get_squared_distances(
+            features, first_rows, second_rows
+        )
+        reduced_distances: np.ndarray = _get_squared_distances(
+            self.reduced_features, first_rows, second_rows
+        )
+        is_distinct: np.ndarray = distances > 0
+        distortions: np.ndarray = np.abs(
+            reduced_distances[is_distinct] / distances[is_distinct] - 1
+        )
+        if len(distortions) > 0:
+            self.mean_distortion = float(distortions.mean())
+            self.max_distortion = float(distortions.max())
+
+
+def get_jl_eps(n_samples: int, n_components: int) -> Optional[float]:
+    """Computes the smallest distortion that the Johnson-Lindenstrauss lemma guarantees
+    for projecting the given number of samples to the given number of components, i.e.
+    the eps for which sklearn.random_projection.johnson_lindenstrauss_min_dim returns
+    n_components.
+
+    :param n_samples: An integer indicating the number of samples.
+    :param n_components: An integer indicating the number of components.
+    :return: A float between 0 and 1 indicating the distortion, or None if the lemma
+        gives no guarantee for the given number of components.
+    """
+
+    def get_excess_components(eps: float) -> float:
+        return 4 * math.log(n_samples) / (eps**2 / 2 - eps**3 / 3) - n_components
+
+    if n_samples < 2 or get_excess_components(1 - 1e-9) > 0:
+        return None
+    return float(brentq(get_excess_components, 1e-9, 1 - 1e-9))
+
+
+def _get_squared_distances(
+    features: np.ndarray, first_rows: np.ndarray, second_rows: np.ndarray
+) -> np.ndarray:
+    # Reading the rows in sorted order keeps the accesses to the file sequential.
+    rows: np.ndarray = np.union1d(first_rows, second_rows)
+    gathered_rows: np.ndarray = np.asarray(features[rows], dtype=np.float64)
+    differences: np.ndarray = (
+        gathered_rows[np.searchsorted(rows, first_rows)]
+        - gathered_rows[np.searchsorted(rows, second_rows)]
+    )
+    return np.einsum("ij,ij->i", differences, differences)
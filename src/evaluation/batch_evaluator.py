@@ -0,0 +1,172 @@
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+import pandas as pd
+
+from src.evaluation.distance_cache import get_distance_cache
+from src.evaluation.evaluator import (
+    Evaluator,
+    _join_ground_truth,
+    _open_features,
+    resolve_image_names_path,
+)
+
+
+class BatchEvaluator:
+    def __init__(
+        self,
+        do_internal: bool,
+        do_external: bool,
+        features_path: str,
+        image_names_path: str,
+        ground_truth_path: str,
+        silhouette_sample_size: Optional[int] = None,
+        random_state: int = 0,
+        block_size: int = 1024,
+        use_distance_cache: bool = False,
+        n_bootstrap: int = 0,
+        n_jobs: int = 1,
+    ) -> None:
+        """Inits a BatchEvaluator instance, which evaluates many clusterings of the same
+        features like Evaluator. The features, the image names, and the ground truth
+        are loaded once before the clusterings are evaluated by a pool of processes,
+        which inherit them.
+
+        :param do_internal: A boolean indicating whether the internal evaluation
+            metrics (silhouette and davies-bouldin) are computed.
+        :param do_external: A boolean indicating whether the external evaluation
+            metrics (precision, recall, f1) are computed.
+        :param features_path: A string indicating the path of the features file.
+        :param image_names_path: A string indicating the path of the file containing the
+            image_names for which the features were computed.
+        :param ground_truth_path: A string indicating the file containing the ground
+            truth.
+        :param silhouette_sample_size: An integer indicating the size of the stratified
+            sample on which the silhouette score is estimated, see Evaluator. Defaults
+            to None.
+        :param random_state: An integer indicating the seed of the sample and the
+            bootstrap resamples. Defaults to 0.
+        :param block_size: An integer indicating the number of rows per block for
+            computing the internal metrics. Defaults to 1024.
+        :param use_distance_cache: A boolean indicating whether the silhouette score is
+            computed from the shared distance cache, see Evaluator. Defaults to False.
+        :param n_bootstrap: An integer indicating the number of bootstrap resamples for
+            the confidence intervals of the pairwise scores, see Evaluator. Defaults to
+            0.
+        :param n_jobs: An integer indicating the number of processes evaluating the
+            clusterings. Defaults to 1.
+        """
+        self.do_internal: bool = do_internal
+        self.do_external: bool = do_external
+        self.features_path: str = features_path
+        self.image_names_path: str = image_names_path
+        self.ground_truth_path: str = ground_truth_path
+        self.silhouette_sample_size: Optional[int] = silhouette_sample_size
+        self.random_state: int = random_state
+        self.block_size: int = block_size
+        self.use_distance_cache: bool = use_distance_cache
+        self.n_bootstrap: int = n_bootstrap
+        self.n_jobs: int = n_jobs
+
+        self.cluster_labels_folder_paths: Optional[list[str]] = None
+        self.scores: Optional[list[dict[str, float]]] = None
+
+    def compute_metrics(
+        self, cluster_labels_folder_paths: list[str]
+    ) -> list[dict[str, float]]:
+        """Computes the scores of Evaluator for every clustering.
+
+        :param cluster_labels_folder_paths: A list of strings indicating the folders
+            containing the cluster labels.
+        :return: A list containing the dictionary of scores of every clustering in the
+            same order as the folders.
+        """
+        # The shared inputs are loaded and cached in this process before the pool is
+        # started, so that the worker processes inherit them instead of loading them.
+        # The distance cache is also built once here instead of by every worker.
+        _join_ground_truth(
+            resolve_image_names_path(self.image_names_path), self.ground_truth_path
+        )
+        if self.do_internal:
+            _open_features(self.features_path)
+            if self.use_distance_cache:
+                get_distance_cache(self.features_path, self.block_size).load()
+
+        if self.n_jobs > 1:
+            with ProcessPoolExecutor(max_workers=self.n_jobs) as executor:
+                scores: list[dict[str, float]] = list(
+                    executor.map(
+                        self._evaluate,
+                        cluster_labels_folder_paths,
+                        chunksize=max(
+                            1, len(cluster_labels_folder_paths) // (4 * self.n_jobs)
+                        ),
+                    )
+                )
+        else:
+            scores: list[dict[str, float]] = [
+                self._evaluate(folder_path)
+                for folder_path in cluster_labels_folder_paths
+            ]
+        self.cluster_labels_folder_paths = list(cluster_labels_folder_paths)
+        self.scores = scores
+
+        return self.scores
+
+    def save_metrics(self) -> None:
+        """Saves the scores of every clustering in JSON format to its folder, as
+        Evaluator.save_metrics does."""
+        if self.scores is None:
+            raise ValueError("Scores have not been computed.")
+
+        for folder_path, scores in zip(self.cluster_labels_folder_paths, self.scores):
+            with open(f"{folder_path}/metrics.json", mode="w") as f:
+                json.dump({k: str(v) for k, v in scores.items()}, f)
+
+    def save_results(
+        self, results_path: str, columns: Optional[list[str]] = None
+    ) -> pd.DataFrame:
+        """Saves the scores of all the clusterings as a table in CSV format, with one
+        row per clustering named after its folder.
+
+        :param results_path: A string indicating the path of the CSV file.
+        :param columns: A list of strings indicating the columns of the table after the
+            name column. If None, all the scores are included. Defaults to None.
+        :return: A pandas DataFrame containing the saved table.
+        """
+        if self.scores is None:
+            raise ValueError("Scores have not been computed.")
+
+        results_df: pd.DataFrame = pd.DataFrame(
+            self.scores,
+            index=pd.Index(
+                [
+                    os.path.basename(os.path.normpath(folder_path))
+                    for folder_path in self.cluster_labels_folder_paths
+                ],
+                name="name",
+            ),
+            columns=columns,
+        ).reset_index()
+        results_df.to_csv(results_path, index=False)
+
+        return results_df
+
+    def _evaluate(self, cluster_labels_folder_path: str) -> dict[str, float]:
+        evaluator: Evaluator = Evaluator(
+            do_internal=self.do_internal,
+            do_external=self.do_external,
+            features_path=self.features_path,
+            cluster_labels_folder_path=cluster_labels_folder_path,
+            image_names_path=self.image_names_path,
+            ground_truth_path=self.ground_truth_path,
+            silhouette_sample_size=self.silhouette_sample_size,
+            random_state=self.random_state,
+            block_size=self.block_size,
+            use_distance_cache=self.use_distance_cache,
+            n_bootstrap=self.n_bootstrap,
+        )
+        evaluator.compute_metrics()
+        return evaluator.scores
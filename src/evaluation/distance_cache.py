@@ -0,0 +1,183 @@
+import os
+from functools import lru_cache
+from typing import Iterator, Optional
+
+import numpy as np
+from scipy import sparse
+
+from src.util.feature_loading import iter_row_chunks
+
+
+class DistanceCache:
+    def __init__(
+        self, features_path: str, block_size: int = 1024, max_bytes: int = 2**34
+    ) -> None:
+        """Inits a DistanceCache instance, which holds the euclidean distances between
+        all the pairs of the features in the given file. The distances are computed
+        once in tiles of block_size x block_size and persisted in the distance_cache
+        folder next to the features, such that every clustering of the same features
+        is scored against them by only aggregating the distances per cluster.
+
+        :param features_path: A string indicating the .npy file containing the
+            features.
+        :param block_size: An integer indicating the number of rows per tile. Defaults
+            to 1024.
+        :param max_bytes: An integer indicating the largest size of the persisted
+            distances in bytes. The distances are stored as float32 if they fit, as
+            float16 otherwise, and not stored at all if neither fits. Defaults to 16
+            GiB.
+        """
+        self.features_path: str = features_path
+        self.block_size: int = block_size
+        self.max_bytes: int = max_bytes
+        self.distances: Optional[np.memmap] = None
+        self.distances_mtime: Optional[float] = None
+
+    @property
+    def cache_folder_path(self) -> str:
+        return f"{os.path.dirname(os.path.abspath(self.features_path))}/distance_cache"
+
+    def load(self) -> Optional[np.memmap]:
+        """Memory-maps the persisted distances, which are computed and persisted first
+        if they do not exist yet or are older than the features. The memory-mapped
+        distances are reused as long as they are still up to date.
+
+        :return: A 2-d numpy memmap of shape (n_samples, n_samples) containing the
+            distances, or None if the distances do not fit into max_bytes.
+        """
+        features: np.ndarray = np.load(self.features_path, mmap_mode="r")
+        cache_path: Optional[str] = self._find_cache(features.shape[0])
+        if (
+            self.distances is not None
+            and cache_path == self.distances.filename
+            and os.path.getmtime(cache_path) == self.distances_mtime
+        ):
+            return self.distances
+
+        self.distances = None
+        if cache_path is None:
+            dtype: Optional[np.dtype] = self._get_dtype(features)
+            if dtype is None:
+                return None
+            cache_path = f"{self.cache_folder_path}/distances_{dtype.name}.npy"
+            os.makedirs(self.cache_folder_path, exist_ok=True)
+            _write_distances(features, cache_path, dtype, self.block_size)
+
+        self.distances = np.load(cache_path, mmap_mode="r")
+        self.distances_mtime = os.path.getmtime(cache_path)
+        return self.distances
+
+    def iter_distance_sums(
+        self, rows: np.ndarray, columns: np.ndarray, column_clusters: np.ndarray
+    ) -> Iterator[tuple[int, np.ndarray]]:
+        """Sums the distances from the given rows to the given columns per cluster of
+        the columns, reading one tile of rows at a time. Only the sums of one tile are
+        held in memory at once, so they are meant to be reduced before the next tile
+        is read.
+
+        :param rows: A 1-d numpy array containing the indices of the rows among the
+            cached features.
+        :param columns: A 1-d numpy array containing the indices of the columns among
+            the cached features.
+        :param column_clusters: A 1-d numpy array containing the cluster index of every
+            column, from 0 to n_clusters - 1.
+        :return: An iterator of 2-tuples containing the position of the first row of
+            every tile among the given rows and a 2-d numpy array of shape
+            (n_tile_rows, n_clusters) containing the sums of the tile.
+        """
+        distances: Optional[np.memmap] = self.load()
+        if distances is None:
+            raise ValueError("The distances do not fit into the cache.")
+
+        membership: sparse.csr_matrix = sparse.csr_matrix(
+            (np.ones(len(columns)), (columns, column_clusters)),
+            shape=(distances.shape[0], int(column_clusters.max()) + 1),
+        )
+        for start in range(0, len(rows), self.block_size):
+            tile: np.ndarray = np.asarray(
+                distances[rows[start : start + self.block_size]], dtype=np.float64
+            )
+            yield start, (membership.T @ tile.T).T
+
+    def _find_cache(self, n_samples: int) -> Optional[str]:
+        # Finds persisted distances of the right shape that are newer than the
+        # features, preferring the more precise data type.
+        for dtype in [np.float32, np.float16]:
+            cache_path: str = (
+                f"{self.cache_folder_path}/distances_{np.dtype(dtype).name}.npy"
+            )
+            if (
+                os.path.exists(cache_path)
+                and os.path.getmtime(cache_path) >= os.path.getmtime(self.features_path)
+                and np.load(cache_path, mmap_mode="r").shape == (n_samples, n_samples)
+            ):
+                return cache_path
+        return None
+
+    def _get_dtype(self, features: np.ndarray) -> Optional[np.dtype]:
+        # float16 is only used if no distance can exceed its largest value, which is
+        # bounded by twice the largest norm of the features.
+        n_samples: int = features.shape[0]
+        max_norm: float = max(
+            float(np.linalg.norm(chunk.astype(np.float64), axis=1).max(initial=0))
+            for _, chunk in iter_row_chunks(features, self.block_size)
+        )
+        for dtype in [np.float32, np.float16]:
+            if n_samples**2 * np.dtype(dtype).itemsize <= self.max_bytes and (
+                2 * max_norm <= np.finfo(dtype).max
+            ):
+                return np.dtype(dtype)
+        return None
+
+
+@lru_cache(maxsize=4)
+def get_distance_cache(features_path: str, block_size: int = 1024) -> DistanceCache:
+    """Returns the distance cache of the features in the given file, such that the
+    cached distances are memory-mapped once per process.
+
+    :param features_path: A string indicating the .npy file containing the features.
+    :param block_size: An integer indicating the number of rows per tile. Defaults to
+        1024.
+    :return: A DistanceCache instance.
+    """
+    return DistanceCache(features_path, block_size=block_size)
+
+
+def _write_distances(
+    features: np.ndarray, cache_path: str, dtype: np.dtype, block_size: int
+) -> None:
+    # Computes every tile above the diagonal once and writes it on both sides of the
+    # diagonal. The file is written under a temporary name and replaced once complete,
+    # so that readers never see partially written distances.
+    n_samples: int = features.shape[0]
+    temporary_path: str = f"{cache_path}.tmp.npy"
+    try:
+        distances: np.memmap = np.lib.format.open_memmap(
+            temporary_path, mode="w+", dtype=dtype, shape=(n_samples, n_samples)
+        )
+        for start, chunk in iter_row_chunks(features, block_size):
+            chunk = chunk.astype(np.float64)
+            chunk_norms: np.ndarray = np.einsum("ij,ij->i", chunk, chunk)
+            stop: int = start + len(chunk)
+            for column_start, column_chunk in iter_row_chunks(
+                features[start:], block_size
+            ):
+                column_chunk = column_chunk.astype(np.float64)
+                column_start += start
+                column_stop: int = column_start + len(column_chunk)
+                tile: np.ndarray = (
+                    chunk_norms[:, None]
+                    - 2 * chunk @ column_chunk.T
+                    + np.einsum("ij,ij->i", column_chunk, column_chunk)[None, :]
+                )
+                np.sqrt(np.maximum(tile, 0, out=tile), out=tile)
+                if column_start == start:
+                    np.fill_diagonal(tile, 0)
+                distances[start:stop, column_start:column_stop] = tile
+                distances[column_start:column_stop, start:stop] = tile.T
+        distances.flush()
+        del distances
+        os.replace(temporary_path, cache_path)
+    finally:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
@@ -1,14 +1,16 @@
 import json
 import os
 import pickle
+from functools import lru_cache
 from pathlib import Path
 from typing import Optional
 
 import numpy as np
 import pandas as pd
-from sklearn.metrics import davies_bouldin_score, silhouette_score
 
 from src.evaluation import metrics
+from src.evaluation.distance_cache import DistanceCache, get_distance_cache
+from src.evaluation.internal_metrics import internal_scores
 
 
 class Evaluator:
@@ -20,6 +22,11 @@ class Evaluator:
         cluster_labels_folder_path: str,
         image_names_path: str,
         ground_truth_path: str,
+        silhouette_sample_size: Optional[int] = None,
+        random_state: int = 0,
+        block_size: int = 1024,
+        use_distance_cache: bool = False,
+        n_bootstrap: int = 0,
     ) -> None:
         """Inits an Evaluator instance.
 
@@ -34,6 +41,23 @@ class Evaluator:
             image_names for which the features were computed.
         :param ground_truth_path: A string indicating the file containing the ground
             truth.
+        :param silhouette_sample_size: An integer indicating the size of the stratified
+            sample on which the silhouette score and its confidence interval are
+            estimated. If None, the exact silhouette score is computed. Defaults to
+            None.
+        :param random_state: An integer indicating the seed of the sample and the
+            bootstrap resamples. Defaults to 0.
+        :param block_size: An integer indicating the number of rows per block for
+            computing the internal metrics, which bounds their memory usage. Defaults
+            to 1024.
+        :param use_distance_cache: A boolean indicating whether the silhouette score is
+            computed from the pairwise distances of the features that are persisted
+            next to them and shared by all the clusterings of the features, see
+            DistanceCache. If the distances do not fit into the cache, they are
+            computed from the features. Defaults to False.
+        :param n_bootstrap: An integer indicating the number of bootstrap resamples of
+            the test images for the confidence intervals of the pairwise precision,
+            recall, and f1 score. If 0, no intervals are computed. Defaults to 0.
         """
         self.do_internal: bool = do_internal
         self.do_external: bool = do_external
@@ -41,6 +65,11 @@ class Evaluator:
         self.cluster_labels_folder_path: str = cluster_labels_folder_path
         self.image_names_path: str = image_names_path
         self.ground_truth_path: str = ground_truth_path
+        self.silhouette_sample_size: Optional[int] = silhouette_sample_size
+        self.random_state: int = random_state
+        self.block_size: int = block_size
+        self.use_distance_cache: bool = use_distance_cache
+        self.n_bootstrap: int = n_bootstrap
         self.scores: dict[str, float] = {}
         self.image_count: Optional[int] = None
         self.features: Optional[np.ndarray] = None
@@ -64,28 +93,49 @@ class Evaluator:
         )
         self.scores["test_image_count"] = len(self.test_image_actual_labels)
 
-        (
-            features,
-            cluster_labels,
-        ) = self._remove_fuzzy_labels()
+        non_fuzzy_idx: np.ndarray = self.cluster_labels != -1
+        cluster_labels: np.ndarray = self.cluster_labels[non_fuzzy_idx]
         self.scores["cluster_count"] = len(np.unique(cluster_labels))
 
         if self.do_internal:
-            self.scores["silhouette"] = silhouette_score(features, cluster_labels)
-            self.scores["davies_bouldin"] = davies_bouldin_score(
-                features, cluster_labels
+            # The features are only needed for the internal metrics, so they are
+            # memory-mapped here and read one block at a time.
+            self.features = _open_features(self.features_path)
+            distance_cache: Optional[DistanceCache] = None
+            if self.use_distance_cache:
+                distance_cache = get_distance_cache(self.features_path, self.block_size)
+                if distance_cache.load() is None:
+                    distance_cache = None
+            self.scores.update(
+                internal_scores(
+                    self.features,
+                    cluster_labels,
+                    block_size=self.block_size,
+                    sample_size=self.silhouette_sample_size,
+                    random_state=self.random_state,
+                    distance_cache=distance_cache,
+                    feature_idx=np.flatnonzero(non_fuzzy_idx),
+                )
             )
+            self.scores["silhouette_sample_size"] = self.silhouette_sample_size
+            self.scores["silhouette_random_state"] = self.random_state
 
         if self.do_external:
-            self.scores["precision"] = metrics.pairwise_precision(
-                self.test_image_actual_labels, self.test_image_cluster_labels
-            )
-            self.scores["recall"] = metrics.pairwise_recall(
-                self.test_image_actual_labels, self.test_image_cluster_labels
-            )
-            self.scores["f1"] = metrics.pairwise_f1_from_precision_and_recall(
-                self.scores["precision"], self.scores["recall"]
+            self.scores.update(
+                metrics.pairwise_scores(
+                    self.test_image_actual_labels, self.test_image_cluster_labels
+                )
             )
+            if self.n_bootstrap > 0:
+                self.scores.update(
+                    metrics.pairwise_bootstrap_intervals(
+                        self.test_image_actual_labels,
+                        self.test_image_cluster_labels,
+                        n_resamples=self.n_bootstrap,
+                        random_state=self.random_state,
+                    )
+                )
+                self.scores["n_bootstrap"] = self.n_bootstrap
 
     def save_metrics(self) -> None:
         """Saves the scores in JSON format to the self.cluster_labels_folder_path
@@ -97,43 +147,92 @@ class Evaluator:
             json.dump({k: str(v) for k, v in self.scores.items()}, f)
 
     def _load_data(self) -> None:
-        self.features = np.load(self.features_path)
         self.cluster_labels = np.load(
             f"{self.cluster_labels_folder_path}/cluster_labels.npy"
         )
 
-        if os.path.exists(self.image_names_path):
-            with open(self.image_names_path, mode="rb") as f:
-                image_names = pickle.load(f)
-        else:
-            parent_path: str = Path(
-                self.image_names_path
-            ).parent.parent.parent.parent.absolute()
-            with open(f"{parent_path}/image_names.pickle", mode="rb") as f:
-                image_names = pickle.load(f)
-        self.image_count = len(image_names)
-
-        non_fuzzy_idx: np.ndarray = self.cluster_labels != -1
-        non_fuzzy_images: np.ndarray = np.array(image_names)[non_fuzzy_idx]
-        actual_labels_df: pd.DataFrame = pd.read_csv(
-            self.ground_truth_path, usecols=["image_name", "integer_label"]
+        self.image_count, test_image_idx, test_image_actual_labels = _join_ground_truth(
+            resolve_image_names_path(self.image_names_path), self.ground_truth_path
         )
-        image_idx: dict[str, int] = {v: i for i, v in enumerate(image_names)}
-        test_image_idx: list[int] = [
-            image_idx[name]
-            for name in actual_labels_df["image_name"]
-            if name in non_fuzzy_images
-        ]
-        self.test_image_cluster_labels: np.ndarray = self.cluster_labels[test_image_idx]
-        self.test_image_actual_labels: np.ndarray = actual_labels_df[
-            actual_labels_df["image_name"].isin(non_fuzzy_images)
-        ]["integer_label"].to_numpy()
 
-    def _remove_fuzzy_labels(
-        self,
-    ) -> tuple[np.ndarray, np.ndarray]:
-        non_fuzzy_idx: np.ndarray = self.cluster_labels != -1
-        return (
-            self.features[non_fuzzy_idx],
-            self.cluster_labels[non_fuzzy_idx],
-        )
+        is_non_fuzzy: np.ndarray = self.cluster_labels[test_image_idx] != -1
+        self.test_image_cluster_labels = self.cluster_labels[
+            test_image_idx[is_non_fuzzy]
+        ]
+        self.test_image_actual_labels = test_image_actual_labels[is_non_fuzzy]
+
+
+def resolve_image_names_path(image_names_path: str) -> str:
+    """Returns the given path of the image names if it exists, and the image names of
+    the features that the features in the given folder were derived from otherwise.
+
+    :param image_names_path: A string indicating the path of the file containing the
+        image names.
+    :return: A string indicating the path of the existing file containing the image
+        names.
+    """
+    if os.path.exists(image_names_path):
+        return image_names_path
+    parent_path: str = Path(image_names_path).parent.parent.parent.parent.absolute()
+    return f"{parent_path}/image_names.pickle"
+
+
+def _open_features(features_path: str) -> np.memmap:
+    # Memory-maps the features once per process for evaluating many clusterings of the
+    # same features, and again once the file is rewritten.
+    return _open_features_version(features_path, _get_file_version(features_path))
+
+
+@lru_cache(maxsize=8)
+def _open_features_version(features_path: str, _: tuple[int, int]) -> np.memmap:
+    return np.load(features_path, mmap_mode="r")
+
+
+def _join_ground_truth(
+    image_names_path: str, ground_truth_path: str
+) -> tuple[int, np.ndarray, np.ndarray]:
+    # The join is cached per version of the files, so that it is redone once either
+    # file is rewritten.
+    return _join_ground_truth_version(
+        image_names_path,
+        _get_file_version(image_names_path),
+        ground_truth_path,
+        _get_file_version(ground_truth_path),
+    )
+
+
+def _get_file_version(file_path: str) -> tuple[int, int]:
+    # Identifies the contents of a file by its modification time and size.
+    stat_result: os.stat_result = os.stat(file_path)
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+
+@lru_cache(maxsize=8)
+def _join_ground_truth_version(
+    image_names_path: str,
+    _: tuple[int, int],
+    ground_truth_path: str,
+    __: tuple[int, int],
+) -> tuple[int, np.ndarray, np.ndarray]:
+    # Finds the index of the image of every ground truth row through a name to index
+    # map, keeping the rows in the order of the ground truth file. Rows of images
+    # without features are dropped. The join does not depend on the cluster labels, so
+    # it is cached for evaluating many clusterings of the same features.
+    with open(image_names_path, mode="rb") as f:
+        image_names = pickle.load(f)
+    image_idx: dict[str, int] = {v: i for i, v in enumerate(image_names)}
+    actual_labels_df: pd.DataFrame = pd.read_csv(
+        ground_truth_path, usecols=["image_name", "integer_label"]
+    )
+    test_image_idx: pd.Series = actual_labels_df["image_name"].map(image_idx)
+    has_image: np.ndarray = test_image_idx.notna().to_numpy()
+
+    test_image_idx_array: np.ndarray = test_image_idx[has_image].to_numpy(
+        dtype=np.int64
+    )
+    test_image_actual_labels: np.ndarray = actual_labels_df["integer_label"].to_numpy()[
+        has_image
+    ]
+    test_image_idx_array.flags.writeable = False
+    test_image_actual_labels.flags.writeable = False
+    return len(image_names), test_image_idx_array, test_image_actual_labels
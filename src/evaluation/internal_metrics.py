@@ -0,0 +1,324 @@
+from typing import Iterator, Optional
+
+import numpy as np
+from scipy.stats import norm
+
+from src.evaluation.distance_cache import DistanceCache
+from src.util.feature_loading import iter_row_chunks
+
+
+def internal_scores(
+    features: np.ndarray,
+    cluster_labels: np.ndarray,
+    block_size: int = 1024,
+    sample_size: Optional[int] = None,
+    random_state: int = 0,
+    confidence: float = 0.95,
+    distance_cache: Optional[DistanceCache] = None,
+    feature_idx: Optional[np.ndarray] = None,
+) -> dict[str, float]:
+    """Computes the silhouette score and the davies-bouldin score with euclidean
+    distances in passes over blocks of rows, such that only the distances between two
+    blocks of rows and from one block of rows to every cluster are held in memory at
+    once. The silhouette score is
+    either exact or estimated from a stratified sample of the samples, whose
+    silhouette coefficients are still computed exactly against all the samples.
+
+    :param features: A 2-d (memory-mapped) numpy array of shape (n_features_rows,
+        n_features) containing the features of the samples, see feature_idx.
+    :param cluster_labels: A 1-d numpy array containing the cluster label of every
+        sample, with at least two distinct labels.
+    :param block_size: An integer indicating the number of rows per block. Defaults to
+        1024.
+    :param sample_size: An integer indicating the number of samples whose silhouette
+        coefficients are computed, drawn from every cluster in proportion to its size.
+        The clusters whose share is below two samples are sampled together as one
+        pool. If None, all the samples are used. Defaults to None.
+    :param random_state: An integer indicating the seed of the sample. Defaults to 0.
+    :param confidence: A float indicating the confidence level of the interval of the
+        sampled silhouette score. Defaults to 0.95.
+    :param distance_cache: A DistanceCache instance of the given features. If given,
+        the silhouette score is computed from the cached distances instead of the
+        features. Defaults to None.
+    :param feature_idx: A 1-d numpy array containing the row of every sample among the
+        given features, so that the rows of the samples are read block by block
+        instead of being copied first. If None, the samples are all the rows of the
+        features. Defaults to None.
+    :return: A dictionary containing the "silhouette" and "davies_bouldin" scores. For
+        a sample, it also contains the bounds "silhouette_ci_low" and
+        "silhouette_ci_high" of the confidence interval.
+    """
+    _, cluster_indices, cluster_sizes = np.unique(
+        cluster_labels, return_inverse=True, return_counts=True
+    )
+    cluster_indices = cluster_indices.ravel()
+    n_samples: int = len(cluster_indices)
+    n_clusters: int = len(cluster_sizes)
+    if n_clusters < 2 or n_clusters >= n_samples:
+        raise ValueError("The number of clusters must be between 2 and n_samples - 1.")
+
+    if feature_idx is None:
+        feature_idx = np.arange(n_samples)
+
+    # The first pass finds the centroids, which the davies-bouldin score needs.
+    centroids: np.ndarray = np.zeros((n_clusters, features.shape[1]))
+    for start, chunk in _iter_rows(features, feature_idx, block_size):
+        np.add.at(centroids, cluster_indices[start : start + len(chunk)], chunk)
+    centroids /= cluster_sizes[:, None]
+
+    # The sample is stratified by the clusters, except that the clusters too small
+    # for two sampled samples are pooled into one stratum.
+    cluster_strata: np.ndarray = np.arange(n_clusters)
+    if sample_size is None or sample_size >= n_samples:
+        rows: np.ndarray = np.arange(n_samples)
+    else:
+        cluster_strata = _get_strata(cluster_sizes, sample_size)
+        rows: np.ndarray = _stratified_sample(
+            cluster_strata[cluster_indices], sample_size, random_state
+        )
+
+    # The second pass sums the distances from every sample to its centroid.
+    centroid_distances: np.ndarray = np.zeros(n_clusters)
+    for start, chunk in _iter_rows(features, feature_idx, block_size):
+        chunk_indices: np.ndarray = cluster_indices[start : start + len(chunk)]
+        centroid_distances += np.bincount(
+            chunk_indices,
+            weights=np.linalg.norm(chunk - centroids[chunk_indices], axis=1),
+            minlength=n_clusters,
+        )
+
+    # The silhouette coefficients are computed one block of rows at a time, so that
+    # only the distances from a block of rows to every cluster are held in memory.
+    # The distances are either aggregated from the cached distances or computed from
+    # the features.
+    sample_order: np.ndarray = np.argsort(cluster_indices, kind="stable")
+    cluster_starts: np.ndarray = np.concatenate([[0], np.cumsum(cluster_sizes)])
+    distance_sums: Iterator[tuple[int, np.ndarray]]
+    if distance_cache is not None:
+        distance_sums = distance_cache.iter_distance_sums(
+            feature_idx[rows], feature_idx, cluster_indices
+        )
+    else:
+        distance_sums = _iter_distance_sums(
+            features,
+            feature_idx[rows],
+            feature_idx[sample_order],
+            cluster_starts,
+            block_size,
+        )
+    coefficients: np.ndarray = np.empty(len(rows))
+    for row_start, block_distance_sums in distance_sums:
+        block_clusters: np.ndarray = cluster_indices[
+            rows[row_start : row_start + len(block_distance_sums)]
+        ]
+        coefficients[
+            row_start : row_start + len(block_clusters)
+        ] = _silhouette_coefficients(block_distance_sums, block_clusters, cluster_sizes)
+
+    scores: dict[str, float] = _silhouette_scores(
+        coefficients,
+        cluster_strata[cluster_indices[rows]],
+        np.bincount(cluster_strata[cluster_indices]),
+        None if len(rows) == n_samples else confidence,
+    )
+    scores["davies_bouldin"] = _davies_bouldin_score(
+        centroids, centroid_distances / cluster_sizes, block_size
+    )
+    return scores
+
+
+def _iter_rows(
+    features: np.ndarray, feature_idx: np.ndarray, block_size: int
+) -> Iterator[tuple[int, np.ndarray]]:
+    # Reads the given rows of the features one block at a time, as slices if they are
+    # all the rows.
+    if np.array_equal(feature_idx, np.arange(features.shape[0])):
+        yield from iter_row_chunks(features, block_size)
+        return
+    for start in range(0, len(feature_idx), block_size):
+        yield start, np.asarray(features[feature_idx[start : start + block_size]])
+
+
+def _iter_distance_sums(
+    features: np.ndarray,
+    rows: np.ndarray,
+    sample_order: np.ndarray,
+    cluster_starts: np.ndarray,
+    block_size: int,
+) -> Iterator[tuple[int, np.ndarray]]:
+    # Yields the sums of the distances from every block of rows to every cluster,
+    # holding only the distances between a block of rows and a block of samples in
+    # memory at once. The samples
+    # are visited in the order of their clusters, so that every block of samples only
+    # adds to the sums of a contiguous range of clusters.
+    for row_start in range(0, len(rows), block_size):
+        yield row_start, _distance_sums(
+            features,
+            rows[row_start : row_start + block_size],
+            sample_order,
+            cluster_starts,
+            block_size,
+        )
+
+
+def _distance_sums(
+    features: np.ndarray,
+    rows: np.ndarray,
+    sample_order: np.ndarray,
+    cluster_starts: np.ndarray,
+    block_size: int,
+) -> np.ndarray:
+    n_samples: int = len(sample_order)
+    distance_sums: np.ndarray = np.zeros((len(rows), len(cluster_starts) - 1))
+    row_features: np.ndarray = np.asarray(features[rows], dtype=np.float64)
+    row_norms: np.ndarray = np.einsum("ij,ij->i", row_features, row_features)
+    for start in range(0, n_samples, block_size):
+        stop: int = min(start + block_size, n_samples)
+        chunk: np.ndarray = np.asarray(
+            features[sample_order[start:stop]], dtype=np.float64
+        )
+        distances: np.ndarray = (
+            row_norms[:, None]
+            - 2 * row_features @ chunk.T
+            + np.einsum("ij,ij->i", chunk, chunk)[None, :]
+        )
+        np.sqrt(np.maximum(distances, 0, out=distances), out=distances)
+        first: int = int(np.searchsorted(cluster_starts, start, side="right")) - 1
+        last: int = int(np.searchsorted(cluster_starts, stop, side="left"))
+        distance_sums[:, first:last] += np.add.reduceat(
+            distances, np.maximum(cluster_starts[first:last], start) - start, axis=1
+        )
+    return distance_sums
+
+
+def _get_strata(cluster_sizes: np.ndarray, sample_size: int) -> np.ndarray:
+    # Every cluster whose proportional share of the sample is at least two samples is
+    # its own stratum, and the other clusters are pooled into the last stratum. While
+    # the share of the pool is below two samples, the smallest separate cluster joins
+    # it, so that the variance of every stratum can be estimated.
+    shares: np.ndarray = sample_size * cluster_sizes / cluster_sizes.sum()
+    order: np.ndarray = np.argsort(-cluster_sizes, kind="stable")
+    n_separate: int = int(np.count_nonzero(shares >= 2))
+    while n_separate > 0 and 0 < shares[order[n_separate:]].sum() < 2:
+        n_separate -= 1
+    cluster_strata: np.ndarray = np.full(len(cluster_sizes), n_separate)
+    cluster_strata[order[:n_separate]] = np.arange(n_separate)
+    return cluster_strata
+
+
+def _stratified_sample(
+    stratum_indices: np.ndarray, sample_size: int, random_state: int
+) -> np.ndarray:
+    # Draws exactly sample_size samples without replacement, allocated to the strata
+    # in proportion to their sizes by the largest remainders.
+    rng: np.random.Generator = np.random.default_rng(random_state)
+    stratum_sizes: np.ndarray = np.bincount(stratum_indices)
+    shares: np.ndarray = sample_size * stratum_sizes / stratum_sizes.sum()
+    stratum_sample_sizes: np.ndarray = np.floor(shares).astype(np.int64)
+    remainders: np.ndarray = shares - stratum_sample_sizes
+    stratum_sample_sizes[
+        np.argsort(-remainders, kind="stable")[
+            : sample_size - stratum_sample_sizes.sum()
+        ]
+    ] += 1
+    # Shuffling and ranking the samples within their strata keeps the first
+    # stratum_sample_sizes samples of every stratum.
+    permutation: np.ndarray = rng.permutation(len(stratum_indices))
+    order: np.ndarray = permutation[
+        np.argsort(stratum_indices[permutation], kind="stable")
+    ]
+    ranks: np.ndarray = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.arange(len(order)) - np.repeat(
+        np.cumsum(stratum_sizes) - stratum_sizes, stratum_sizes
+    )
+    return np.flatnonzero(ranks < stratum_sample_sizes[stratum_indices])
+
+
+def _silhouette_coefficients(
+    distance_sums: np.ndarray, row_clusters: np.ndarray, cluster_sizes: np.ndarray
+) -> np.ndarray:
+    # The silhouette coefficient of a sample in a singleton cluster is 0, as in
+    # sklearn.metrics.silhouette_score.
+    n_rows: int = len(row_clusters)
+    row_sizes: np.ndarray = cluster_sizes[row_clusters]
+    intra_distances: np.ndarray = distance_sums[
+        np.arange(n_rows), row_clusters
+    ] / np.maximum(row_sizes - 1, 1)
+    mean_distances: np.ndarray = distance_sums / cluster_sizes[None, :]
+    mean_distances[np.arange(n_rows), row_clusters] = np.inf
+    inter_distances: np.ndarray = mean_distances.min(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        coefficients: np.ndarray = (inter_distances - intra_distances) / np.maximum(
+            intra_distances, inter_distances
+        )
+    return np.where(row_sizes > 1, np.nan_to_num(coefficients), 0)
+
+
+def _silhouette_scores(
+    coefficients: np.ndarray,
+    row_strata: np.ndarray,
+    stratum_sizes: np.ndarray,
+    confidence: Optional[float],
+) -> dict[str, float]:
+    if confidence is None:
+        return {"silhouette": float(coefficients.mean())}
+
+    # Stratified estimate of the mean with a finite population correction. Every
+    # stratum has at least two sampled samples, see _get_strata.
+    n_samples: int = int(stratum_sizes.sum())
+    n_strata: int = len(stratum_sizes)
+    sample_sizes: np.ndarray = np.bincount(row_strata, minlength=n_strata)
+    sample_means: np.ndarray = (
+        np.bincount(row_strata, weights=coefficients, minlength=n_strata) / sample_sizes
+    )
+    squared_deviations: np.ndarray = (coefficients - sample_means[row_strata]) ** 2
+    sample_variances: np.ndarray = np.bincount(
+        row_strata, weights=squared_deviations, minlength=n_strata
+    ) / np.maximum(sample_sizes - 1, 1)
+    weights: np.ndarray = stratum_sizes / n_samples
+    silhouette: float = float(np.sum(weights * sample_means))
+    standard_error: float = float(
+        np.sqrt(
+            np.sum(
+                weights**2
+                * sample_variances
+                / sample_sizes
+                * (1 - sample_sizes / stratum_sizes)
+            )
+        )
+    )
+    z: float = float(norm.ppf((1 + confidence) / 2))
+    return {
+        "silhouette": silhouette,
+        "silhouette_ci_low": silhouette - z * standard_error,
+        "silhouette_ci_high": silhouette + z * standard_error,
+    }
+
+
+def _davies_bouldin_score(
+    centroids: np.ndarray, intra_distances: np.ndarray, block_size: int
+) -> float:
+    # Finds the largest ratio of every cluster to the other clusters one block of
+    # clusters at a time. Coinciding centroids are skipped as in
+    # sklearn.metrics.davies_bouldin_score.
+    n_clusters: int = len(centroids)
+    centroid_norms: np.ndarray = np.einsum("ij,ij->i", centroids, centroids)
+    max_ratios: np.ndarray = np.zeros(n_clusters)
+    for start in range(0, n_clusters, block_size):
+        stop: int = min(start + block_size, n_clusters)
+        separations: np.ndarray = np.sqrt(
+            np.maximum(
+                centroid_norms[start:stop, None]
+                - 2 * centroids[start:stop] @ centroids.T
+                + centroid_norms[None, :],
+                0,
+            )
+        )
+        separations[np.arange(stop - start), np.arange(start, stop)] = 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            ratios: np.ndarray = (
+                intra_distances[start:stop, None] + intra_distances[None, :]
+            ) / separations
+        ratios[~np.isfinite(ratios)] = 0
+        max_ratios[start:stop] = ratios.max(axis=1)
+    return float(max_ratios.mean())
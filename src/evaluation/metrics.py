@@ -1,17 +1,9 @@
-from collections import defaultdict
-from math import comb
-
 import numpy as np
+from scipy import sparse
 
 
 def pairwise_f1(actual_labels: np.ndarray, cluster_labels: np.ndarray) -> float:
-    tp: int = _true_positive(actual_labels, cluster_labels)
-    fp: int = _false_positive(actual_labels, cluster_labels)
-    fn: int = _false_negative(actual_labels, cluster_labels)
-
-    precision: float = tp / (tp + fp)
-    recall: float = tp / (tp + fn)
-    return pairwise_f1_from_precision_and_recall(precision, recall)
+    return pairwise_scores(actual_labels, cluster_labels)["f1"]
 
 
 def pairwise_f1_from_precision_and_recall(precision: float, recall: float) -> float:
@@ -22,68 +14,250 @@ def pairwise_f1_from_precision_and_recall(precision: float, recall: float) -> fl
 
 
 def pairwise_precision(actual_labels: np.ndarray, cluster_labels: np.ndarray) -> float:
-    tp: int = _true_positive(actual_labels, cluster_labels)
-    fp: int = _false_positive(actual_labels, cluster_labels)
-    if tp + fp == 0:
-        return 0
-    else:
-        return tp / (tp + fp)
+    return pairwise_scores(actual_labels, cluster_labels)["precision"]
 
 
 def pairwise_recall(actual_labels: np.ndarray, cluster_labels: np.ndarray) -> float:
-    tp: int = _true_positive(actual_labels, cluster_labels)
-    fn: int = _false_negative(actual_labels, cluster_labels)
-    if tp + fn == 0:
-        return 0
-    else:
-        return tp / (tp + fn)
+    return pairwise_scores(actual_labels, cluster_labels)["recall"]
 
 
-def _true_positive(actual_labels: np.ndarray, cluster_labels: np.ndarray) -> int:
-    n_clusters: int = len(np.unique(cluster_labels))
-    tp: int = 0
-    for i in range(n_clusters):
-        actual_cluster_labels: np.ndarray = actual_labels[cluster_labels == i]
-        _, counts = np.unique(actual_cluster_labels, return_counts=True)
-        for c in counts:
-            tp += comb(c, 2)
+def pairwise_scores(
+    actual_labels: np.ndarray,
+    cluster_labels: np.ndarray,
+    include_ari_and_nmi: bool = False,
+) -> dict[str, float]:
+    """Computes the pairwise precision, recall, and f1 score from a single contingency
+    table of the labels, and optionally the adjusted rand index and the normalized
+    mutual information from the same table.
 
-    return tp
+    :param actual_labels: A 1-d numpy array containing the actual label of every
+        sample.
+    :param cluster_labels: A 1-d numpy array containing the cluster label of every
+        sample.
+    :param include_ari_and_nmi: A boolean indicating whether the adjusted rand index
+        and the normalized mutual information with the arithmetic mean of the entropies
+        are computed as well. Defaults to False.
+    :return: A dictionary mapping "precision", "recall", "f1", and optionally
+        "adjusted_rand" and "nmi" to the scores.
+    """
+    table: sparse.csr_matrix = contingency_table(actual_labels, cluster_labels)
+    tp, fp, fn = _pairwise_counts(table)
+    precision: float = 0 if tp + fp == 0 else tp / (tp + fp)
+    recall: float = 0 if tp + fn == 0 else tp / (tp + fn)
+    scores: dict[str, float] = {
+        "precision": precision,
+        "recall": recall,
+        "f1": pairwise_f1_from_precision_and_recall(precision, recall),
+    }
+    if include_ari_and_nmi:
+        scores["adjusted_rand"] = _adjusted_rand_index(table)
+        scores["nmi"] = _normalized_mutual_information(table)
 
+    return scores
+
+
+def pairwise_bootstrap_intervals(
+    actual_labels: np.ndarray,
+    cluster_labels: np.ndarray,
+    n_resamples: int = 1000,
+    confidence: float = 0.95,
+    random_state: int = 0,
+    max_batch_entries: int = 2**22,
+) -> dict[str, float]:
+    """Computes percentile bootstrap confidence intervals of the pairwise precision,
+    recall, and f1 score over the samples. The resamples are drawn in batches as the
+    number of times every sample is drawn, and the scores of all the resamples of a
+    batch are computed from weighted contingency tables with array operations. Only
+    the pairs of distinct samples are counted, since the copies of a sample drawn more
+    than once would otherwise form true positive pairs and bias the scores upwards.
+
+    :param actual_labels: A 1-d numpy array containing the actual label of every
+        sample.
+    :param cluster_labels: A 1-d numpy array containing the cluster label of every
+        sample.
+    :param n_resamples: An integer indicating the number of resamples. Defaults to
+        1000.
+    :param confidence: A float indicating the confidence level of the intervals.
+        Defaults to 0.95.
+    :param random_state: An integer indicating the seed of the resamples. Defaults to
+        0.
+    :param max_batch_entries: An integer indicating the largest number of resampled
+        sample counts held in memory at once, which bounds the memory usage. Defaults
+        to 2**22.
+    :return: A dictionary mapping "precision_ci_low", "precision_ci_high",
+        "recall_ci_low", "recall_ci_high", "f1_ci_low", and "f1_ci_high" to the bounds
+        of the intervals.
+    """
+    n_samples: int = len(actual_labels)
+    if n_samples == 0:
+        raise ValueError("The bootstrap requires at least one sample.")
+
+    # Indicator matrices summing the samples into the cells of the contingency table,
+    # and the cells into the actual labels and the clusters.
+    _, actual_indices = np.unique(actual_labels, return_inverse=True)
+    _, cluster_indices = np.unique(cluster_labels, return_inverse=True)
+    n_clusters: int = int(cluster_indices.max()) + 1
+    cells, sample_cells = np.unique(
+        actual_indices.ravel().astype(np.int64) * n_clusters + cluster_indices.ravel(),
+        return_inverse=True,
+    )
+    n_cells: int = len(cells)
+    cell_indicator: sparse.csr_matrix = sparse.csr_matrix(
+        (np.ones(n_samples), (np.arange(n_samples), sample_cells.ravel())),
+        shape=(n_samples, n_cells),
+    )
+    actual_indicator: sparse.csr_matrix = sparse.csr_matrix(
+        (np.ones(n_cells), (np.arange(n_cells), cells // n_clusters)),
+        shape=(n_cells, int(actual_indices.max()) + 1),
+    )
+    cluster_indicator: sparse.csr_matrix = sparse.csr_matrix(
+        (np.ones(n_cells), (np.arange(n_cells), cells % n_clusters)),
+        shape=(n_cells, n_clusters),
+    )
+
+    rng: np.random.Generator = np.random.default_rng(random_state)
+    batch_size: int = max(1, max_batch_entries // n_samples)
+    scores: dict[str, list[np.ndarray]] = {"precision": [], "recall": [], "f1": []}
+    for start in range(0, n_resamples, batch_size):
+        size: int = min(batch_size, n_resamples - start)
+        draws: np.ndarray = rng.integers(n_samples, size=(size, n_samples))
+        sample_counts: np.ndarray = np.bincount(
+            (draws + n_samples * np.arange(size)[:, None]).ravel(),
+            minlength=size * n_samples,
+        ).reshape(size, n_samples)
+        # The weighted sizes and the sums of the squared weights of every cell.
+        cell_sums: np.ndarray = (cell_indicator.T @ sample_counts.T).T
+        cell_squares: np.ndarray = (cell_indicator.T @ (sample_counts**2).T).T
+        tp: np.ndarray = _count_distinct_pairs(cell_sums, cell_squares)
+        tp_fp: np.ndarray = _count_distinct_pairs(
+            (cluster_indicator.T @ cell_sums.T).T,
+            (cluster_indicator.T @ cell_squares.T).T,
+        )
+        tp_fn: np.ndarray = _count_distinct_pairs(
+            (actual_indicator.T @ cell_sums.T).T,
+            (actual_indicator.T @ cell_squares.T).T,
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            precision: np.ndarray = np.where(tp_fp == 0, 0, tp / tp_fp)
+            recall: np.ndarray = np.where(tp_fn == 0, 0, tp / tp_fn)
+            f1: np.ndarray = np.where(
+                precision + recall == 0,
+                0,
+                2 * precision * recall / (precision + recall),
+            )
+        scores["precision"].append(precision)
+        scores["recall"].append(recall)
+        scores["f1"].append(f1)
+
+    intervals: dict[str, float] = {}
+    for name, batches in scores.items():
+        low, high = np.quantile(
+            np.concatenate(batches), [(1 - confidence) / 2, (1 + confidence) / 2]
+        )
+        intervals[f"{name}_ci_low"] = float(low)
+        intervals[f"{name}_ci_high"] = float(high)
+    return intervals
+
+
+def contingency_table(
+    actual_labels: np.ndarray, cluster_labels: np.ndarray
+) -> sparse.csr_matrix:
+    """Counts the samples of every pair of an actual label and a cluster label. Only
+    the pairs that occur are stored, so the labels need not be contiguous.
+
+    :param actual_labels: A 1-d numpy array containing the actual label of every
+        sample.
+    :param cluster_labels: A 1-d numpy array containing the cluster label of every
+        sample.
+    :return: A sparse matrix of shape (n_actual_labels, n_cluster_labels) containing
+        the number of samples of every pair, with the labels in ascending order.
+    """
+    _, actual_indices = np.unique(actual_labels, return_inverse=True)
+    _, cluster_indices = np.unique(cluster_labels, return_inverse=True)
+    table: sparse.csr_matrix = sparse.csr_matrix(
+        (
+            np.ones(len(actual_indices), dtype=np.int64),
+            (actual_indices.ravel(), cluster_indices.ravel()),
+        ),
+        shape=(actual_indices.max(initial=-1) + 1, cluster_indices.max(initial=-1) + 1),
+    )
+    table.sum_duplicates()
+    return table
 
-def _false_positive(actual_labels: np.ndarray, cluster_labels: np.ndarray) -> int:
-    n_clusters: int = len(np.unique(cluster_labels))
-    fp: int = 0
-    for i in range(n_clusters):
-        actual_cluster_labels: np.ndarray = actual_labels[cluster_labels == i]
-        _, counts = np.unique(actual_cluster_labels, return_counts=True)
-        for j, c in enumerate(counts):
-            for k in range(j + 1, len(counts)):
-                fp += c * counts[k]
 
-    return fp
+def _pairwise_counts(table: sparse.csr_matrix) -> tuple[int, int, int]:
+    # Pairs of samples with the same actual and cluster label are true positives, the
+    # other pairs in the same cluster false positives, and the other pairs with the
+    # same actual label false negatives.
+    tp: int = _count_pairs(table.data)
+    fp: int = _count_pairs(np.asarray(table.sum(axis=0)).ravel()) - tp
+    fn: int = _count_pairs(np.asarray(table.sum(axis=1)).ravel()) - tp
+    return tp, fp, fn
+
+
+def _count_pairs(counts: np.ndarray) -> int:
+    counts = counts.astype(np.int64)
+    return int(np.sum(counts * (counts - 1) // 2))
+
+
+def _count_distinct_pairs(sums: np.ndarray, squares: np.ndarray) -> np.ndarray:
+    # Counts the weighted pairs of distinct samples of every group of every resample,
+    # which is the sum of w_i * w_j over the pairs i < j of a group.
+    return np.sum((sums.astype(np.float64) ** 2 - squares) / 2, axis=1)
+
+
+def _adjusted_rand_index(table: sparse.csr_matrix) -> float:
+    n_samples: int = int(table.sum())
+    index: int = _count_pairs(table.data)
+    actual_pairs: int = _count_pairs(np.asarray(table.sum(axis=1)).ravel())
+    cluster_pairs: int = _count_pairs(np.asarray(table.sum(axis=0)).ravel())
+    expected_index: float = (
+        actual_pairs * cluster_pairs / max(_count_pairs(np.array([n_samples])), 1)
+    )
+    max_index: float = (actual_pairs + cluster_pairs) / 2
+    if max_index == expected_index:
+        return 1.0
+    return (index - expected_index) / (max_index - expected_index)
+
+
+def _normalized_mutual_information(table: sparse.csr_matrix) -> float:
+    n_samples: int = int(table.sum())
+    actual_counts: np.ndarray = np.asarray(table.sum(axis=1)).ravel()
+    cluster_counts: np.ndarray = np.asarray(table.sum(axis=0)).ravel()
+    if len(actual_counts) == len(cluster_counts) == 1:
+        return 1.0
+
+    coo_table: sparse.coo_matrix = table.tocoo()
+    cell_counts: np.ndarray = coo_table.data.astype(np.float64)
+    mutual_information: float = float(
+        np.sum(
+            cell_counts
+            / n_samples
+            * np.log(
+                n_samples
+                * cell_counts
+                / (actual_counts[coo_table.row] * cluster_counts[coo_table.col])
+            )
+        )
+    )
+    mean_entropy: float = (_entropy(actual_counts) + _entropy(cluster_counts)) / 2
+    if mean_entropy == 0:
+        return 1.0
+    return mutual_information / mean_entropy
+
+
+def _entropy(counts: np.ndarray) -> float:
+    probabilities: np.ndarray = counts[counts > 0] / counts.sum()
+    return float(-np.sum(probabilities * np.log(probabilities)))
+
+
+def _true_positive(actual_labels: np.ndarray, cluster_labels: np.ndarray) -> int:
+    return _pairwise_counts(contingency_table(actual_labels, cluster_labels))[0]
+
+
+def _false_positive(actual_labels: np.ndarray, cluster_labels: np.ndarray) -> int:
+    return _pairwise_counts(contingency_table(actual_labels, cluster_labels))[1]
 
 
 def _false_negative(actual_labels: np.ndarray, cluster_labels: np.ndarray) -> int:
-    n_clusters: int = len(np.unique(cluster_labels))
-    cluster_dist_list: list[dict[int, int]] = []
-    for i in range(n_clusters):
-        actual_cluster_labels: np.ndarray = actual_labels[cluster_labels == i]
-        unique, counts = np.unique(actual_cluster_labels, return_counts=True)
-        cluster_dist: dict[int, int] = {
-            u: c for u, c in zip(list(unique), list(counts))
-        }
-        cluster_dist_list.append(cluster_dist)
-
-    occurrence_counts: dict[int, list[int]] = defaultdict(list)
-    for cd in cluster_dist_list:
-        for k, v in cd.items():
-            occurrence_counts[k].append(v)
-
-    fn: int = 0
-    for count_list in occurrence_counts.values():
-        for i, c in enumerate(count_list):
-            for j in range(i + 1, len(count_list)):
-                fn += c * count_list[j]
-
-    return fn
+    return _pairwise_counts(contingency_table(actual_labels, cluster_labels))[2]
@@ -1,24 +1,114 @@
 import json
 import os
 import pickle
+from concurrent.futures import ThreadPoolExecutor
+from itertools import combinations
 from pathlib import Path
 from typing import Any
 
 import numpy as np
 
+from src.features.virtual_combination import (
+    VirtualCombinedFeatures,
+    save_virtual_combination,
+)
+from src.util.feature_loading import load_features
+
 
 def combine_and_save(
-    feature_folder_paths: dict[str, str], save_folder_path: str
+    feature_folder_paths: dict[str, str], save_folder_path: str, virtual: bool = False
 ) -> None:
-    if not os.path.exists(save_folder_path):
-        os.makedirs(save_folder_path)
+    """Combines the features found in the given folders and saves the combined feature
+    to the folder with the given path.
+
+    :param feature_folder_paths: A dictionary mapping the name of each feature to the
+        folder containing it.
+    :param save_folder_path: A string indicating the folder to save the files to.
+    :param virtual: A boolean indicating whether the combined features are saved as a
+        virtual combination, which only stores the paths of the source features and
+        the rows of each source that make up the combined feature, instead of a
+        features.npy file. Defaults to False.
+    """
+    feature_files: dict[str, dict[str, Any]] = {}
+    for feature_name, feature_folder_path in feature_folder_paths.items():
+        feature_files[feature_name] = _load_feature(feature_folder_path)
+
+    alignment_index: dict[str, Any] = _build_alignment_index(feature_files)
+    _save_combination(feature_files, alignment_index, save_folder_path, virtual)
 
+
+def combine_all(
+    feature_folder_paths: dict[str, str],
+    r_values: list[int],
+    save_folder_path: str,
+    virtual: bool = False,
+    n_jobs: int = 1,
+) -> None:
+    """Combines every r-subset of the features found in the given folders for each of
+    the given r values. Each feature is loaded only once, and a single alignment index
+    over the image names of all the features is shared by the subsets. The subset
+    (f_1, ..., f_r) is saved to the folder save_folder_path/r/run_f_1_..._f_r.
+
+    :param feature_folder_paths: A dictionary mapping the name of each feature to the
+        folder containing it.
+    :param r_values: A list of integers containing the subset sizes to combine.
+    :param save_folder_path: A string indicating the folder to save the combinations
+        to.
+    :param virtual: A boolean indicating whether the combinations are saved as virtual
+        combinations. Defaults to False.
+    :param n_jobs: An integer indicating the number of threads to save the
+        combinations with. Defaults to 1.
+    """
     feature_files: dict[str, dict[str, Any]] = {}
     for feature_name, feature_folder_path in feature_folder_paths.items():
         feature_files[feature_name] = _load_feature(feature_folder_path)
 
-    combined_features: dict[str, Any] = _combine_features(feature_files)
-    np.save(f"{save_folder_path}/features.npy", combined_features["features"])
+    alignment_index: dict[str, Any] = _build_alignment_index(feature_files)
+
+    def save_subset(subset: tuple[str, ...]) -> None:
+        _save_combination(
+            {name: feature_files[name] for name in subset},
+            alignment_index,
+            f"{save_folder_path}/{len(subset)}/run_{'_'.join(subset)}",
+            virtual,
+        )
+
+    subsets: list[tuple[str, ...]] = [
+        subset for r in r_values for subset in combinations(feature_files.keys(), r)
+    ]
+    if n_jobs == 1:
+        for subset in subsets:
+            save_subset(subset)
+    else:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            list(executor.map(save_subset, subsets))
+
+
+def _save_combination(
+    feature_files: dict[str, dict[str, Any]],
+    alignment_index: dict[str, Any],
+    save_folder_path: str,
+    virtual: bool,
+) -> None:
+    if virtual and any(
+        isinstance(v["features"], VirtualCombinedFeatures)
+        for v in feature_files.values()
+    ):
+        raise ValueError("Virtual combinations cannot have virtual sources.")
+    if not os.path.exists(save_folder_path):
+        os.makedirs(save_folder_path)
+
+    combined_features: dict[str, Any] = _combine_features(
+        feature_files, alignment_index, virtual
+    )
+    if virtual:
+        save_virtual_combination(
+            save_folder_path,
+            {k: v["features_path"] for k, v in feature_files.items()},
+            combined_features["row_indices"],
+        )
+    else:
+        np.save(f"{save_folder_path}/features.npy", combined_features["features"])
     with open(f"{save_folder_path}/feature_config.json", mode="w") as f:
         json.dump(combined_features["feature_config"], f)
     with open(f"{save_folder_path}/image_names.pickle", mode="wb") as f:
@@ -33,7 +123,7 @@ def _load_feature(feature_path: str) -> dict[str, Any]:
 
 
 def _load_regular_feature(feature_path: str) -> dict[str, Any]:
-    features: np.ndarray = np.load(f"{feature_path}/features.npy")
+    features: np.ndarray = load_features(feature_path, mmap_mode="r")
     with open(f"{feature_path}/feature_config.json", mode="r") as f:
         feature_config: dict = json.load(f)
     with open(f"{feature_path}/image_names.pickle", mode="rb") as f:
@@ -41,6 +131,7 @@ def _load_regular_feature(feature_path: str) -> dict[str, Any]:
 
     return {
         "features": features,
+        "features_path": f"{feature_path}/features.npy",
         "feature_config": feature_config,
         "image_names": image_names,
     }
@@ -48,7 +139,7 @@ def _load_regular_feature(feature_path: str) -> dict[str, Any]:
 
 def _load_reduced_feature(feature_path: str) -> dict[str, Any]:
     parent_path: str = Path(feature_path).parent.parent.absolute()
-    features: np.ndarray = np.load(f"{feature_path}/features.npy")
+    features: np.ndarray = np.load(f"{feature_path}/features.npy", mmap_mode="r")
     with open(f"{parent_path}/feature_config.json", mode="r") as f:
         feature_config: dict = json.load(f)
     with open(f"{feature_path}/reducer_config.json", mode="r") as f:
@@ -59,12 +150,37 @@ def _load_reduced_feature(feature_path: str) -> dict[str, Any]:
 
     return {
         "features": features,
+        "features_path": f"{feature_path}/features.npy",
         "feature_config": feature_config,
         "image_names": image_names,
     }
 
 
-def _combine_features(feature_files: dict[str, dict[str, Any]]) -> dict[str, Any]:
+def _build_alignment_index(feature_files: dict[str, dict[str, Any]]) -> dict[str, Any]:
+    # Sort the union of the image names once, and map each image in the union to its
+    # row in every feature, or to -1 if the feature does not have the image.
+    union_image_names: set[str] = set()
+    for files in feature_files.values():
+        union_image_names.update(files["image_names"])
+    sorted_image_names: np.ndarray = np.array(sorted(list(union_image_names)))
+
+    union_rows: dict[str, np.ndarray] = {}
+    for name, files in feature_files.items():
+        rows: np.ndarray = np.full(len(sorted_image_names), -1, dtype=np.int64)
+        positions: np.ndarray = np.searchsorted(
+            sorted_image_names, np.array(files["image_names"])
+        )
+        rows[positions] = np.arange(len(positions))
+        union_rows[name] = rows
+
+    return {"image_names": sorted_image_names, "rows": union_rows}
+
+
+def _combine_features(
+    feature_files: dict[str, dict[str, Any]],
+    alignment_index: dict[str, Any],
+    virtual: bool = False,
+) -> dict[str, Any]:
     # Combine the config dictionaries to a single dictionary.
     combined_config_dict: dict[str, dict] = {}
     for name, files in feature_files.items():
@@ -73,28 +189,46 @@ def _combine_features(feature_files: dict[str, dict[str, Any]]) -> dict[str, Any
         [v["features"].shape[1] for v in feature_files.values()]
     )
 
-    # Get the images for which all feature methods successfully computed features.
-    image_names_list: list[list[str]] = [
-        v["image_names"] for v in feature_files.values()
-    ]
-    common_image_names: set[str] = set(image_names_list[0])
-    for image_names in image_names_list[1:]:
-        common_image_names.intersection_update(image_names)
-    new_image_names_list: list[str] = sorted(list(common_image_names))
-
-    # Get the actual features for these common images.
-    common_features_list = []
-    for name, files in feature_files.items():
-        image_names: list[str] = files["image_names"]
-        image_names_idx: dict = dict((n, i) for i, n in enumerate(image_names))
-        indices: list[int] = [image_names_idx[x] for x in new_image_names_list]
-        features: np.ndarray = files["features"]
-        common_features: np.ndarray = features[indices]
-        common_features_list.append(common_features)
-    stacked_common_features: np.ndarray = np.concatenate(common_features_list, axis=1)
+    # Get the images for which all feature methods successfully computed features,
+    # and the rows of each feature that belong to these common images.
+    union_image_names: np.ndarray = alignment_index["image_names"]
+    union_rows: dict[str, np.ndarray] = alignment_index["rows"]
+    is_common: np.ndarray = np.logical_and.reduce(
+        [union_rows[name] >= 0 for name in feature_files.keys()]
+    )
+    new_image_names_list: list[str] = union_image_names[is_common].tolist()
+    row_indices: dict[str, np.ndarray] = {
+        name: union_rows[name][is_common] for name in feature_files.keys()
+    }
 
-    return {
-        "features": stacked_common_features,
+    combined_features: dict[str, Any] = {
         "feature_config": combined_config_dict,
         "image_names": new_image_names_list,
     }
+    if virtual:
+        combined_features["row_indices"] = row_indices
+    else:
+        combined_features["features"] = _stack_common_features(
+            {k: v["features"] for k, v in feature_files.items()}, row_indices
+        )
+
+    return combined_features
+
+
+def _stack_common_features(
+    features: dict[str, np.ndarray], row_indices: dict[str, np.ndarray]
+) -> np.ndarray:
+    # Gather the rows of each feature directly into its column block of the output
+    # instead of concatenating intermediate copies.
+    n_rows: int = len(next(iter(row_indices.values())))
+    n_columns: int = sum([f.shape[1] for f in features.values()])
+    stacked_common_features: np.ndarray = np.empty(
+        (n_rows, n_columns), dtype=np.result_type(*[f.dtype for f in features.values()])
+    )
+    start: int = 0
+    for name, f in features.items():
+        stop: int = start + f.shape[1]
+        stacked_common_features[:, start:stop] = f[row_indices[name]]
+        start = stop
+
+    return stacked_common_features
@@ -0,0 +1,157 @@
+import json
+import os
+from typing import Any, Optional, Union
+
+import numpy as np
+
+COMBINATION_FILE_NAME: str = "combination.json"
+ROW_INDICES_FILE_NAME: str = "row_indices.npz"
+
+
+class VirtualCombinedFeatures:
+    def __init__(self, combination_folder_path: str) -> None:
+        """Inits a VirtualCombinedFeatures instance, which is a read-only, lazy view of
+        a combined feature that was saved without materializing its features. The
+        column blocks of the combined feature are gathered on demand from the
+        memory-mapped features of the source folders.
+
+        :param combination_folder_path: A string indicating the folder containing the
+            virtual combination.
+        """
+        self.combination_folder_path: str = combination_folder_path
+        with open(f"{combination_folder_path}/{COMBINATION_FILE_NAME}", mode="r") as f:
+            combination: dict = json.load(f)
+        self.source_names: list[str] = combination["source_names"]
+        row_indices: np.lib.npyio.NpzFile = np.load(
+            f"{combination_folder_path}/{ROW_INDICES_FILE_NAME}"
+        )
+        self.row_indices: dict[str, np.ndarray] = {
+            name: row_indices[name] for name in self.source_names
+        }
+        self.sources: dict[str, np.ndarray] = {
+            name: np.load(
+                os.path.join(
+                    combination_folder_path, combination["source_paths"][name]
+                ),
+                mmap_mode="r",
+            )
+            for name in self.source_names
+        }
+
+        self.column_offsets: np.ndarray = np.cumsum(
+            [0] + [self.sources[name].shape[1] for name in self.source_names]
+        )
+        self.shape: tuple[int, int] = (
+            len(self.row_indices[self.source_names[0]]),
+            int(self.column_offsets[-1]),
+        )
+        self.dtype: np.dtype = np.result_type(
+            *[source.dtype for source in self.sources.values()]
+        )
+        self.ndim: int = 2
+
+    def __len__(self) -> int:
+        return self.shape[0]
+
+    def __getitem__(self, key: Any) -> np.ndarray:
+        """Gathers the requested rows, and optionally a slice of columns, from the
+        sources and returns them as a new in-memory array.
+
+        :param key: Either a row key (an integer, a slice, or an array of indices) or a
+            2-tuple of a row key and a column slice.
+        :return: A numpy array containing the requested part of the combined features.
+        """
+        if isinstance(key, tuple):
+            row_key, column_key = key
+        else:
+            row_key, column_key = key, slice(None)
+        if not isinstance(column_key, slice):
+            raise ValueError("Only slices are supported for indexing the columns.")
+
+        single_row: bool = isinstance(row_key, (int, np.integer))
+        if single_row:
+            row_key = [row_key]
+        column_start, column_stop, column_step = column_key.indices(self.shape[1])
+        if column_step != 1:
+            raise ValueError("Only contiguous column slices are supported.")
+
+        blocks: list[np.ndarray] = []
+        for i, name in enumerate(self.source_names):
+            block_start: int = max(column_start, int(self.column_offsets[i]))
+            block_stop: int = min(column_stop, int(self.column_offsets[i + 1]))
+            if block_start >= block_stop:
+                continue
+            source_rows: np.ndarray = np.atleast_1d(self.row_indices[name][row_key])
+            blocks.append(
+                _gather_rows(
+                    self.sources[name],
+                    source_rows,
+                    slice(
+                        block_start - int(self.column_offsets[i]),
+                        block_stop - int(self.column_offsets[i]),
+                    ),
+                )
+            )
+
+        if len(blocks) == 0:
+            n_rows: int = len(np.arange(self.shape[0])[row_key])
+            combined: np.ndarray = np.empty((n_rows, 0), dtype=self.dtype)
+        else:
+            combined: np.ndarray = np.concatenate(blocks, axis=1).astype(
+                self.dtype, copy=False
+            )
+
+        return combined[0] if single_row else combined
+
+    def __array__(self, dtype: Optional[np.dtype] = None, copy: Optional[bool] = None):
+        features: np.ndarray = self[:]
+        return features if dtype is None else features.astype(dtype, copy=False)
+
+
+def save_virtual_combination(
+    save_folder_path: str,
+    source_features_paths: dict[str, str],
+    row_indices: dict[str, np.ndarray],
+) -> None:
+    """Saves a virtual combination, i.e. the paths of the source features and the rows
+    of each source that make up the combined feature, to the folder with the given
+    path. The source paths are stored relative to the folder.
+
+    :param save_folder_path: A string indicating the folder to save the files to.
+    :param source_features_paths: A dictionary mapping the name of each source to the
+        path of its features.npy file.
+    :param row_indices: A dictionary mapping the name of each source to a 1-d numpy
+        array containing the source row of each combined row.
+    """
+    combination: dict[str, Any] = {
+        "source_names": list(source_features_paths.keys()),
+        "source_paths": {
+            name: os.path.relpath(path, save_folder_path)
+            for name, path in source_features_paths.items()
+        },
+    }
+    with open(f"{save_folder_path}/{COMBINATION_FILE_NAME}", mode="w") as f:
+        json.dump(combination, f)
+    np.savez(f"{save_folder_path}/{ROW_INDICES_FILE_NAME}", **row_indices)
+
+
+def is_virtual_combination(folder_path: str) -> bool:
+    """Checks whether the folder with the given path contains a virtual combination.
+
+    :param folder_path: A string indicating the path to the folder.
+    :return: A boolean indicating whether the folder contains a virtual combination.
+    """
+    return os.path.exists(f"{folder_path}/{COMBINATION_FILE_NAME}")
+
+
+def _gather_rows(
+    source: Union[np.ndarray, np.memmap], rows: np.ndarray, columns: slice
+) -> np.ndarray:
+    # Reading the rows in sorted order keeps the accesses to the memory-mapped file
+    # sequential. The gathered rows are then put back in the requested order.
+    order: np.ndarray = np.argsort(rows, kind="stable")
+    gathered: np.ndarray = np.empty(
+        (len(rows), columns.stop - columns.start), dtype=source.dtype
+    )
+    gathered[order] = source[rows[order], columns]
+    return gathered
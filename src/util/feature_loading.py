@@ -0,0 +1,193 @@
+import os
+import tempfile
+from multiprocessing import shared_memory
+from typing import Iterator, Optional, Union
+
+import numpy as np
+
+from src.features.virtual_combination import (
+    VirtualCombinedFeatures,
+    is_virtual_combination,
+)
+
+
+class SharedFeatures:
+    def __init__(self, name: str, shape: tuple[int, ...], dtype: str) -> None:
+        """Inits a SharedFeatures instance, which attaches to the named shared memory
+        block holding a features array. Instances are pickled as the name of the block,
+        so worker processes attach to the same memory without copying the features.
+        Use create for putting features into a new block.
+
+        :param name: A string indicating the name of the shared memory block.
+        :param shape: A tuple of integers indicating the shape of the features.
+        :param dtype: A string indicating the data type of the features.
+        """
+        self.name: str = name
+        self.shape: tuple[int, ...] = tuple(shape)
+        self.dtype: str = dtype
+        self.memory: shared_memory.SharedMemory = shared_memory.SharedMemory(name=name)
+        self.array: np.ndarray = np.ndarray(
+            self.shape, dtype=self.dtype, buffer=self.memory.buf
+        )
+        self.is_owner: bool = False
+
+    @classmethod
+    def create(
+        cls, features: Union[np.ndarray, "VirtualCombinedFeatures"]
+    ) -> "SharedFeatures":
+        """Copies the given features into a new shared memory block. The block is
+        removed when the returned instance is closed.
+
+        :param features: Either a (memory-mapped) numpy array or a
+            VirtualCombinedFeatures instance containing the features.
+        :return: A SharedFeatures instance owning the new block.
+        """
+        dtype: np.dtype = np.dtype(features.dtype)
+        memory: shared_memory.SharedMemory = shared_memory.SharedMemory(
+            create=True, size=max(int(np.prod(features.shape)) * dtype.itemsize, 1)
+        )
+        shared_features: SharedFeatures = cls(memory.name, features.shape, dtype.str)
+        memory.close()
+        for start, chunk in iter_row_chunks(features, 10000):
+            shared_features.array[start : start + len(chunk)] = chunk
+        shared_features.is_owner = True
+        return shared_features
+
+    def close(self) -> None:
+        """Detaches from the shared memory block, and removes the block if this
+        instance created it. The features must not be used afterwards.
+        """
+        del self.array
+        self.memory.close()
+        if self.is_owner:
+            self.memory.unlink()
+
+    def __enter__(self) -> "SharedFeatures":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __getstate__(self) -> dict:
+        return {"name": self.name, "shape": self.shape, "dtype": self.dtype}
+
+    def __setstate__(self, state: dict) -> None:
+        self.__init__(state["name"], state["shape"], state["dtype"])
+
+
+FeatureSource = Union[str, np.ndarray, VirtualCombinedFeatures, SharedFeatures]
+
+
+def load_features(
+    features_dir: FeatureSource, mmap_mode: Optional[str] = None
+) -> Union[np.ndarray, VirtualCombinedFeatures]:
+    """Loads the features found in the folder with the given path. The folder either
+    contains a features.npy file or a virtual combination of other features. Features
+    that are already loaded, i.e. a (memory-mapped) numpy array, a
+    VirtualCombinedFeatures instance, or a SharedFeatures instance, are returned
+    without copying them, so that they are loaded once for many configurations.
+
+    :param features_dir: Either a string indicating the folder containing the features
+        or the already loaded features.
+    :param mmap_mode: A string indicating the memory-map mode used for loading the
+        features.npy file. If None, the file is read into memory. Defaults to None.
+    :return: Either a numpy array or a VirtualCombinedFeatures instance containing the
+        features.
+    """
+    if isinstance(features_dir, SharedFeatures):
+        return features_dir.array
+    elif not isinstance(features_dir, str):
+        return features_dir
+    elif os.path.exists(f"{features_dir}/features.npy"):
+        return np.load(f"{features_dir}/features.npy", mmap_mode=mmap_mode)
+    elif is_virtual_combination(features_dir):
+        return VirtualCombinedFeatures(features_dir)
+    else:
+        raise FileNotFoundError(f"No features were found in {features_dir}.")
+
+
+def to_process_source(
+    features_dir: FeatureSource, share_folder: bool = False
+) -> tuple[FeatureSource, Optional[SharedFeatures]]:
+    """Converts the given features into a source that is cheap to send to other
+    processes. A folder is sent as its path, which the processes load themselves, and
+    features in shared memory are sent as the name of their block. Any other features,
+    including memory-mapped arrays and virtual combinations, whose pickles would
+    contain all their rows, are copied into a new shared memory block.
+
+    :param features_dir: Either a string indicating the folder containing the features
+        or the already loaded features, see load_features.
+    :param share_folder: A boolean indicating whether the features of a folder are
+        copied into shared memory as well, for processes that would otherwise each load
+        them into memory. Defaults to False.
+    :return: A 2-tuple containing the source to send and the SharedFeatures instance
+        created for it, or None if none was created. The caller must close the created
+        instance once the processes are done.
+    """
+    if isinstance(features_dir, SharedFeatures) or (
+        isinstance(features_dir, str) and not share_folder
+    ):
+        return features_dir, None
+    shared_features: SharedFeatures = SharedFeatures.create(
+        load_features(features_dir, mmap_mode="r")
+    )
+    return shared_features, shared_features
+
+
+def iter_row_chunks(
+    features: Union[np.ndarray, VirtualCombinedFeatures],
+    chunk_size: int,
+    min_chunk_size: int = 1,
+) -> Iterator[tuple[int, np.ndarray]]:
+    """Iterates over consecutive chunks of rows of the given features, reading only one
+    chunk into memory at a time.
+
+    :param features: Either a (memory-mapped) numpy array or a VirtualCombinedFeatures
+        instance containing the features.
+    :param chunk_size: An integer indicating the number of rows per chunk.
+    :param min_chunk_size: An integer indicating the minimum number of rows per chunk.
+        If the last chunk is smaller, it is merged into the previous chunk. Defaults to
+        1.
+    :return: An iterator of 2-tuples containing the index of the first row of each
+        chunk and the chunk as an in-memory numpy array.
+    """
+    n_samples: int = features.shape[0]
+    bounds: list[int] = list(range(0, n_samples, chunk_size)) + [n_samples]
+    if len(bounds) > 2 and bounds[-1] - bounds[-2] < min_chunk_size:
+        del bounds[-2]
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        yield start, np.asarray(features[start:stop])
+
+
+def read_in_chunks(
+    features: Union[np.ndarray, VirtualCombinedFeatures], chunk_size: int = 10000
+) -> np.ndarray:
+    """Reads the given features into a single in-memory array one chunk at a time, so
+    that a virtual combination is gathered directly into the array instead of into
+    intermediate copies of its column blocks. Features that are already in memory are
+    returned without copying them.
+
+    :param features: Either a (memory-mapped) numpy array or a VirtualCombinedFeatures
+        instance containing the features.
+    :param chunk_size: An integer indicating the number of rows per chunk. Defaults to
+        10000.
+    :return: A numpy array containing the features.
+    """
+    if isinstance(features, np.ndarray) and not isinstance(features, np.memmap):
+        return features
+
+    in_memory_features: np.ndarray = np.empty(features.shape, dtype=features.dtype)
+    for start, chunk in iter_row_chunks(features, chunk_size):
+        in_memory_features[start : start + len(chunk)] = chunk
+    return in_memory_features
+
+
+def empty_scratch_array(shape: tuple[int, ...], dtype: np.dtype) -> np.memmap:
+    """Creates an uninitialized array that is backed by an anonymous temporary file
+    instead of memory. The file is removed once the array is garbage collected.
+
+    :param shape: A tuple of integers indicating the shape of the array.
+    :param dtype: The data type of the array.
+    :return: A numpy memmap with the given shape and data type.
+    """
+    return np.memmap(tempfile.TemporaryFile(), dtype=dtype, mode="w+", shape=shape)
@@ -1,3 +1,8 @@
+import os
+from contextlib import contextmanager
+from typing import IO, Iterator
+
+
 def create_json_dict(d: dict) -> dict:
     return {k: v for k, v in d.items() if isinstance(k, str) and safe_json(v)}
 
@@ -12,3 +17,24 @@ def safe_json(data) -> bool:
     elif isinstance(data, dict):
         return all(isinstance(k, str) and safe_json(v) for k, v in data.items())
     return False
+
+
+@contextmanager
+def atomic_open(file_path: str, mode: str = "wb") -> Iterator[IO]:
+    """Opens a temporary file next to the file with the given path for writing, and
+    replaces the file with it once the writing has finished. Readers therefore never
+    see a partially written file.
+
+    :param file_path: A string indicating the path of the file.
+    :param mode: A string indicating the mode to open the temporary file with. Defaults
+        to "wb".
+    :return: An iterator yielding the opened temporary file.
+    """
+    temporary_file_path: str = f"{file_path}.tmp"
+    try:
+        with open(temporary_file_path, mode=mode) as f:
+            yield f
+        os.replace(temporary_file_path, file_path)
+    finally:
+        if os.path.exists(temporary_file_path):
+            os.remove(temporary_file_path)
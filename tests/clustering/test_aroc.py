@@ -0,0 +1,145 @@
+from itertools import product
+
+import numpy as np
+import pytest
+
+from src.clustering.aroc.aroc import (
+    cluster_aroc,
+    cluster_aroc_sweep,
+    _convert_components_to_labels,
+    _face_rank_order_distances,
+    _merge_components,
+    _rank_order_distances,
+)
+
+
+def _reference_pairwise_distance(neighbor_lookup, row_no):
+    # The per-row distance computation of the original AROC implementation.
+    distance = np.zeros([1, len(neighbor_lookup[row_no])])
+    row = neighbor_lookup[row_no]
+    for i, neighbor in enumerate(row[1:]):
+        oa_b = i + 1
+        try:
+            neighbours_face_b = neighbor_lookup[neighbor]
+            ob_a = np.where(neighbours_face_b == row_no)[0][0] + 1
+        except IndexError:
+            distance[0, oa_b] = 9999
+            continue
+        neighbours_face_a = set(row[:oa_b])
+        neighbours_face_b = set(neighbor_lookup[neighbor])
+        d_ab = len(neighbours_face_a.difference(neighbours_face_b))
+        neighbours_face_a = set(neighbor_lookup[row_no])
+        neighbours_face_b = set(neighbor_lookup[neighbor][:ob_a])
+        d_ba = len(neighbours_face_b.difference(neighbours_face_a))
+        distance[0, oa_b] = float(d_ab + d_ba) / min(oa_b, ob_a)
+    return distance
+
+
+@pytest.fixture
+def example_nearest_neighbours():
+    # Neighbour lists of points on a line, with a few duplicate and missing entries.
+    rng = np.random.default_rng(0)
+    points = np.sort(rng.uniform(size=60))
+    nearest_neighbours = np.argsort(np.abs(points[:, None] - points[None, :]), axis=1)
+    nearest_neighbours = nearest_neighbours[:, :8]
+    nearest_neighbours[3, 5] = nearest_neighbours[3, 2]
+    nearest_neighbours[10, 0] = 11
+    return nearest_neighbours
+
+
+@pytest.mark.parametrize("num_proc, block_size", [(1, None), (1, 7), (2, 5)])
+def test_rank_order_distances(example_nearest_neighbours, num_proc, block_size):
+    neighbor_lookup = dict(enumerate(example_nearest_neighbours))
+    expected_distances = np.concatenate(
+        [
+            _reference_pairwise_distance(neighbor_lookup, i)
+            for i in range(len(example_nearest_neighbours))
+        ]
+    )
+
+    actual_distances = _rank_order_distances(
+        example_nearest_neighbours, num_proc, block_size
+    )
+
+    assert actual_distances.dtype == np.float32
+    np.testing.assert_array_equal(
+        actual_distances, expected_distances.astype(np.float32)
+    )
+
+
+def test_face_rank_order_distances():
+    rng = np.random.default_rng(0)
+    points = rng.uniform(size=40)
+    nearest_neighbours = np.argsort(np.abs(points[:, None] - points[None, :]), axis=1)
+    nearest_neighbours = nearest_neighbours[:, :6]
+    distances = _rank_order_distances(nearest_neighbours, num_proc=1)
+
+    for row in range(40):
+        face_distances = _face_rank_order_distances(
+            nearest_neighbours[row], nearest_neighbours[nearest_neighbours[row]]
+        )
+        np.testing.assert_allclose(face_distances, distances[row])
+
+
+def test_cluster_aroc():
+    # Two groups of points that are far apart on a line.
+    rng = np.random.default_rng(0)
+    points = np.concatenate([rng.uniform(size=30), rng.uniform(size=30) + 10])
+
+    cluster_labels = cluster_aroc(
+        points[:, None], n_neighbours=8, threshold=1.5, min_samples=2, num_proc=1
+    )
+
+    assert len(np.unique(cluster_labels[:30])) == 1
+    assert len(np.unique(cluster_labels[30:])) == 1
+    assert cluster_labels[0] != cluster_labels[30]
+
+
+def test_merge_components():
+    # Faces 0 and 2 link to face 1, which links to neither of them, and faces 3 and 4
+    # link to each other. A link in either direction connects two faces, whereas
+    # following only the outgoing links from face 1 would leave it on its own.
+    nearest_neighbours = np.array(
+        [[0, 1, 2], [1, 0, 2], [2, 1, 0], [3, 4, 5], [4, 3, 5], [5, 4, 3]]
+    )
+    distances = np.array(
+        [
+            [0, 0.5, 9999],
+            [0, 9999, 9999],
+            [0, 0.5, 9999],
+            [0, 0.5, 9999],
+            [0, 0.5, 9999],
+            [0, 9999, 9999],
+        ],
+        dtype=np.float32,
+    )
+
+    component_labels = _merge_components(nearest_neighbours, distances, threshold=1.0)
+
+    np.testing.assert_array_equal(component_labels, [0, 0, 0, 1, 1, 2])
+
+
+def test_convert_components_to_labels():
+    component_labels = np.array([2, 0, 2, 1, 3, 3, 0, 3])
+
+    cluster_labels = _convert_components_to_labels(component_labels, min_samples=2)
+
+    np.testing.assert_array_equal(cluster_labels, [1, 0, 1, -1, 2, 2, 0, 2])
+
+
+def test_cluster_aroc_sweep(example_nearest_neighbours):
+    sweep_cluster_labels = cluster_aroc_sweep(
+        example_nearest_neighbours, [5, 8], [0.5, 1.5], [1, 3], num_proc=1
+    )
+
+    for cluster_labels, (k, threshold, min_samples) in zip(
+        sweep_cluster_labels, product([5, 8], [0.5, 1.5], [1, 3])
+    ):
+        expected_cluster_labels = cluster_aroc_sweep(
+            np.ascontiguousarray(example_nearest_neighbours[:, :k]),
+            [k],
+            [threshold],
+            [min_samples],
+            num_proc=1,
+        )[0]
+        np.testing.assert_array_equal(cluster_labels, expected_cluster_labels)
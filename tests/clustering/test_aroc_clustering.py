@@ -0,0 +1,102 @@
+import os
+
+import numpy as np
+import pytest
+
+from src.clustering.aroc.aroc_clustering import AROClustering
+
+
+@pytest.fixture
+def example_features_dir(tmp_path):
+    # Two groups of points that are far apart on a line.
+    rng = np.random.default_rng(0)
+    points = np.concatenate([rng.uniform(size=30), rng.uniform(size=30) + 10])
+    np.save(f"{tmp_path}/features.npy", points[:, None])
+    return str(tmp_path)
+
+
+def test_assign(example_features_dir):
+    clustering = AROClustering(8, 1.5, 2, num_proc=1)
+    cluster_labels = clustering.cluster(example_features_dir)
+
+    new_cluster_labels = clustering.assign(np.array([[0.5], [10.5], [100]]))
+
+    np.testing.assert_array_equal(
+        new_cluster_labels, [cluster_labels[0], cluster_labels[30], -1]
+    )
+
+    new_cluster_labels = clustering.assign(np.array([[100.1], [100.2]]))
+
+    np.testing.assert_array_equal(new_cluster_labels, [2, 2])
+    assert clustering.cluster_labels[62] == 2
+    np.testing.assert_array_equal(clustering.cluster_labels[:60], cluster_labels)
+    assert clustering.nearest_neighbours.shape == (65, 8)
+
+
+def test_assign_sweep(example_features_dir):
+    clustering = AROClustering(8, [1.0, 1.5], 2, num_proc=1)
+    clustering.cluster(example_features_dir)
+
+    with pytest.raises(ValueError):
+        clustering.assign(np.array([[0.5]]))
+
+
+def test_save_and_load_model(example_features_dir, tmp_path):
+    clustering = AROClustering(8, 1.5, 2, num_proc=1)
+    clustering.cluster(example_features_dir)
+    clustering.assign(np.array([[0.5], [100]]))
+    clustering.save_model(f"{tmp_path}/model")
+
+    loaded_clustering = AROClustering(8, 1.5, 2, num_proc=1)
+    loaded_clustering.load_model(f"{tmp_path}/model")
+    new_features = np.array([[10.5], [100.1], [-50]])
+
+    np.testing.assert_array_equal(
+        loaded_clustering.assign(new_features), clustering.assign(new_features)
+    )
+    np.testing.assert_array_equal(
+        loaded_clustering.cluster_labels, clustering.cluster_labels
+    )
+
+
+def test_save_model_loaded_features(example_features_dir, tmp_path):
+    clustering = AROClustering(8, 1.5, 2, num_proc=1)
+    clustering.cluster(np.load(f"{example_features_dir}/features.npy"))
+
+    with pytest.raises(ValueError):
+        clustering.save_model(f"{tmp_path}/model")
+
+
+def test_assign_in_batches(example_features_dir):
+    clustering = AROClustering(8, 1.5, 2, num_proc=1)
+    clustering.cluster(example_features_dir)
+    batched_clustering = AROClustering(8, 1.5, 2, num_proc=1)
+    batched_clustering.cluster(example_features_dir)
+    new_features = np.array([[0.5], [100], [100.1], [10.5], [100.2], [-50]])
+
+    for i in range(len(new_features)):
+        clustering.assign(new_features[i : i + 1])
+    batched_clustering.assign(new_features)
+
+    np.testing.assert_array_equal(
+        batched_clustering.cluster_labels, clustering.cluster_labels
+    )
+    np.testing.assert_array_equal(
+        batched_clustering.nearest_neighbours, clustering.nearest_neighbours
+    )
+
+
+def test_load_model_without_config(example_features_dir, tmp_path):
+    clustering = AROClustering(8, 1.5, 2, num_proc=1)
+    clustering.cluster(example_features_dir)
+    clustering.save_model(f"{tmp_path}/model")
+    os.remove(f"{tmp_path}/model/clustering_config.json")
+
+    loaded_clustering = AROClustering(8, 1.5, 2, num_proc=1)
+    loaded_clustering.load_model(f"{tmp_path}/model")
+
+    assert loaded_clustering.features_dir == example_features_dir
+    np.testing.assert_array_equal(
+        loaded_clustering.assign(np.array([[0.5]])),
+        clustering.assign(np.array([[0.5]])),
+    )
@@ -0,0 +1,78 @@
+import json
+
+import numpy as np
+import pytest
+from sklearn.datasets import make_blobs
+from sklearn.metrics import adjusted_rand_score
+
+from src.clustering.chinese_whispers_clustering import (
+    ChineseWhispersClustering,
+    _get_heaviest_labels,
+)
+
+
+@pytest.fixture
+def example_blobs(tmp_path):
+    features, labels = make_blobs(1000, 8, centers=10, cluster_std=0.5, random_state=0)
+    # A few outliers far away from the blobs.
+    features[:5] = 100 + np.arange(5)[:, None] * 10
+    np.save(f"{tmp_path}/features.npy", features.astype(np.float32))
+    return str(tmp_path), labels
+
+
+def test_get_heaviest_labels():
+    rows = np.array([0, 0, 0, 1, 1, 2, 2])
+    labels = np.array([3, 1, 3, 2, 0, 4, 4])
+    weights = np.array([1.0, 1.5, 1.0, 1.0, 1.0, 1.0, 1.0])
+
+    heaviest_labels = _get_heaviest_labels(rows, labels, weights, n_labels=5)
+
+    np.testing.assert_array_equal(heaviest_labels, [3, 0, 4])
+
+
+def test_cluster(example_blobs, tmp_path):
+    features_dir, labels = example_blobs
+    clustering = ChineseWhispersClustering(20, 2.5, 3)
+    cluster_labels = clustering.cluster(features_dir)
+
+    assert clustering.converged
+    np.testing.assert_array_equal(cluster_labels[:5], -1)
+    assert adjusted_rand_score(labels[5:], cluster_labels[5:]) == 1
+    np.testing.assert_array_equal(
+        ChineseWhispersClustering(20, 2.5, 3).cluster(features_dir), cluster_labels
+    )
+
+    clustering.save_cluster_labels(f"{tmp_path}/run_0")
+    np.testing.assert_array_equal(
+        np.load(f"{tmp_path}/run_0/cluster_labels.npy"), cluster_labels
+    )
+    with open(f"{tmp_path}/run_0/clustering_config.json", mode="r") as f:
+        config = json.load(f)
+    assert config["knn_config"]["backend"] == "brute_force"
+
+
+def test_assign_and_save_and_load_model(example_blobs, tmp_path):
+    features_dir, _ = example_blobs
+    clustering = ChineseWhispersClustering(20, 2.5, 3)
+    cluster_labels = clustering.cluster(features_dir)
+    features = np.load(f"{features_dir}/features.npy")
+    clustering.save_model(f"{tmp_path}/model")
+
+    loaded_clustering = ChineseWhispersClustering(20, 2.5, 3)
+    loaded_clustering.load_model(f"{tmp_path}/model")
+    new_features = np.concatenate([features[5:15] + 0.01, [[-100] * 8]])
+
+    new_cluster_labels = loaded_clustering.assign(new_features)
+
+    np.testing.assert_array_equal(new_cluster_labels[:10], cluster_labels[5:15])
+    assert new_cluster_labels[10] == -1
+    np.testing.assert_array_equal(clustering.assign(new_features), new_cluster_labels)
+
+
+def test_save_model_loaded_features(example_blobs, tmp_path):
+    features_dir, _ = example_blobs
+    clustering = ChineseWhispersClustering(20, 2.5, 3)
+    clustering.cluster(np.load(f"{features_dir}/features.npy"))
+
+    with pytest.raises(ValueError):
+        clustering.save_model(f"{tmp_path}/model")
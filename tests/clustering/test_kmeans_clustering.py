@@ -0,0 +1,130 @@
+import json
+
+import numpy as np
+import pytest
+from sklearn.datasets import make_blobs
+from sklearn.metrics import adjusted_rand_score
+
+from src.clustering.kmeans_clustering import KMeansClustering
+
+
+@pytest.fixture
+def example_blobs(tmp_path):
+    features, labels = make_blobs(2000, 8, centers=5, random_state=0)
+    np.save(f"{tmp_path}/features.npy", features)
+    return str(tmp_path), labels
+
+
+def test_cluster_minibatch(example_blobs, tmp_path):
+    features_dir, labels = example_blobs
+    full_clustering = KMeansClustering(5, random_state=0)
+    full_cluster_labels = full_clustering.cluster(features_dir)
+
+    clustering = KMeansClustering(5, mode="minibatch", chunk_size=300, random_state=0)
+    cluster_labels = clustering.cluster(features_dir)
+
+    assert adjusted_rand_score(full_cluster_labels, cluster_labels) == 1
+    assert clustering.inertia == pytest.approx(full_clustering.inertia)
+    assert clustering.converged
+
+    clustering.save_cluster_labels(f"{tmp_path}/run_0")
+    with open(f"{tmp_path}/run_0/clustering_config.json", mode="r") as f:
+        config = json.load(f)
+    assert config["inertia"] == clustering.inertia
+    assert config["n_iter"] == len(config["center_shifts"]) + 1
+    np.testing.assert_allclose(config["cluster_sse"], clustering.cluster_sse)
+    assert config["cluster_sizes"] == clustering.cluster_sizes.tolist()
+
+
+def test_cluster_minibatch_more_clusters_than_chunk_size(example_blobs):
+    features_dir, _ = example_blobs
+    clustering = KMeansClustering(20, mode="minibatch", chunk_size=5, random_state=0)
+    cluster_labels = clustering.cluster(features_dir)
+
+    assert len(np.unique(cluster_labels)) == 20
+
+
+@pytest.mark.parametrize("mode, n_jobs", [("full", 1), ("minibatch", 2)])
+def test_cluster_sweep(example_blobs, tmp_path, mode, n_jobs):
+    features_dir, labels = example_blobs
+    clustering = KMeansClustering(
+        [6, 3, 5, 4], mode=mode, chunk_size=300, random_state=0, n_jobs=n_jobs
+    )
+    cluster_labels = clustering.cluster(features_dir)
+
+    assert cluster_labels.shape == (4, 2000)
+    for run_cluster_labels, n_clusters in zip(cluster_labels, [6, 3, 5, 4]):
+        assert len(np.unique(run_cluster_labels)) == n_clusters
+    assert adjusted_rand_score(labels, cluster_labels[2]) > 0.95
+
+    clustering.save_cluster_labels_sweep([f"{tmp_path}/run_{i}" for i in range(4)])
+    for i, n_clusters in enumerate([6, 3, 5, 4]):
+        with open(f"{tmp_path}/run_{i}/clustering_config.json", mode="r") as f:
+            config = json.load(f)
+        assert config["n_clusters"] == n_clusters
+        assert config["fit_time"] > 0
+        assert len(config["cluster_sse"]) == n_clusters
+        assert sum(config["cluster_sizes"]) == len(labels)
+        np.testing.assert_array_equal(
+            np.load(f"{tmp_path}/run_{i}/cluster_labels.npy"), cluster_labels[i]
+        )
+
+
+def test_cluster_sweep_memmap_in_processes(example_blobs):
+    features_dir, _ = example_blobs
+    cluster_labels = KMeansClustering(
+        [3, 5], mode="minibatch", chunk_size=300, random_state=0, n_jobs=2
+    ).cluster(features_dir)
+
+    memmap = np.load(f"{features_dir}/features.npy", mmap_mode="r")
+    np.testing.assert_array_equal(
+        KMeansClustering(
+            [3, 5], mode="minibatch", chunk_size=300, random_state=0, n_jobs=2
+        ).cluster(memmap),
+        cluster_labels,
+    )
+
+
+def test_assign(example_blobs):
+    features_dir, labels = example_blobs
+    clustering = KMeansClustering(5, random_state=0)
+    cluster_labels = clustering.cluster(features_dir)
+    features = np.load(f"{features_dir}/features.npy")
+    cluster_centers = clustering.cluster_centers.copy()
+
+    new_cluster_labels = clustering.assign(features[:10] + 0.01)
+
+    np.testing.assert_array_equal(new_cluster_labels, cluster_labels[:10])
+    np.testing.assert_array_equal(
+        clustering.cluster_sizes,
+        np.bincount(cluster_labels, minlength=5)
+        + np.bincount(cluster_labels[:10], minlength=5),
+    )
+    expected_center = (
+        features[cluster_labels == new_cluster_labels[0]].sum(axis=0)
+        + (features[:10] + 0.01)[new_cluster_labels == new_cluster_labels[0]].sum(
+            axis=0
+        )
+    ) / clustering.cluster_sizes[new_cluster_labels[0]]
+    np.testing.assert_allclose(
+        clustering.cluster_centers[new_cluster_labels[0]], expected_center, atol=1e-6
+    )
+    assert not np.allclose(clustering.cluster_centers, cluster_centers)
+
+
+def test_save_and_load_model(example_blobs, tmp_path):
+    features_dir, labels = example_blobs
+    clustering = KMeansClustering(5, random_state=0)
+    clustering.cluster(features_dir)
+    clustering.save_model(f"{tmp_path}/model")
+
+    loaded_clustering = KMeansClustering(5)
+    loaded_clustering.load_model(f"{tmp_path}/model")
+    features = np.load(f"{features_dir}/features.npy")[:100]
+
+    np.testing.assert_array_equal(
+        loaded_clustering.assign(features), clustering.assign(features)
+    )
+    np.testing.assert_allclose(
+        loaded_clustering.cluster_centers, clustering.cluster_centers
+    )
@@ -0,0 +1,93 @@
+import os
+
+import numpy as np
+import pytest
+from sklearn.neighbors import NearestNeighbors
+
+from src.clustering.knn.brute_force_knn import BruteForceKNN
+from src.clustering.knn.sklearn_knn import SklearnKNN
+
+
+@pytest.fixture
+def example_features():
+    rng = np.random.default_rng(0)
+    return rng.normal(size=(100, 6)).astype(np.float32)
+
+
+@pytest.mark.parametrize("get_knn", [BruteForceKNN, SklearnKNN])
+@pytest.mark.parametrize("metric", ["euclidean", "cosine"])
+def test_query(example_features, get_knn, metric):
+    expected_distances, expected_indices = (
+        NearestNeighbors(n_neighbors=5, algorithm="brute", metric=metric)
+        .fit(example_features.astype(np.float64))
+        .kneighbors(example_features.astype(np.float64))
+    )
+
+    actual_indices, actual_distances = get_knn(metric=metric).query(example_features, 5)
+
+    assert actual_indices.dtype == np.int64
+    assert actual_distances.dtype == np.float32
+    np.testing.assert_array_equal(actual_indices, expected_indices)
+    # The float32 distances of the samples to themselves suffer from cancellation.
+    np.testing.assert_allclose(
+        actual_distances, expected_distances, rtol=1e-4, atol=2e-3
+    )
+
+
+def test_query_large_norms():
+    rng = np.random.default_rng(0)
+    features = (rng.normal(size=(300, 256)) * 0.05 + rng.normal(size=256) * 100).astype(
+        np.float32
+    )
+    exact_distances = np.linalg.norm(
+        features.astype(np.float64)[:, None] - features.astype(np.float64)[None],
+        axis=2,
+    )
+
+    actual_indices, actual_distances = BruteForceKNN().query(features, 5)
+
+    np.testing.assert_array_equal(
+        actual_indices, np.argsort(exact_distances, axis=1)[:, :5]
+    )
+    np.testing.assert_allclose(
+        actual_distances, np.sort(exact_distances, axis=1)[:, :5], rtol=1e-5
+    )
+
+
+def test_query_duplicates():
+    features = np.array([[0.0], [0.0], [0.0], [5.0]], dtype=np.float32)
+
+    indices, distances = BruteForceKNN().query(features, 2)
+
+    np.testing.assert_array_equal(indices, [[0, 1], [1, 0], [2, 0], [3, 0]])
+    np.testing.assert_array_equal(distances, [[0, 0], [0, 0], [0, 0], [0, 5]])
+
+
+def test_get_neighbours_cache(example_features, tmp_path, monkeypatch):
+    np.save(f"{tmp_path}/features.npy", example_features)
+    knn = BruteForceKNN(block_size=16)
+
+    indices, distances = knn.get_neighbours(str(tmp_path), 8)
+    assert os.path.exists(f"{tmp_path}/knn/brute_force_euclidean_k8/indices.npy")
+
+    # A smaller number of neighbours is read from the cached graph.
+    monkeypatch.delattr(BruteForceKNN, "query")
+    cached_indices, cached_distances = knn.get_neighbours(str(tmp_path), 5)
+    np.testing.assert_array_equal(cached_indices, indices[:, :5])
+    np.testing.assert_array_equal(cached_distances, distances[:, :5])
+
+
+def test_get_neighbours_stale_cache(example_features, tmp_path):
+    np.save(f"{tmp_path}/features.npy", example_features)
+    BruteForceKNN(block_size=16).get_neighbours(str(tmp_path), 8)
+
+    # The cached graph is not reused for another configuration of the backend.
+    knn = BruteForceKNN(block_size=32)
+    indices, _ = knn.get_neighbours(str(tmp_path), 5)
+    assert os.path.exists(f"{tmp_path}/knn/brute_force_euclidean_k5/indices.npy")
+
+    # Nor for features that were rewritten since.
+    np.save(f"{tmp_path}/features.npy", example_features[::-1])
+    os.utime(f"{tmp_path}/features.npy", ns=(0, 0))
+    new_indices, _ = knn.get_neighbours(str(tmp_path), 5)
+    np.testing.assert_array_equal(new_indices, len(indices) - 1 - indices[::-1])
@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from sklearn.datasets import make_blobs
+from sklearn.metrics import adjusted_rand_score
+
+from src.clustering.aroc.aroc_clustering import AROClustering
+from src.clustering.aroc.partitioned_aroc_clustering import (
+    PartitionedAROClustering,
+    _get_blocks,
+)
+
+
+@pytest.fixture
+def example_features_dir(tmp_path):
+    features, _ = make_blobs(2000, 8, centers=20, random_state=0)
+    np.save(f"{tmp_path}/features.npy", features.astype(np.float32))
+    return str(tmp_path)
+
+
+def test_get_blocks():
+    sample_partitions = np.array([[1, -1], [0, 2], [2, 1], [1, 0]])
+
+    blocks = _get_blocks(sample_partitions, n_partitions=4)
+
+    assert [block.tolist() for block in blocks] == [[1, 3], [0, 2, 3], [1, 2], []]
+
+
+@pytest.mark.parametrize("n_partitions, num_proc", [(4, 1), (30, 2)])
+def test_cluster(example_features_dir, n_partitions, num_proc):
+    cluster_labels = AROClustering(40, 1.5, 5, num_proc=1).cluster(example_features_dir)
+
+    clustering = PartitionedAROClustering(
+        40, 1.5, 5, n_partitions, chunk_size=500, num_proc=num_proc
+    )
+    partitioned_cluster_labels = clustering.cluster(example_features_dir)
+
+    assert adjusted_rand_score(cluster_labels, partitioned_cluster_labels) > 0.95
+    assert sum(clustering.block_sizes) >= 2000
+
+
+def test_cluster_memmap_in_processes(example_features_dir):
+    clustering = PartitionedAROClustering(40, 1.5, 5, 4, chunk_size=500, num_proc=2)
+    cluster_labels = clustering.cluster(example_features_dir)
+
+    memmap = np.load(f"{example_features_dir}/features.npy", mmap_mode="r")
+    np.testing.assert_array_equal(clustering.cluster(memmap), cluster_labels)
+
+
+def test_cluster_more_partitions_than_chunk_size(example_features_dir):
+    clustering = PartitionedAROClustering(10, 1.5, 5, 150, chunk_size=100, num_proc=1)
+    cluster_labels = clustering.cluster(example_features_dir)
+
+    assert cluster_labels.shape == (2000,)
+    assert sum(clustering.block_sizes) >= 2000
+
+
+def test_assign_and_save_and_load_model(example_features_dir, tmp_path):
+    clustering = PartitionedAROClustering(40, 1.5, 5, 4, chunk_size=500, num_proc=1)
+    cluster_labels = clustering.cluster(example_features_dir)
+    features = np.load(f"{example_features_dir}/features.npy")
+
+    np.testing.assert_array_equal(
+        clustering.assign(features[:20] + 0.01), cluster_labels[:20]
+    )
+
+    clustering.save_model(f"{tmp_path}/model")
+    loaded_clustering = PartitionedAROClustering(40, 1.5, 5, 4)
+    loaded_clustering.load_model(f"{tmp_path}/model")
+
+    np.testing.assert_array_equal(
+        loaded_clustering.assign(features[20:40]), clustering.assign(features[20:40])
+    )
+    assert loaded_clustering.cluster_labels.shape == (2040,)
+
+
+def test_save_model_loaded_features(example_features_dir, tmp_path):
+    clustering = PartitionedAROClustering(40, 1.5, 5, 4, chunk_size=500, num_proc=1)
+    clustering.cluster(np.load(f"{example_features_dir}/features.npy"))
+
+    with pytest.raises(ValueError):
+        clustering.save_model(f"{tmp_path}/model")
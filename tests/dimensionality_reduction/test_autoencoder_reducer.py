@@ -0,0 +1,206 @@
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+
+from src.dimensionality_reduction.autoencoder.autoencoder_reducer import (
+    AutoencoderReducer,
+    reduce_dimensions_jointly,
+)
+from src.dimensionality_reduction.autoencoder.numpy_autoencoder import (
+    NumpyDeepAutoencoder,
+    NumpySparseAutoencoder,
+)
+
+
+@pytest.fixture
+def example_features_dir(tmp_path):
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(200, 3)) @ rng.normal(size=(3, 12))
+    np.save(f"{tmp_path}/features.npy", features)
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize(
+    "get_autoencoder",
+    [
+        lambda: NumpyDeepAutoencoder([8, 3], output_dim=12, random_state=0),
+        lambda: NumpySparseAutoencoder(
+            latent_dim=3, output_dim=12, lambda_=0.0001, beta=2, p=0.1, random_state=0
+        ),
+    ],
+)
+def test_reduce_dimensions_numpy(example_features_dir, get_autoencoder):
+    autoencoder = get_autoencoder()
+    reducer = AutoencoderReducer(autoencoder, "adam", "mse", random_state=0)
+    reduced_features = reducer.reduce_dimensions(
+        example_features_dir, epochs=30, batch_size=16
+    )
+
+    assert reduced_features.shape == (200, 3)
+    assert reduced_features.dtype == np.float32
+    assert reducer.stopped_epoch == 30
+
+    scaled_features = reducer.min_max_scaler.transform(
+        np.load(f"{example_features_dir}/features.npy")
+    )
+    initial_loss = get_autoencoder().compute_loss(scaled_features)
+    assert autoencoder.compute_loss(scaled_features) < initial_loss
+
+
+def test_reduce_dimensions_numpy_early_stopping(example_features_dir):
+    autoencoder = NumpyDeepAutoencoder([3], output_dim=12, random_state=0)
+    autoencoder.learning_rate = 1.0
+    reducer = AutoencoderReducer(autoencoder, "adam", "mse", random_state=0)
+    reducer.reduce_dimensions(example_features_dir, epochs=50, patience=2)
+
+    assert reducer.stopped_epoch < 50
+    assert reducer.stopped_epoch - reducer.best_epoch == 2
+
+
+def test_reduce_dimensions_jointly_numpy(example_features_dir):
+    reducers = [
+        AutoencoderReducer(
+            NumpyDeepAutoencoder(layer_dims, output_dim=12, random_state=0),
+            "adam",
+            "mse",
+            random_state=0,
+        )
+        for layer_dims in [[3], [8, 3]]
+    ]
+    all_reduced_features = reduce_dimensions_jointly(
+        reducers, example_features_dir, epochs=5, batch_size=16
+    )
+
+    features = np.load(f"{example_features_dir}/features.npy")
+    for reducer, reduced_features in zip(reducers, all_reduced_features):
+        assert reduced_features.shape == (200, 3)
+        assert reducer.min_max_scaler is reducers[0].min_max_scaler
+        assert reducer.stopped_epoch == 5
+        assert len(reducer.epoch_times) == 5
+        assert 1 <= reducer.best_epoch <= reducer.stopped_epoch
+        np.testing.assert_allclose(
+            reducer.transform(features), reduced_features, rtol=1e-5, atol=1e-6
+        )
+
+    # Training jointly matches training each reducer on its own with the same split
+    # and the same batches.
+    reducer = AutoencoderReducer(
+        NumpyDeepAutoencoder([8, 3], output_dim=12, random_state=0),
+        "adam",
+        "mse",
+        random_state=0,
+    )
+    np.testing.assert_allclose(
+        reducer.reduce_dimensions(example_features_dir, epochs=5, batch_size=16),
+        all_reduced_features[1],
+        rtol=1e-5,
+        atol=1e-6,
+    )
+
+
+def test_reduce_dimensions_jointly_numpy_early_stopping(example_features_dir):
+    autoencoders = [
+        NumpyDeepAutoencoder([3], output_dim=12, random_state=0),
+        NumpyDeepAutoencoder([8, 3], output_dim=12, random_state=0),
+    ]
+    for autoencoder in autoencoders:
+        autoencoder.learning_rate = 1.0
+    reducers = [
+        AutoencoderReducer(autoencoder, "adam", "mse", random_state=0)
+        for autoencoder in autoencoders
+    ]
+    reduce_dimensions_jointly(reducers, example_features_dir, epochs=50, patience=2)
+
+    stopped_epoch = reducers[0].stopped_epoch
+    assert stopped_epoch < 50
+    assert max(reducer.best_epoch for reducer in reducers) == stopped_epoch - 2
+
+
+def test_save_and_load_model_numpy(example_features_dir, tmp_path):
+    reducer = AutoencoderReducer(
+        NumpyDeepAutoencoder([8, 3], output_dim=12, random_state=0),
+        "adam",
+        "mse",
+        random_state=0,
+    )
+    reduced_features = reducer.reduce_dimensions(example_features_dir, epochs=2)
+    reducer.save_model(f"{tmp_path}/model")
+
+    loaded_reducer = AutoencoderReducer(
+        NumpyDeepAutoencoder([8, 3], output_dim=12, random_state=1), "adam", "mse"
+    )
+    loaded_reducer.load_model(f"{tmp_path}/model")
+    features = np.load(f"{example_features_dir}/features.npy")
+    np.testing.assert_allclose(
+        loaded_reducer.transform(features), reduced_features, rtol=1e-5, atol=1e-6
+    )
+
+
+def test_numpy_backend_does_not_import_tensorflow(example_features_dir):
+    code = (
+        "import sys\n"
+        "from src.dimensionality_reduction.autoencoder.autoencoder_reducer import "
+        "AutoencoderReducer\n"
+        "from src.dimensionality_reduction.autoencoder.numpy_autoencoder import "
+        "NumpyDeepAutoencoder\n"
+        "reducer = AutoencoderReducer(NumpyDeepAutoencoder([3], 12), 'adam', 'mse')\n"
+        f"reducer.reduce_dimensions('{example_features_dir}', epochs=1)\n"
+        "assert 'tensorflow' not in sys.modules\n"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+
+def test_reduce_dimensions_keras(example_features_dir, tmp_path):
+    pytest.importorskip("tensorflow")
+    from src.dimensionality_reduction.autoencoder.deep_autoencoder import (
+        DeepAutoencoder,
+    )
+
+    reducer = AutoencoderReducer(
+        DeepAutoencoder([8, 3], output_dim=12), "adam", "mse", random_state=0
+    )
+    reduced_features = reducer.reduce_dimensions(
+        example_features_dir, epochs=3, batch_size=16, patience=2
+    )
+    reducer.save_model(f"{tmp_path}/model")
+
+    assert reduced_features.shape == (200, 3)
+    assert 1 <= reducer.best_epoch <= reducer.stopped_epoch <= 3
+    assert len(reducer.epoch_times) == reducer.stopped_epoch
+
+    loaded_reducer = AutoencoderReducer(
+        DeepAutoencoder([8, 3], output_dim=12), "adam", "mse"
+    )
+    loaded_reducer.load_model(f"{tmp_path}/model")
+    features = np.load(f"{example_features_dir}/features.npy")
+    np.testing.assert_allclose(
+        loaded_reducer.transform(features), reduced_features, rtol=1e-5, atol=1e-6
+    )
+
+
+def test_reduce_dimensions_jointly(example_features_dir):
+    pytest.importorskip("tensorflow")
+    from src.dimensionality_reduction.autoencoder.deep_autoencoder import (
+        DeepAutoencoder,
+    )
+
+    reducers = [
+        AutoencoderReducer(
+            DeepAutoencoder(layer_dims, output_dim=12), "adam", "mse", random_state=0
+        )
+        for layer_dims in [[3], [8, 3]]
+    ]
+    all_reduced_features = reduce_dimensions_jointly(
+        reducers, example_features_dir, epochs=3, batch_size=16, patience=2
+    )
+
+    features = np.load(f"{example_features_dir}/features.npy")
+    for reducer, reduced_features in zip(reducers, all_reduced_features):
+        assert reduced_features.shape == (200, 3)
+        assert reducer.min_max_scaler is reducers[0].min_max_scaler
+        assert 1 <= reducer.best_epoch <= reducer.stopped_epoch <= 3
+        np.testing.assert_allclose(
+            reducer.transform(features), reduced_features, rtol=1e-5, atol=1e-6
+        )
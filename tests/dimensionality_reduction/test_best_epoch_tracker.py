@@ -0,0 +1,36 @@
+import numpy as np
+
+from src.dimensionality_reduction.autoencoder.best_epoch_tracker import (
+    BestEpochTracker,
+)
+
+
+def test_best_epoch_tracker():
+    tracker = BestEpochTracker(2, patience=2)
+    weights = [[np.zeros(1)], [np.zeros(1)]]
+    val_losses = [(1.0, 1.0), (0.5, 2.0), (0.7, 0.8), (0.6, 0.9), (0.6, 0.9), (0, 0)]
+
+    stopped_epoch = None
+    for epoch, epoch_val_losses in enumerate(val_losses, start=1):
+        for model_weights in weights:
+            model_weights[0] = np.array([epoch])
+        if tracker.update(
+            epoch, list(epoch_val_losses), lambda i: [w.copy() for w in weights[i]]
+        ):
+            stopped_epoch = epoch
+            break
+    tracker.restore(lambda i, best_weights: weights.__setitem__(i, best_weights))
+
+    assert stopped_epoch == 5
+    assert tracker.best_epochs == [2, 3]
+    assert tracker.best_val_losses == [0.5, 0.8]
+    assert [model_weights[0][0] for model_weights in weights] == [2, 3]
+
+
+def test_best_epoch_tracker_without_patience():
+    tracker = BestEpochTracker(1, patience=None)
+
+    stops = [tracker.update(epoch, [1.0], lambda i: []) for epoch in range(1, 10)]
+
+    assert not any(stops)
+    assert tracker.best_epochs == [1]
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("tensorflow")
+
+from src.dimensionality_reduction.autoencoder.deep_autoencoder import DeepAutoencoder
+from src.dimensionality_reduction.autoencoder.keras_training import (
+    AutoencoderGrid,
+    TrainingMonitor,
+)
+
+
+class ExampleModel:
+    def __init__(self):
+        self.weights = [np.zeros(1)]
+        self.stop_training = False
+
+    def get_weights(self):
+        return [w.copy() for w in self.weights]
+
+    def set_weights(self, weights):
+        self.weights = weights
+
+
+def test_autoencoder_grid():
+    autoencoders = [
+        DeepAutoencoder([3], output_dim=12),
+        DeepAutoencoder([8, 3], output_dim=12),
+    ]
+    grid = AutoencoderGrid(autoencoders, ["a", "b"])
+    inputs = np.random.default_rng(0).uniform(size=(5, 12)).astype(np.float32)
+
+    outputs = grid(inputs)
+
+    assert set(outputs) == {"a", "b"}
+    for name, autoencoder in zip(["a", "b"], autoencoders):
+        np.testing.assert_allclose(
+            outputs[name].numpy(), autoencoder(inputs).numpy(), rtol=1e-6
+        )
+
+
+def test_training_monitor():
+    models = [ExampleModel(), ExampleModel()]
+    monitor = TrainingMonitor(2, ["val_a_loss", "val_b_loss"], models)
+    monitor.set_model(ExampleModel())
+    val_losses = [(1.0, 1.0), (0.5, 2.0), (0.7, 0.8), (0.6, 0.9), (0.6, 0.9), (0, 0)]
+
+    for epoch, (val_a_loss, val_b_loss) in enumerate(val_losses):
+        for model in models:
+            model.weights = [np.array([epoch])]
+        monitor.on_epoch_begin(epoch)
+        monitor.on_epoch_end(
+            epoch, {"val_a_loss": val_a_loss, "val_b_loss": val_b_loss}
+        )
+        if monitor.model.stop_training:
+            break
+    monitor.on_train_end()
+
+    assert len(monitor.epoch_times) == 5
+    assert monitor.tracker.best_epochs == [2, 3]
+    assert monitor.tracker.best_val_losses == [0.5, 0.8]
+    assert [model.weights[0][0] for model in models] == [1, 2]
@@ -0,0 +1,93 @@
+import json
+
+import numpy as np
+import pytest
+
+from src.dimensionality_reduction.pca_reducer import PCAReducer
+
+
+@pytest.fixture
+def example_features_dir(tmp_path):
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(50, 8)) * np.array([50, 20, 8, 1, 1, 1, 1, 1])
+    np.save(f"{tmp_path}/features.npy", features)
+    return str(tmp_path)
+
+
+def test_save_reduced_features_sweep(example_features_dir, tmp_path):
+    reducer = PCAReducer([2, 5])
+    reducer.reduce_dimensions(example_features_dir)
+    reducer.save_reduced_features_sweep([f"{tmp_path}/run_0", f"{tmp_path}/run_1"])
+
+    for i, n_components in enumerate([2, 5]):
+        single_reducer = PCAReducer(n_components)
+        expected_reduced_features = single_reducer.reduce_dimensions(
+            example_features_dir
+        )
+        actual_reduced_features = np.load(f"{tmp_path}/run_{i}/features.npy")
+        np.testing.assert_allclose(
+            np.abs(actual_reduced_features), np.abs(expected_reduced_features)
+        )
+
+        with open(f"{tmp_path}/run_{i}/reducer_config.json", mode="r") as f:
+            actual_config = json.load(f)
+        assert actual_config["n_components"] == n_components
+        assert len(actual_config["explained_variance_ratio"]) == 5
+        assert actual_config["cumulative_explained_variance_ratios"] == pytest.approx(
+            {
+                "2": reducer.pca.explained_variance_ratio_[:2].sum(),
+                "5": reducer.pca.explained_variance_ratio_[:5].sum(),
+            }
+        )
+        assert actual_config["cumulative_explained_variance_ratios"][
+            str(n_components)
+        ] == pytest.approx(single_reducer.get_explained_variance())
+
+
+@pytest.mark.parametrize("solver", ["incremental", "randomized"])
+def test_reduce_dimensions_streaming(example_features_dir, solver):
+    expected_reducer = PCAReducer(3)
+    expected_reduced_features = expected_reducer.reduce_dimensions(example_features_dir)
+
+    reducer = PCAReducer(3, solver=solver, chunk_size=7)
+    actual_reduced_features = reducer.reduce_dimensions(example_features_dir)
+
+    np.testing.assert_allclose(
+        np.abs(actual_reduced_features), np.abs(expected_reduced_features), atol=0.1
+    )
+    np.testing.assert_allclose(
+        reducer.get_explained_variance(),
+        expected_reducer.get_explained_variance(),
+        rtol=1e-3,
+    )
+    assert reducer.get_config()["solver"] == solver
+    assert reducer.get_config()["chunk_size"] == 7
+
+
+def test_reduce_dimensions_incremental_small_chunks(example_features_dir):
+    expected_reducer = PCAReducer(6)
+    expected_reducer.reduce_dimensions(example_features_dir)
+
+    reducer = PCAReducer(6, solver="incremental", chunk_size=4)
+    reduced_features = reducer.reduce_dimensions(example_features_dir)
+
+    assert reduced_features.shape == (50, 6)
+    np.testing.assert_allclose(
+        reducer.get_explained_variance(),
+        expected_reducer.get_explained_variance(),
+        rtol=1e-3,
+    )
+
+
+def test_save_and_load_model(example_features_dir, tmp_path):
+    reducer = PCAReducer(3).fit(example_features_dir)
+    reducer.save_model(f"{tmp_path}/model")
+
+    new_features = np.random.default_rng(1).normal(size=(4, 8))
+    loaded_reducer = PCAReducer(2)
+    loaded_reducer.load_model(f"{tmp_path}/model")
+
+    np.testing.assert_allclose(
+        loaded_reducer.transform(new_features),
+        reducer.pca.transform(new_features)[:, :2],
+    )
@@ -0,0 +1,54 @@
+import json
+
+import numpy as np
+import pytest
+from sklearn.random_projection import johnson_lindenstrauss_min_dim
+
+from src.dimensionality_reduction.random_projection_reducer import (
+    RandomProjectionReducer,
+    get_jl_eps,
+)
+
+
+@pytest.fixture
+def example_features_dir(tmp_path):
+    rng = np.random.default_rng(0)
+    features = rng.normal(size=(300, 400)).astype(np.float32)
+    np.save(f"{tmp_path}/features.npy", features)
+    return str(tmp_path)
+
+
+def test_reduce_dimensions(example_features_dir, tmp_path):
+    reducer = RandomProjectionReducer(100, chunk_size=64)
+    reduced_features = reducer.reduce_dimensions(example_features_dir)
+    features = np.load(f"{example_features_dir}/features.npy")
+
+    assert reduced_features.shape == (300, 100)
+    assert reduced_features.dtype == np.float32
+    np.testing.assert_allclose(
+        reduced_features, reducer.transform(features), rtol=1e-5, atol=1e-5
+    )
+    assert 0 < reducer.mean_distortion <= reducer.max_distortion
+
+    reducer.save_reduced_features(f"{tmp_path}/run_0")
+    with open(f"{tmp_path}/run_0/reducer_config.json", mode="r") as f:
+        config = json.load(f)
+    assert config["jl_eps"] == reducer.jl_eps
+    assert config["max_distortion"] == reducer.max_distortion
+
+
+def test_save_and_load_model(example_features_dir, tmp_path):
+    reducer = RandomProjectionReducer(20, random_state=1)
+    reduced_features = reducer.reduce_dimensions(example_features_dir)
+    reducer.save_model(f"{tmp_path}/model")
+
+    loaded_reducer = RandomProjectionReducer(20)
+    loaded_reducer.load_model(f"{tmp_path}/model")
+    features = np.load(f"{example_features_dir}/features.npy")
+    np.testing.assert_allclose(loaded_reducer.transform(features), reduced_features)
+
+
+def test_get_jl_eps():
+    eps = get_jl_eps(10000, 2000)
+    assert johnson_lindenstrauss_min_dim(10000, eps=eps) == 2000
+    assert get_jl_eps(10000, 10) is None
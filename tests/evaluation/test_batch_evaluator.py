@@ -0,0 +1,90 @@
+import json
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.evaluation.batch_evaluator import BatchEvaluator
+from src.evaluation.evaluator import Evaluator
+
+
+@pytest.fixture
+def example_run_folder_paths(tmp_path):
+    rng = np.random.default_rng(0)
+    image_names = [f"image_{i}.png" for i in range(200)]
+    ground_truth_df = pd.DataFrame(
+        {
+            "image_name": list(rng.choice(image_names, size=80, replace=False)),
+            "integer_label": rng.integers(4, size=80),
+        }
+    )
+    with open(f"{tmp_path}/image_names.pickle", mode="wb") as f:
+        pickle.dump(image_names, f)
+    np.save(f"{tmp_path}/features.npy", rng.normal(size=(200, 4)))
+    ground_truth_df.to_csv(f"{tmp_path}/clean_labels.csv", index=False)
+
+    run_folder_paths = []
+    for i in range(5):
+        run_folder_path = tmp_path / "clustering" / "kmeans" / f"run_{i}"
+        run_folder_path.mkdir(parents=True)
+        np.save(
+            f"{run_folder_path}/cluster_labels.npy",
+            rng.integers(-1, 3 + i, size=200).astype(np.float64),
+        )
+        run_folder_paths.append(str(run_folder_path))
+    return run_folder_paths
+
+
+def _get_batch_evaluator(run_folder_paths, n_jobs):
+    folder_path = run_folder_paths[0].rsplit("/", 3)[0]
+    return BatchEvaluator(
+        do_internal=True,
+        do_external=True,
+        features_path=f"{folder_path}/features.npy",
+        image_names_path=f"{folder_path}/image_names.pickle",
+        ground_truth_path=f"{folder_path}/clean_labels.csv",
+        use_distance_cache=True,
+        n_jobs=n_jobs,
+    )
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_compute_metrics(example_run_folder_paths, n_jobs):
+    batch_evaluator = _get_batch_evaluator(example_run_folder_paths, n_jobs)
+    scores = batch_evaluator.compute_metrics(example_run_folder_paths)
+
+    folder_path = example_run_folder_paths[0].rsplit("/", 3)[0]
+    for run_folder_path, run_scores in zip(example_run_folder_paths, scores):
+        evaluator = Evaluator(
+            do_internal=True,
+            do_external=True,
+            features_path=f"{folder_path}/features.npy",
+            cluster_labels_folder_path=run_folder_path,
+            image_names_path=f"{folder_path}/image_names.pickle",
+            ground_truth_path=f"{folder_path}/clean_labels.csv",
+        )
+        evaluator.compute_metrics()
+        assert run_scores.keys() == evaluator.scores.keys()
+        assert run_scores["f1"] == evaluator.scores["f1"]
+        assert run_scores["silhouette"] == pytest.approx(evaluator.scores["silhouette"])
+
+
+def test_save(example_run_folder_paths):
+    batch_evaluator = _get_batch_evaluator(example_run_folder_paths, 1)
+    scores = batch_evaluator.compute_metrics(example_run_folder_paths)
+    batch_evaluator.save_metrics()
+    results_path = f"{example_run_folder_paths[0]}/../results.csv"
+    batch_evaluator.save_results(results_path, ["cluster_count", "f1"])
+
+    with open(f"{example_run_folder_paths[2]}/metrics.json", mode="r") as f:
+        assert json.load(f)["f1"] == str(scores[2]["f1"])
+    results_df = pd.read_csv(results_path)
+    assert list(results_df.columns) == ["name", "cluster_count", "f1"]
+    assert list(results_df["name"]) == [f"run_{i}" for i in range(5)]
+    np.testing.assert_allclose(results_df["f1"], [s["f1"] for s in scores])
+
+
+def test_save_before_compute(example_run_folder_paths):
+    with pytest.raises(ValueError):
+        _get_batch_evaluator(example_run_folder_paths, 1).save_results("results.csv")
@@ -0,0 +1,89 @@
+import os
+
+import numpy as np
+import pytest
+from sklearn.metrics import euclidean_distances, silhouette_score
+
+from src.evaluation.distance_cache import DistanceCache
+from src.evaluation.internal_metrics import internal_scores
+
+
+@pytest.fixture
+def example_features_path(tmp_path):
+    rng = np.random.default_rng(0)
+    np.save(f"{tmp_path}/features.npy", rng.normal(size=(230, 6)).astype(np.float32))
+    return f"{tmp_path}/features.npy"
+
+
+def test_load(example_features_path):
+    distance_cache = DistanceCache(example_features_path, block_size=64)
+    distances = distance_cache.load()
+    features = np.load(example_features_path)
+
+    assert distances.dtype == np.float32
+    np.testing.assert_allclose(
+        distances, euclidean_distances(features), rtol=1e-5, atol=1e-5
+    )
+    np.testing.assert_array_equal(np.diag(distances), 0)
+    np.testing.assert_array_equal(distances, distances.T)
+
+
+def test_load_persisted(example_features_path):
+    DistanceCache(example_features_path, block_size=64).load()
+    cache_path = f"{os.path.dirname(example_features_path)}/distance_cache"
+    assert os.listdir(cache_path) == ["distances_float32.npy"]
+    modified_time = os.path.getmtime(f"{cache_path}/distances_float32.npy")
+
+    distances = DistanceCache(example_features_path, block_size=64).load()
+    assert os.path.getmtime(f"{cache_path}/distances_float32.npy") == modified_time
+    assert distances.shape == (230, 230)
+
+
+def test_load_max_bytes(example_features_path):
+    assert DistanceCache(example_features_path, max_bytes=230**2).load() is None
+    float16_cache = DistanceCache(example_features_path, max_bytes=230**2 * 2)
+    assert float16_cache.load().dtype == np.float16
+
+
+def test_internal_scores_distance_cache(example_features_path):
+    features = np.load(example_features_path)
+    cluster_labels = np.random.default_rng(1).integers(4, size=230)
+    feature_idx = np.flatnonzero(cluster_labels != 0)
+    distance_cache = DistanceCache(example_features_path, block_size=50)
+
+    scores = internal_scores(
+        features,
+        cluster_labels[feature_idx],
+        distance_cache=distance_cache,
+        feature_idx=feature_idx,
+    )
+    assert scores["silhouette"] == pytest.approx(
+        silhouette_score(features[feature_idx], cluster_labels[feature_idx]),
+        abs=1e-5,
+    )
+    sampled_scores = internal_scores(
+        features,
+        cluster_labels[feature_idx],
+        sample_size=60,
+        distance_cache=distance_cache,
+        feature_idx=feature_idx,
+    )
+    assert sampled_scores["silhouette"] == pytest.approx(
+        internal_scores(
+            features[feature_idx], cluster_labels[feature_idx], sample_size=60
+        )["silhouette"],
+        abs=1e-5,
+    )
+
+
+def test_load_rewritten_features(example_features_path):
+    distance_cache = DistanceCache(example_features_path, block_size=64)
+    distance_cache.load()
+    features = 2 * np.load(example_features_path)
+    np.save(example_features_path, features)
+    modified_time = os.path.getmtime(example_features_path) + 10
+    os.utime(example_features_path, (modified_time, modified_time))
+
+    np.testing.assert_allclose(
+        distance_cache.load(), euclidean_distances(features), rtol=1e-5, atol=1e-4
+    )
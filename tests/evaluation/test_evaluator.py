@@ -0,0 +1,152 @@
+import json
+import os
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.evaluation import metrics
+from src.evaluation.evaluator import Evaluator
+
+
+@pytest.fixture
+def example_evaluation_paths(tmp_path):
+    rng = np.random.default_rng(0)
+    image_names = [f"image_{i}.png" for i in range(300)]
+    features = rng.normal(size=(300, 4))
+    cluster_labels = rng.integers(-1, 5, size=300).astype(np.float64)
+    # Ground truth rows in a shuffled order, with images that have no features.
+    ground_truth_names = list(rng.choice(image_names, size=120, replace=False)) + [
+        "missing_0.png",
+        "missing_1.png",
+    ]
+    ground_truth_df = pd.DataFrame(
+        {
+            "image_name": ground_truth_names,
+            "integer_label": rng.integers(4, size=len(ground_truth_names)),
+        }
+    )
+
+    with open(f"{tmp_path}/image_names.pickle", mode="wb") as f:
+        pickle.dump(image_names, f)
+    np.save(f"{tmp_path}/features.npy", features)
+    np.save(f"{tmp_path}/cluster_labels.npy", cluster_labels)
+    ground_truth_df.to_csv(f"{tmp_path}/clean_labels.csv", index=False)
+    return str(tmp_path)
+
+
+def _get_evaluator(folder_path, do_internal, silhouette_sample_size=None):
+    return Evaluator(
+        do_internal=do_internal,
+        do_external=True,
+        features_path=f"{folder_path}/features.npy",
+        cluster_labels_folder_path=folder_path,
+        image_names_path=f"{folder_path}/image_names.pickle",
+        ground_truth_path=f"{folder_path}/clean_labels.csv",
+        silhouette_sample_size=silhouette_sample_size,
+    )
+
+
+def test_compute_metrics(example_evaluation_paths):
+    evaluator = _get_evaluator(example_evaluation_paths, do_internal=False)
+    evaluator.compute_metrics()
+
+    with open(f"{example_evaluation_paths}/image_names.pickle", mode="rb") as f:
+        image_idx = {name: i for i, name in enumerate(pickle.load(f))}
+    cluster_labels = np.load(f"{example_evaluation_paths}/cluster_labels.npy")
+    ground_truth_df = pd.read_csv(f"{example_evaluation_paths}/clean_labels.csv")
+    rows = [
+        (image_idx[name], label)
+        for name, label in zip(
+            ground_truth_df["image_name"], ground_truth_df["integer_label"]
+        )
+        if name in image_idx and cluster_labels[image_idx[name]] != -1
+    ]
+    expected_cluster_labels = cluster_labels[[i for i, _ in rows]]
+    expected_actual_labels = np.array([label for _, label in rows])
+
+    assert evaluator.features is None
+    np.testing.assert_array_equal(
+        evaluator.test_image_cluster_labels, expected_cluster_labels
+    )
+    np.testing.assert_array_equal(
+        evaluator.test_image_actual_labels, expected_actual_labels
+    )
+    assert evaluator.scores["test_image_count"] == len(rows)
+    assert evaluator.scores["f1"] == metrics.pairwise_f1(
+        expected_actual_labels, expected_cluster_labels
+    )
+    assert evaluator.scores["cluster_count"] == 5
+
+
+def test_compute_metrics_internal(example_evaluation_paths):
+    evaluator = _get_evaluator(example_evaluation_paths, do_internal=True)
+    evaluator.compute_metrics()
+    evaluator.save_metrics()
+
+    assert isinstance(evaluator.features, np.memmap)
+    with open(f"{example_evaluation_paths}/metrics.json", mode="r") as f:
+        scores = json.load(f)
+    assert "silhouette" in scores and "davies_bouldin" in scores
+    assert scores["silhouette_sample_size"] == "None"
+
+
+def test_compute_metrics_internal_sample(example_evaluation_paths):
+    evaluator = _get_evaluator(
+        example_evaluation_paths, do_internal=True, silhouette_sample_size=50
+    )
+    evaluator.compute_metrics()
+    evaluator.save_metrics()
+
+    with open(f"{example_evaluation_paths}/metrics.json", mode="r") as f:
+        scores = json.load(f)
+    assert scores["silhouette_sample_size"] == "50"
+    assert scores["silhouette_random_state"] == "0"
+    assert float(scores["silhouette_ci_low"]) <= float(scores["silhouette"])
+    assert float(scores["silhouette"]) <= float(scores["silhouette_ci_high"])
+
+
+def test_compute_metrics_distance_cache(example_evaluation_paths):
+    evaluator = _get_evaluator(example_evaluation_paths, do_internal=True)
+    evaluator.compute_metrics()
+    cached_evaluator = _get_evaluator(example_evaluation_paths, do_internal=True)
+    cached_evaluator.use_distance_cache = True
+    cached_evaluator.compute_metrics()
+
+    assert os.path.exists(
+        f"{example_evaluation_paths}/distance_cache/distances_float32.npy"
+    )
+    assert cached_evaluator.scores["silhouette"] == pytest.approx(
+        evaluator.scores["silhouette"]
+    )
+
+
+def test_compute_metrics_bootstrap(example_evaluation_paths):
+    evaluator = _get_evaluator(example_evaluation_paths, do_internal=False)
+    evaluator.n_bootstrap = 200
+    evaluator.compute_metrics()
+    evaluator.save_metrics()
+
+    with open(f"{example_evaluation_paths}/metrics.json", mode="r") as f:
+        scores = json.load(f)
+    assert scores["n_bootstrap"] == "200"
+    for name in ["precision", "recall", "f1"]:
+        assert float(scores[f"{name}_ci_low"]) <= float(scores[f"{name}_ci_high"])
+
+
+def test_compute_metrics_rewritten_ground_truth(example_evaluation_paths):
+    evaluator = _get_evaluator(example_evaluation_paths, do_internal=False)
+    evaluator.compute_metrics()
+    ground_truth_df = pd.read_csv(f"{example_evaluation_paths}/clean_labels.csv")
+    ground_truth_df = ground_truth_df.iloc[:50]
+    ground_truth_df.to_csv(f"{example_evaluation_paths}/clean_labels.csv", index=False)
+
+    evaluator = _get_evaluator(example_evaluation_paths, do_internal=False)
+    evaluator.compute_metrics()
+    assert len(evaluator.test_image_actual_labels) == np.count_nonzero(
+        np.load(f"{example_evaluation_paths}/cluster_labels.npy")[
+            [int(name[6:-4]) for name in ground_truth_df["image_name"]]
+        ]
+        != -1
+    )
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+from sklearn.metrics import davies_bouldin_score, silhouette_score
+
+from src.evaluation.internal_metrics import (
+    _get_strata,
+    _stratified_sample,
+    internal_scores,
+)
+
+
+@pytest.fixture
+def example_features_and_labels():
+    rng = np.random.default_rng(0)
+    centers = rng.normal(scale=4, size=(6, 5))
+    cluster_labels = rng.integers(6, size=500)
+    features = centers[cluster_labels] + rng.normal(size=(500, 5))
+    # A singleton cluster, whose silhouette coefficient is 0.
+    cluster_labels[0] = 6
+    return features, cluster_labels
+
+
+@pytest.mark.parametrize("block_size", [7, 64, 1024])
+def test_internal_scores(example_features_and_labels, block_size):
+    features, cluster_labels = example_features_and_labels
+    scores = internal_scores(features, cluster_labels, block_size=block_size)
+
+    assert scores["silhouette"] == pytest.approx(
+        silhouette_score(features, cluster_labels)
+    )
+    assert scores["davies_bouldin"] == pytest.approx(
+        davies_bouldin_score(features, cluster_labels)
+    )
+    assert "silhouette_ci_low" not in scores
+
+
+def test_internal_scores_memmap(example_features_and_labels, tmp_path):
+    features, cluster_labels = example_features_and_labels
+    np.save(f"{tmp_path}/features.npy", features.astype(np.float32))
+    features = np.load(f"{tmp_path}/features.npy", mmap_mode="r")
+    scores = internal_scores(features, cluster_labels, block_size=100)
+
+    assert scores["silhouette"] == pytest.approx(
+        silhouette_score(features, cluster_labels), abs=1e-5
+    )
+
+
+def test_internal_scores_feature_idx(example_features_and_labels, tmp_path):
+    features, cluster_labels = example_features_and_labels
+    np.save(f"{tmp_path}/features.npy", features)
+    feature_idx = np.flatnonzero(cluster_labels != 1)
+    scores = internal_scores(
+        np.load(f"{tmp_path}/features.npy", mmap_mode="r"),
+        cluster_labels[feature_idx],
+        block_size=64,
+        feature_idx=feature_idx,
+    )
+
+    assert scores["silhouette"] == pytest.approx(
+        silhouette_score(features[feature_idx], cluster_labels[feature_idx])
+    )
+    assert scores["davies_bouldin"] == pytest.approx(
+        davies_bouldin_score(features[feature_idx], cluster_labels[feature_idx])
+    )
+
+
+def test_internal_scores_sample(example_features_and_labels):
+    features, cluster_labels = example_features_and_labels
+    scores = internal_scores(
+        features, cluster_labels, block_size=64, sample_size=200, random_state=1
+    )
+    same_scores = internal_scores(
+        features, cluster_labels, block_size=32, sample_size=200, random_state=1
+    )
+
+    assert scores["silhouette"] == pytest.approx(same_scores["silhouette"])
+    assert (
+        scores["silhouette_ci_low"]
+        <= silhouette_score(features, cluster_labels)
+        <= scores["silhouette_ci_high"]
+    )
+    assert scores["davies_bouldin"] == pytest.approx(
+        davies_bouldin_score(features, cluster_labels)
+    )
+
+
+def test_internal_scores_one_cluster():
+    with pytest.raises(ValueError):
+        internal_scores(np.zeros((10, 2)), np.zeros(10))
+
+
+def test_internal_scores_sample_coverage():
+    # Many small clusters, most of which are too small for two sampled samples.
+    rng = np.random.default_rng(0)
+    cluster_labels = rng.integers(600, size=2000)
+    features = rng.normal(scale=2, size=(600, 3))[cluster_labels] + rng.normal(
+        size=(2000, 3)
+    )
+    silhouette = silhouette_score(features, cluster_labels)
+
+    n_covered = 0
+    for random_state in range(100):
+        scores = internal_scores(
+            features, cluster_labels, sample_size=400, random_state=random_state
+        )
+        n_covered += (
+            scores["silhouette_ci_low"] <= silhouette <= scores["silhouette_ci_high"]
+        )
+
+    assert n_covered >= 85
+
+
+def test_stratified_sample():
+    cluster_indices = np.repeat(np.arange(4), [1, 10, 100, 889])
+    cluster_sizes = np.bincount(cluster_indices)
+    cluster_strata = _get_strata(cluster_sizes, 100)
+    rows = _stratified_sample(cluster_strata[cluster_indices], 100, 0)
+
+    # The three smaller clusters are pooled, since the first two only have a share of
+    # 1.1 samples together.
+    np.testing.assert_array_equal(cluster_strata, [1, 1, 1, 0])
+    assert len(rows) == 100
+    assert np.count_nonzero(cluster_indices[rows] == 3) == 89
+    np.testing.assert_array_equal(np.unique(rows), rows)
@@ -1,5 +1,6 @@
 import numpy as np
 import pytest
+from sklearn.metrics import adjusted_rand_score, normalized_mutual_info_score
 
 from src.evaluation import metrics
 
@@ -46,3 +47,104 @@ def test__false_positive(example_actual_labels, example_cluster_labels):
 def test__false_negative(example_actual_labels, example_cluster_labels):
     actual_fn = metrics._false_negative(example_actual_labels, example_cluster_labels)
     assert 10 == actual_fn
+
+
+def test_pairwise_scores_non_contiguous_labels(
+    example_actual_labels, example_cluster_labels
+):
+    scores = metrics.pairwise_scores(
+        example_actual_labels * 7 - 3, example_cluster_labels * 10 + 5
+    )
+    assert scores == {"precision": 1 / 3, "recall": 1 / 3, "f1": 1 / 3}
+
+
+def test_pairwise_scores_ari_and_nmi():
+    rng = np.random.default_rng(0)
+    actual_labels = rng.integers(5, size=200)
+    cluster_labels = np.where(rng.random(200) < 0.7, actual_labels, 9)
+
+    scores = metrics.pairwise_scores(
+        actual_labels, cluster_labels, include_ari_and_nmi=True
+    )
+
+    assert scores["adjusted_rand"] == pytest.approx(
+        adjusted_rand_score(actual_labels, cluster_labels)
+    )
+    assert scores["nmi"] == pytest.approx(
+        normalized_mutual_info_score(actual_labels, cluster_labels)
+    )
+
+
+def test_contingency_table(example_actual_labels, example_cluster_labels):
+    table = metrics.contingency_table(example_actual_labels, example_cluster_labels)
+
+    np.testing.assert_array_equal(table.toarray(), [[2, 1, 1], [1, 2, 0], [1, 0, 3]])
+
+
+def test_pairwise_bootstrap_intervals():
+    rng = np.random.default_rng(0)
+    actual_labels = rng.integers(30, size=2000)
+    cluster_labels = np.where(
+        rng.random(2000) < 0.7, actual_labels, rng.integers(40, size=2000)
+    )
+    intervals = metrics.pairwise_bootstrap_intervals(
+        actual_labels, cluster_labels, n_resamples=300, max_batch_entries=50000
+    )
+
+    scores = metrics.pairwise_scores(actual_labels, cluster_labels)
+    for name in ["precision", "recall", "f1"]:
+        assert intervals[f"{name}_ci_low"] <= scores[name]
+        assert scores[name] <= intervals[f"{name}_ci_high"]
+        assert intervals[f"{name}_ci_high"] - intervals[f"{name}_ci_low"] < 0.1
+    assert intervals == metrics.pairwise_bootstrap_intervals(
+        actual_labels, cluster_labels, n_resamples=300, max_batch_entries=50000
+    )
+
+
+def test_pairwise_bootstrap_intervals_small_clusters():
+    # With many small clusters, counting the copies of a sample as pairs would move
+    # the intervals far above the point estimates.
+    rng = np.random.default_rng(0)
+    actual_labels = rng.integers(1500, size=5000)
+    cluster_labels = np.where(
+        rng.random(5000) < 0.7, actual_labels, rng.integers(2000, size=5000)
+    )
+    intervals = metrics.pairwise_bootstrap_intervals(
+        actual_labels, cluster_labels, n_resamples=200
+    )
+
+    scores = metrics.pairwise_scores(actual_labels, cluster_labels)
+    for name in ["precision", "recall", "f1"]:
+        assert intervals[f"{name}_ci_low"] <= scores[name]
+        assert scores[name] <= intervals[f"{name}_ci_high"]
+
+
+def test_pairwise_bootstrap_intervals_resamples(monkeypatch):
+    # Every resample must weigh every pair of distinct samples by the product of the
+    # number of times both samples are drawn.
+    rng = np.random.default_rng(1)
+    actual_labels = rng.integers(5, size=60)
+    cluster_labels = rng.integers(6, size=60)
+    draws = rng.integers(60, size=60)
+
+    class FixedGenerator:
+        def integers(self, high, size):
+            return np.tile(draws, (size[0], 1))
+
+    monkeypatch.setattr(np.random, "default_rng", lambda seed: FixedGenerator())
+    intervals = metrics.pairwise_bootstrap_intervals(
+        actual_labels, cluster_labels, n_resamples=3
+    )
+
+    weights = np.bincount(draws, minlength=60)
+    i, j = np.triu_indices(60, k=1)
+    pair_weights = weights[i] * weights[j]
+    same_actual = actual_labels[i] == actual_labels[j]
+    same_cluster = cluster_labels[i] == cluster_labels[j]
+    tp = np.sum(pair_weights[same_actual & same_cluster])
+    assert intervals["precision_ci_low"] == pytest.approx(
+        tp / np.sum(pair_weights[same_cluster])
+    )
+    assert intervals["recall_ci_low"] == pytest.approx(
+        tp / np.sum(pair_weights[same_actual])
+    )
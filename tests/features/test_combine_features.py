@@ -1,10 +1,13 @@
 import json
+import os
 import pickle
 
 import numpy as np
+import pytest
 
 from paths import TEST_DATA_DIR
-from src.features.combine_features import combine_and_save
+from src.features.combine_features import combine_all, combine_and_save
+from src.util.feature_loading import load_features
 
 
 def test_combine_features_regular():
@@ -78,3 +81,73 @@ def test_combine_features_reduced():
     with open(f"{reduced_combined_path}/feature_config.json", mode="r") as f:
         actual_config = json.load(f)
     assert actual_config == expected_config
+
+
+def test_combine_features_virtual(tmp_path):
+    hog_path = f"{TEST_DATA_DIR}/combine_features/hog"
+    lbp_path = f"{TEST_DATA_DIR}/combine_features/lbp"
+    virtual_path = f"{tmp_path}/combined_virtual"
+    combine_and_save({"hog": hog_path, "lbp": lbp_path}, virtual_path, virtual=True)
+
+    assert not os.path.exists(f"{virtual_path}/features.npy")
+
+    expected_combined_features = np.array(
+        [
+            [0, 0, 0, 1, 1, 60, 1, 2, 4],
+            [2, 2, 3, 4, 5, 70, 0, 0, 1],
+        ]
+    )
+    actual_combined_features = load_features(virtual_path)
+    assert actual_combined_features.shape == (2, 9)
+    np.testing.assert_array_equal(
+        np.asarray(actual_combined_features), expected_combined_features
+    )
+    np.testing.assert_array_equal(
+        actual_combined_features[[1, 0], 3:7], expected_combined_features[[1, 0], 3:7]
+    )
+    np.testing.assert_array_equal(
+        actual_combined_features[1], expected_combined_features[1]
+    )
+
+    with open(f"{virtual_path}/image_names.pickle", mode="rb") as f:
+        actual_image_names = pickle.load(f)
+    assert actual_image_names == ["1", "2"]
+
+    nested_virtual_path = f"{tmp_path}/nested_virtual"
+    with pytest.raises(ValueError):
+        combine_and_save(
+            {"virtual": virtual_path, "hog": hog_path},
+            nested_virtual_path,
+            virtual=True,
+        )
+    assert not os.path.exists(nested_virtual_path)
+
+
+def test_combine_all(tmp_path):
+    hog_path = f"{TEST_DATA_DIR}/combine_features/hog"
+    lbp_path = f"{TEST_DATA_DIR}/combine_features/lbp"
+    combine_all({"hog": hog_path, "lbp": lbp_path}, [1, 2], str(tmp_path), n_jobs=2)
+
+    assert sorted(os.listdir(f"{tmp_path}/1")) == ["run_hog", "run_lbp"]
+    assert os.listdir(f"{tmp_path}/2") == ["run_hog_lbp"]
+
+    expected_combined_features = np.array(
+        [
+            [0, 0, 0, 1, 1, 60, 1, 2, 4],
+            [2, 2, 3, 4, 5, 70, 0, 0, 1],
+        ]
+    )
+    actual_combined_features = np.load(f"{tmp_path}/2/run_hog_lbp/features.npy")
+    np.testing.assert_array_equal(actual_combined_features, expected_combined_features)
+
+    with open(f"{tmp_path}/2/run_hog_lbp/image_names.pickle", mode="rb") as f:
+        actual_image_names = pickle.load(f)
+    assert actual_image_names == ["1", "2"]
+
+    with open(f"{tmp_path}/1/run_lbp/image_names.pickle", mode="rb") as f:
+        actual_image_names = pickle.load(f)
+    assert actual_image_names == ["1", "2", "3"]
+    np.testing.assert_array_equal(
+        np.load(f"{tmp_path}/1/run_lbp/features.npy"),
+        np.load(f"{lbp_path}/features.npy"),
+    )
@@ -0,0 +1,100 @@
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pytest
+
+from src.clustering.kmeans_clustering import KMeansClustering
+from src.features.virtual_combination import save_virtual_combination
+from src.util.feature_loading import (
+    SharedFeatures,
+    load_features,
+    read_in_chunks,
+    to_process_source,
+)
+
+
+def _sum_features(features):
+    return float(load_features(features).sum())
+
+
+@pytest.fixture
+def example_features():
+    return np.random.default_rng(0).normal(size=(500, 4)).astype(np.float32)
+
+
+def test_load_features_handles(tmp_path, example_features):
+    np.save(f"{tmp_path}/features.npy", example_features)
+    memmap = load_features(str(tmp_path), mmap_mode="r")
+
+    assert load_features(example_features) is example_features
+    assert load_features(memmap) is memmap
+    with SharedFeatures.create(memmap) as shared_features:
+        np.testing.assert_array_equal(load_features(shared_features), example_features)
+
+
+def test_read_in_chunks(tmp_path, example_features):
+    np.save(f"{tmp_path}/features.npy", example_features)
+    memmap = load_features(str(tmp_path), mmap_mode="r")
+    row_indices = np.arange(len(example_features))[::-1]
+    os.makedirs(f"{tmp_path}/virtual")
+    save_virtual_combination(
+        f"{tmp_path}/virtual",
+        {"a": f"{tmp_path}/features.npy", "b": f"{tmp_path}/features.npy"},
+        {"a": row_indices, "b": row_indices},
+    )
+
+    assert read_in_chunks(example_features) is example_features
+    features = read_in_chunks(memmap, 64)
+    assert not isinstance(features, np.memmap)
+    np.testing.assert_array_equal(features, example_features)
+    np.testing.assert_array_equal(
+        read_in_chunks(load_features(f"{tmp_path}/virtual"), 64),
+        np.concatenate([example_features[::-1]] * 2, axis=1),
+    )
+
+
+def test_to_process_source(tmp_path, example_features):
+    np.save(f"{tmp_path}/features.npy", example_features)
+    memmap = load_features(str(tmp_path), mmap_mode="r")
+
+    assert to_process_source(str(tmp_path)) == (str(tmp_path), None)
+    for features_dir in [memmap, example_features]:
+        source, shared_features = to_process_source(features_dir)
+        assert source is shared_features
+        assert len(pickle.dumps(source)) < 1000
+        np.testing.assert_array_equal(load_features(source), example_features)
+        assert to_process_source(source) == (source, None)
+        shared_features.close()
+    source, shared_features = to_process_source(str(tmp_path), share_folder=True)
+    np.testing.assert_array_equal(load_features(source), example_features)
+    shared_features.close()
+
+
+def test_shared_features_in_processes(example_features):
+    with SharedFeatures.create(example_features) as shared_features:
+        attached_features = pickle.loads(pickle.dumps(shared_features))
+        assert not attached_features.is_owner
+        attached_features.array[0, 0] = 100
+        assert shared_features.array[0, 0] == 100
+        attached_features.close()
+
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            sums = list(executor.map(_sum_features, [shared_features] * 2))
+        assert sums == pytest.approx([float(shared_features.array.sum())] * 2)
+
+
+def test_kmeans_with_handles(tmp_path, example_features):
+    np.save(f"{tmp_path}/features.npy", example_features)
+    cluster_labels = KMeansClustering([2, 3], random_state=0).cluster(str(tmp_path))
+
+    with SharedFeatures.create(example_features) as shared_features:
+        np.testing.assert_array_equal(
+            KMeansClustering([2, 3], random_state=0).cluster(shared_features),
+            cluster_labels,
+        )
+    np.testing.assert_array_equal(
+        KMeansClustering([2, 3], random_state=0, n_jobs=2).cluster(example_features),
+        KMeansClustering([2, 3], random_state=0, n_jobs=2).cluster(str(tmp_path)),
+    )